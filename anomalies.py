@@ -0,0 +1,216 @@
+import argparse
+import math
+import sqlite3
+import sys
+
+from partitions import readable_partition
+
+# Exponentially weighted baselines of every repository ('repository' rows,
+# workflow_name '') and of each of its workflows ('workflow' rows), updated
+# by triggers as runs finish, in O(1) per run. Each metric is tracked as a
+# fast average over roughly the last 1/FAST_ALPHA runs and a slow baseline
+# over roughly the last 1/SLOW_ALPHA runs, with the baseline's variance:
+#   failure     -- 1 for a failed run, else 0 (so the averages are failure rates)
+#   cost        -- the run's cost
+#   failed_cost -- the run's cost if it failed, else 0 (wasted spend per run)
+# The first 1/alpha runs use alpha = 1/n, so the averages start out as plain
+# means. A run counts once, when it is inserted or updated into a finished
+# status; later corrections are not unwound (rebuild_baselines() replays
+# the history instead).
+FAST_ALPHA = 0.2
+SLOW_ALPHA = 0.02
+FINISHED_STATUSES = ('success', 'failed', 'cancelled')
+METRICS = ('failure', 'cost', 'failed_cost')
+
+# A spike is flagged once the fast average is ANOMALY_Z standard errors
+# above the baseline and also clears a minimum effect size, so quiet
+# repositories with near-zero variance are not flagged for one bad run.
+MIN_RUNS = 30
+ANOMALY_Z = 3.5
+MIN_FAILURE_RATE_INCREASE = 0.15
+MIN_FAILED_COST_RATIO = 2.0
+FLOOR_FAILURE_RATE = 0.05
+
+
+def _values(row):
+    """SQL for the (failure, cost, failed_cost) of a finished ci_cd_runs row."""
+    failed = f"CASE WHEN {row}.status = 'failed' THEN 1.0 ELSE 0.0 END"
+    return failed, f"IFNULL({row}.cost, 0.0)", f"{failed} * IFNULL({row}.cost, 0.0)"
+
+
+def _alpha(alpha):
+    return f"MAX({alpha}, 1.0 / (runs + 1))"
+
+
+def _record_run(row):
+    """Upserts a finished run into its repository's and workflow's baselines."""
+    updates = []
+    for metric in METRICS:
+        x = f"excluded.slow_{metric}"
+        updates.append(f"fast_{metric} = fast_{metric} + {_alpha(FAST_ALPHA)} * ({x} - fast_{metric})")
+        updates.append(f"slow_{metric} = slow_{metric} + {_alpha(SLOW_ALPHA)} * ({x} - slow_{metric})")
+        updates.append(
+            f"slow_{metric}_var = (1 - {_alpha(SLOW_ALPHA)}) * "
+            f"(slow_{metric}_var + {_alpha(SLOW_ALPHA)} * ({x} - slow_{metric}) * ({x} - slow_{metric}))"
+        )
+    columns = ', '.join(f"fast_{m}, slow_{m}, slow_{m}_var" for m in METRICS)
+    values = ', '.join(f"{v}, {v}, 0.0" for v in _values(row))
+    assignments = ',\n        '.join(updates)
+    return f"""
+      INSERT INTO run_baselines (kind, repository_id, workflow_name, runs, last_run_at, {columns})
+      SELECT k.kind, {row}.repository_id, k.workflow_name, 1, {row}.start_time, {values}
+      FROM (SELECT 'repository' AS kind, '' AS workflow_name
+            UNION ALL SELECT 'workflow', IFNULL({row}.workflow_name, '')) k
+      WHERE true
+      ON CONFLICT (kind, repository_id, workflow_name) DO UPDATE SET
+        {assignments},
+        runs = runs + 1,
+        last_run_at = MAX(last_run_at, excluded.last_run_at);"""
+
+
+_finished = ', '.join(f"'{s}'" for s in FINISHED_STATUSES)
+
+BASELINES_SCHEMA = [
+    f"""
+    CREATE TABLE IF NOT EXISTS run_baselines (
+      kind TEXT NOT NULL, -- 'repository' or 'workflow'
+      repository_id INTEGER NOT NULL,
+      workflow_name TEXT NOT NULL, -- '' for repository rows and runs without a workflow
+      runs INTEGER NOT NULL,
+      last_run_at DATETIME NOT NULL,
+      {', '.join(f"fast_{m} REAL NOT NULL, slow_{m} REAL NOT NULL, slow_{m}_var REAL NOT NULL" for m in METRICS)},
+      PRIMARY KEY (kind, repository_id, workflow_name)
+    ) WITHOUT ROWID;
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS run_baselines_insert
+    AFTER INSERT ON ci_cd_runs
+    WHEN NEW.status IN ({_finished})
+    BEGIN{_record_run('NEW')}
+    END;
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS run_baselines_finish
+    AFTER UPDATE OF status ON ci_cd_runs
+    WHEN NEW.status IN ({_finished}) AND (OLD.status IS NULL OR OLD.status NOT IN ({_finished}))
+    BEGIN{_record_run('NEW')}
+    END;
+    """,
+]
+
+REPLAY_QUERY = f"""
+SELECT repository_id, IFNULL(workflow_name, ''), start_time,
+       CASE WHEN status = 'failed' THEN 1.0 ELSE 0.0 END, IFNULL(cost, 0.0)
+FROM ci_cd_runs
+WHERE status IN ({_finished})
+ORDER BY start_time, id
+"""
+
+
+def _replay(rows, baselines):
+    """Python twin of the trigger updates, for (repository_id, workflow, start_time, failed, cost) rows."""
+    for repository_id, workflow_name, start_time, failed, cost in rows:
+        values = (failed, cost, failed * cost)
+        for key in (('repository', repository_id, ''), ('workflow', repository_id, workflow_name)):
+            state = baselines.get(key)
+            if state is None:
+                baselines[key] = [1, start_time] + [v for x in values for v in (x, x, 0.0)]
+                continue
+            n = state[0]
+            fast, slow = max(FAST_ALPHA, 1.0 / (n + 1)), max(SLOW_ALPHA, 1.0 / (n + 1))
+            for i, x in enumerate(values):
+                base = 2 + 3 * i
+                diff = x - state[base + 1]
+                state[base] += fast * (x - state[base])
+                state[base + 2] = (1 - slow) * (state[base + 2] + slow * diff * diff)
+                state[base + 1] += slow * diff
+            state[0] = n + 1
+            state[1] = max(state[1], start_time)
+
+
+def rebuild_baselines(conn):
+    """Recomputes every baseline by replaying the finished runs in start time order.
+
+    Archived months are replayed first, from their partitions. Runs inside
+    the caller's transaction when there is one.
+    """
+    baselines = {}
+    for path, compressed in conn.execute("SELECT path, compressed FROM run_partitions ORDER BY month").fetchall():
+        partition = sqlite3.connect(f"file:{readable_partition(path, compressed)}?mode=ro&immutable=1", uri=True)
+        try:
+            _replay(partition.execute(REPLAY_QUERY), baselines)
+        finally:
+            partition.close()
+    _replay(conn.execute(REPLAY_QUERY), baselines)
+
+    columns = ', '.join(f"fast_{m}, slow_{m}, slow_{m}_var" for m in METRICS)
+    conn.execute("DELETE FROM run_baselines")
+    conn.executemany(
+        f"INSERT INTO run_baselines (kind, repository_id, workflow_name, runs, last_run_at, {columns}) "
+        f"VALUES ({', '.join('?' * (5 + 3 * len(METRICS)))})",
+        [(*key, *state) for key, state in baselines.items()],
+    )
+    return len(baselines)
+
+
+def create_baselines(conn):
+    """Creates the baseline table and triggers, replaying the history on first creation."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'run_baselines'"
+    ).fetchone()
+    for statement in BASELINES_SCHEMA:
+        conn.execute(statement)
+    if not exists:
+        rebuild_baselines(conn)
+
+
+def score(row):
+    """Scores a run_baselines row; returns (flags, failure_rate_z, failed_cost_z).
+
+    z is how many standard errors of the fast average it sits above the
+    baseline; the baseline variance is floored so that a repository that
+    never failed still needs several failures to be flagged.
+    """
+    scale = math.sqrt(FAST_ALPHA / (2 - FAST_ALPHA))
+    floor = FLOOR_FAILURE_RATE * (1 - FLOOR_FAILURE_RATE)
+
+    failure_sd = math.sqrt(max(row['slow_failure_var'], floor)) * scale
+    failure_z = (row['fast_failure'] - row['slow_failure']) / failure_sd
+
+    failed_cost_var = max(row['slow_failed_cost_var'], floor * row['slow_cost'] ** 2)
+    failed_cost_sd = math.sqrt(failed_cost_var) * scale
+    failed_cost_z = (row['fast_failed_cost'] - row['slow_failed_cost']) / failed_cost_sd if failed_cost_sd else 0.0
+
+    flags = []
+    if failure_z >= ANOMALY_Z and row['fast_failure'] - row['slow_failure'] >= MIN_FAILURE_RATE_INCREASE:
+        flags.append('failure_rate')
+    if (failed_cost_z >= ANOMALY_Z and row['fast_failed_cost'] > 0
+            and row['fast_failed_cost'] >= MIN_FAILED_COST_RATIO * row['slow_failed_cost']):
+        flags.append('failed_spend')
+    return flags, failure_z, failed_cost_z
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recompute the anomaly baselines from the full run history.")
+    parser.add_argument('--database', help="SQLite file to update (defaults to app.DATABASE)")
+    args = parser.parse_args(argv)
+
+    import app as dashboard
+
+    if args.database:
+        dashboard.DATABASE = args.database
+    dashboard.ensure_schema()
+    conn = dashboard.connect_writer(dashboard.DATABASE)
+    try:
+        # The write lock keeps runs from finishing between the replay and the rewrite.
+        conn.execute("BEGIN IMMEDIATE")
+        count = rebuild_baselines(conn)
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"Rebuilt {count} baselines.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,28 +1,285 @@
-from flask import Flask, jsonify, request
+from flask import Flask, g, has_request_context, jsonify, request
 from flask_cors import CORS
 import sqlite3
 import os
+import random
+import base64
+import hashlib
+import json
+import threading
+import time
 from datetime import datetime, timedelta
+from functools import partial, wraps
+import anomalies
+import export
+from breakdown import breakdown_window, sketch_percentiles
+from cache import CachedResponse, ResponseCache, ttl_for_window
+from columnar import get_snapshot
+from db import PartitionLimitError, connect_writer, get_pool
+from ingest import ingest_runs, read_records
+from leaderboard import roll_leaderboards
+from metrics import PROGRESS_STEP, RequestProfile, render_metrics
+from migrations import migrate
+from rollup import window_runs
+from streaming import stream_format, stream_rows
+from urllib.parse import parse_qsl
+from users import user_visibility, user_window
+from werkzeug.datastructures import MultiDict
+from werkzeug.exceptions import HTTPException
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=['X-Next-Cursor', 'Server-Timing'])
+# 'sqlite' aggregates windows from run_daily_rollup; 'columnar' uses the NumPy
+# snapshot built by columnar.py whenever it is current.
+app.config['ANALYTICS_BACKEND'] = os.environ.get('ANALYTICS_BACKEND', 'sqlite')
+# Read-only copies of DATABASE (see replicas.py) that the read endpoints are
+# spread over, so they never contend with ingest on the primary. Replicas
+# not refreshed within REPLICA_MAX_AGE seconds are skipped.
+app.config['READ_REPLICAS'] = [path for path in os.environ.get('READ_REPLICAS', '').split(os.pathsep) if path]
+app.config['REPLICA_MAX_AGE'] = float(os.environ.get('REPLICA_MAX_AGE', 3600))
 
 
 DATABASE = os.path.expanduser('~/database/demo.db')
-def get_db_connection():
-    if not os.path.exists(DATABASE):
+_migrated_databases = set()
+
+def ensure_schema():
+    """Applies pending migrations once per process for the current DATABASE."""
+    if DATABASE in _migrated_databases:
+        return
+    conn = sqlite3.connect(DATABASE)
+    try:
+        # WAL is persistent and lets the pooled readers run alongside a writer.
+        conn.execute("PRAGMA journal_mode = WAL")
+        applied = migrate(conn)
+        if applied:
+            print(f"Applied schema migrations {applied} to '{DATABASE}'.")
+    finally:
+        conn.close()
+    _migrated_databases.add(DATABASE)
+
+def read_database():
+    """The file reads come from: DATABASE, or one fresh replica kept for the whole request."""
+    if has_request_context() and 'read_database' in g:
+        return g.read_database
+    database = DATABASE
+    now = time.time()
+    fresh = []
+    for replica in app.config.get('READ_REPLICAS', ()):
+        try:
+            if now - os.stat(replica).st_mtime <= app.config.get('REPLICA_MAX_AGE', 3600):
+                fresh.append(replica)
+        except OSError:
+            continue
+    if fresh:
+        database = random.choice(fresh)
+    if has_request_context():
+        g.read_database = database
+    return database
+
+def get_db_connection(database=None):
+    """Checks out a pooled read-only connection; conn.close() returns it.
+
+    The connection reads read_database() unless database is given, inside one
+    transaction, so all of a handler's queries see the same snapshot. Within
+    /api/batch every call gets the batch's connection instead.
+    """
+    shared = g.get('batch_connection') if has_request_context() else None
+    if shared is not None:
+        return shared
+    if DATABASE not in _migrated_databases and not os.path.exists(DATABASE):
         print(f"Error: Database file '{DATABASE}' not found.")
         return None
     try:
-        conn = sqlite3.connect(DATABASE)
-        conn.row_factory = sqlite3.Row
+        ensure_schema()
+        conn = get_pool(database or read_database()).acquire()
+        conn.begin()
+        if app.config.get('QUERY_TRACE'):
+            conn.set_trace_callback(app.config['QUERY_TRACE'])
+        profile = g.get('profile') if has_request_context() else None
+        if profile is not None:
+            conn.profile = profile
+        if app.config.get('QUERY_PROGRESS'):
+            # (handler, n): handler is called every n SQLite VM instructions.
+            conn.set_progress_handler(*app.config['QUERY_PROGRESS'])
+        elif profile is not None:
+            conn.set_progress_handler(profile.on_progress, PROGRESS_STEP)
         return conn
     except sqlite3.Error as e:
         print(f"Database connection error: {e}")
         return None
 
+def load_data_version(database):
+    """Reads the counter the data_version triggers bump on every write."""
+    conn = get_db_connection(database)
+    if conn is None:
+        return None
+    try:
+        row = conn.execute("SELECT version FROM data_version WHERE id = 1").fetchone()
+        return row[0] if row else None
+    except sqlite3.Error as e:
+        print(f"Error reading data version for '{database}': {e}")
+        return None
+    finally:
+        conn.close()
+
+response_cache = ResponseCache(load_data_version)
+
+@app.before_request
+def start_profile():
+    if app.config.get('METRICS', True):
+        g.profile = RequestProfile(request.endpoint or 'unmatched')
+
+@app.after_request
+def finish_profile(response):
+    """Records request and query metrics and reports them in Server-Timing.
+
+    A streamed response keeps running queries while its body is sent, so its
+    metrics are recorded once the server closes it; its Server-Timing covers
+    the time up to the headers only.
+    """
+    profile = g.pop('profile', None)
+    if profile is None:
+        return response
+    args = (
+        request.url_rule.rule if request.url_rule else 'unmatched',
+        request.method,
+        response.status_code,
+        app.config.get('SLOW_QUERY_MS', 250),
+        app.config.get('SLOW_QUERY_SAMPLE_RATE', 1.0),
+    )
+    if response.is_streamed:
+        response.headers['Server-Timing'] = profile.server_timing(profile.elapsed())
+        response.call_on_close(lambda: profile.finish(*args))
+    else:
+        response.headers['Server-Timing'] = profile.server_timing(profile.finish(*args))
+    response.headers['Timing-Allow-Origin'] = '*'
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return app.response_class(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@app.errorhandler(PartitionLimitError)
+def partition_limit_exceeded(e):
+    # Raised from a handler's queries; its finally block has already released the connection.
+    return jsonify({"error": str(e)}), 400
+
+def window_source(conn, start_str, end_str):
+    """(sql, params) for the window_runs CTE body from the configured analytics backend.
+
+    The columnar snapshot is only used while it is at the polled data version
+    (see backend_window); otherwise the rollup answers. Within /api/batch a window several sub-requests read is aggregated once
+    into a temporary table that all of them share. Raw reads of archived
+    months go through conn's partitions.
+    """
+    shared = g.get('batch_windows') if has_request_context() else None
+    window = shared.get((start_str, end_str)) if shared else None
+    if window is None:
+        return backend_window(conn, start_str, end_str)
+    if window["source"] is None:
+        window["source"] = materialize_window(
+            g.batch_connection, window["table"], start_str, end_str, window["platforms"]
+        )
+    return window["source"]
+
+def scoped_window(conn, start_str, end_str, scope):
+    """window_source() kept to the repositories scope can see, when there is one.
+
+    SQLite pushes the condition into each branch of the window, so a scoped
+    request reads only its repositories' rollup rows.
+    """
+    sql, params = window_source(conn, start_str, end_str)
+    if scope is None:
+        return sql, params
+    return f"""
+        SELECT * FROM ({sql}
+        )
+        WHERE repository_id IN (SELECT value FROM json_each(?))""", params + [scope.json('repositories')]
+
+def backend_window(conn, start_str, end_str):
+    """(sql, params) for the window_runs CTE body from the configured analytics backend.
+
+    The columnar snapshot answers while its version matches the polled data
+    version, which can lag a write by up to cache.VERSION_POLL_SECONDS; until
+    the next poll such a write may be missing from its answers.
+    """
+    if app.config.get('ANALYTICS_BACKEND') == 'columnar':
+        snapshot = get_snapshot(DATABASE)
+        if snapshot is not None and snapshot.version == response_cache.current_version(read_database()):
+            return snapshot.window_runs(start_str, end_str)
+    return window_runs(start_str, end_str, run_tables=conn.run_tables)
+
+def materialize_window(conn, table, start_str, end_str, platforms):
+    """Sums the window per (repository, platform, status) into a TEMP table; returns its CTE body.
+
+    platforms limits the table to the platforms its readers filter on; None keeps all.
+    """
+    sql, params = backend_window(conn, start_str, end_str)
+    platform_filter = ''
+    if platforms is not None:
+        platform_filter = "WHERE platform IN (SELECT value FROM json_each(?))"
+        params = params + [json.dumps(platforms)]
+    conn.create_temp_table(table, f"""
+        SELECT repository_id, platform, status,
+               SUM(runs) AS runs, SUM(cost) AS cost, SUM(duration_seconds) AS duration_seconds
+        FROM ({sql}
+        )
+        {platform_filter}
+        GROUP BY repository_id, platform, status
+    """, params)
+    return f"""
+        SELECT repository_id, platform, status, runs, cost, duration_seconds
+        FROM temp.{table}""", []
+
+def cached_response(view):
+    """Serves repeated GETs from response_cache and answers If-None-Match with 304."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not app.config.get('RESPONSE_CACHE', True):
+            return view(*args, **kwargs)
+
+        database = read_database()
+        version = response_cache.current_version(database)
+        key = (database, request.path, tuple(sorted(request.args.items(multi=True))), stream_format(request))
+        entry = response_cache.get(key, version) if version is not None else None
+        if entry is None:
+            response = app.make_response(view(*args, **kwargs))
+            # Streamed bodies are never buffered, so they are not cached either.
+            if response.status_code != 200 or response.is_streamed or version is None:
+                return response
+            body = response.get_data()
+            entry = CachedResponse(
+                body,
+                response.mimetype,
+                hashlib.sha1(body).hexdigest(),
+                time.monotonic() + ttl_for_window(
+                    RANGE_ALIASES.get(request.args.get('range', ''), request.args.get('range', '')),
+                    request.args.get('start'), request.args.get('end'),
+                ),
+                version,
+                [(name, value) for name, value in response.headers if name.startswith('X-')],
+            )
+            response_cache.put(key, entry)
+
+        response = app.response_class(entry.body, mimetype=entry.mimetype, headers=entry.headers)
+        response.set_etag(entry.etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
+    return wrapper
+
+# Spellings of ?range= that older clients send.
+RANGE_ALIASES = {
+    'last_7_days': '7d',
+    'last_30_days': '30d',
+    'last_6_months': '6mo',
+    'last_year': '1yr',
+    '6m': '6mo',
+    '1y': '1yr',
+}
+
 def calculate_date_range(range_str):
     """Converts a human-readable range into a (start, end) tuple."""
+    range_str = RANGE_ALIASES.get(range_str, range_str)
     today = datetime.today()
     if range_str == '7d':
         return (today - timedelta(days=7), today)
@@ -32,42 +289,235 @@ def calculate_date_range(range_str):
         return (today - timedelta(days=182), today)
     elif range_str == '1yr':
         return (today - timedelta(days=365), today)
-    else:
-        # Default to Q2 2025 if no valid range is provided
+    elif range_str == 'all':
+        # The frontend's "All time": every run up to today, as the other ranges end.
+        return (datetime(1970, 1, 1), today)
+    elif not range_str:
+        # Default to Q2 2025 if no range is provided
         return (datetime(2025, 4, 1), datetime(2025, 7, 1))
+    raise ValueError("Invalid range. Use one of ['7d', '30d', '6mo', '1yr', 'all'], or start and end")
+
+def _parse_window_bound(value, name):
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO-8601 date or timestamp")
+    if parsed.utcoffset() is not None:
+        parsed = (parsed - parsed.utcoffset()).replace(tzinfo=None)
+    return parsed
+
+def window_bounds(args):
+    """Returns the (start, end) strings of the request's half-open date window.
+
+    ?start= and ?end= take ISO-8601 dates or timestamps and win over ?range=.
+    A date-only end includes that whole day; a missing end means through
+    today. Raises ValueError with a client-facing message on bad input.
+    """
+    start, end = args.get('start'), args.get('end')
+    if not start and not end:
+        start_date, end_date = calculate_date_range(args.get('range', ''))
+        return start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')
+    if not start:
+        raise ValueError("start is required when end is given")
+
+    start_dt = _parse_window_bound(start, 'start')
+    if end:
+        end_dt = _parse_window_bound(end, 'end')
+        if len(end) == 10:
+            end_dt += timedelta(days=1)
+    else:
+        end_dt = datetime.combine(datetime.today(), datetime.min.time()) + timedelta(days=1)
+    if end_dt <= start_dt:
+        raise ValueError("end must be after start")
+    return start_dt.strftime('%Y-%m-%d %H:%M:%S'), end_dt.strftime('%Y-%m-%d %H:%M:%S')
+
+# The ?range= windows kept as materialized leaderboards (leaderboard.py).
+LEADERBOARD_RANGES = ('', '7d', '30d', '6mo', '1yr')
+
+def leaderboard_windows():
+    """Today's (start, end) day window of every leaderboard range."""
+    return {range_str: window_bounds({'range': range_str}) for range_str in LEADERBOARD_RANGES}
+
+def leaderboard_range(conn, start_str, end_str):
+    """The leaderboard range materialized for exactly [start, end), or None."""
+    row = conn.execute(
+        "SELECT range_name FROM leaderboard_windows WHERE start_day = ? AND end_day = ?", (start_str, end_str)
+    ).fetchone()
+    return row[0] if row else None
+
+MAX_PAGE_SIZE = 1000
+# Window costs are rounded to this many places, so the analytics backends,
+# which sum in different orders, return the same JSON, sort alike and hand
+# out the same cursors.
+COST_DIGITS = 6
+
+def encode_cursor(sort_value, row_id):
+    """Opaque keyset cursor for the row after which the next page starts."""
+    raw = json.dumps([sort_value, row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def parse_page_args(args):
+    """Reads ?limit= and ?after=, returning (limit, (sort_value, row_id) or None).
+
+    limit is None when the caller did not ask for paging. Raises ValueError
+    with a client-facing message on bad input.
+    """
+    limit = args.get('limit')
+    if limit is not None:
+        if not limit.isdigit() or not 1 <= int(limit) <= MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be an integer between 1 and {MAX_PAGE_SIZE}")
+        limit = int(limit)
+
+    after = args.get('after')
+    if after:
+        try:
+            sort_value, row_id = json.loads(base64.urlsafe_b64decode(after + '=' * (-len(after) % 4)))
+        except (ValueError, TypeError):
+            raise ValueError("Invalid after cursor")
+        if not isinstance(sort_value, (int, float)) or not isinstance(row_id, int):
+            raise ValueError("Invalid after cursor")
+        after = (sort_value, row_id)
+    else:
+        after = None
+    return limit, after
+
+def repository_filters(args):
+    """SQL conditions and params for the ?name= and ?team= substring filters."""
+    sql, params = '', []
+    for arg, column in (('name', 'r.name'), ('team', 'e.name')):
+        value = args.get(arg, '').strip()
+        if value:
+            escaped = value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            sql += f" AND {column} LIKE ? ESCAPE '\\'"
+            params.append(f"%{escaped}%")
+    return sql, params
+
+class ScopeError(Exception):
+    """An ?as_user= that cannot scope the request; status is 400 or 404."""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+def user_scope(conn, args):
+    """The Visibility of ?as_user=, or None when the request is not scoped.
+
+    Raises ScopeError for a malformed id or an unknown user.
+    """
+    as_user = args.get('as_user', '')
+    if not as_user:
+        return None
+    if not as_user.isdigit():
+        raise ScopeError("as_user must be an integer", 400)
+    scope = user_visibility(conn, read_database(), int(as_user))
+    if scope is None:
+        raise ScopeError(f"User {as_user} not found", 404)
+    return scope
+
+def scope_filter(scope, column, which='repositories'):
+    """SQL condition and params keeping column to scope's repository or entity ids."""
+    if scope is None:
+        return '', []
+    return f" AND {column} IN (SELECT value FROM json_each(?))", [scope.json(which)]
+
+def keyset_clause(sort_by, limit, after):
+    """WHERE/ORDER BY/LIMIT for a page of repo_totals ordered by sort_by DESC, repo_id.
+
+    One extra row is requested so the caller can tell whether a next page exists.
+    """
+    sql, params = '', []
+    if after is not None:
+        sql = f"WHERE {sort_by} < ? OR ({sort_by} = ? AND repo_id > ?)"
+        params = [after[0], after[0], after[1]]
+    sql += f" ORDER BY {sort_by} DESC, repo_id LIMIT ?"
+    params.append(limit + 1 if limit else -1)
+    return sql, params
+
+def split_page(rows, sort_by, limit):
+    """Trims the look-ahead row and returns (rows, next_cursor or None)."""
+    if not limit or len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1][sort_by], rows[-1]["repo_id"])
+
+# ?expand= values for the team listings and the repositories column each lists.
+TEAM_EXPANSIONS = {'repositories': 'name', 'repository_ids': 'id'}
+
+def expand_team_repositories(conn, teams, expand, scope=None):
+    """Adds the expand list (repository names or ids) to each team with one query.
+
+    Only the given teams are looked up, so callers pass the rows they return;
+    with a scope, only the repositories it can see are listed.
+    """
+    column = TEAM_EXPANSIONS[expand]
+    members = {team["team_id"]: [] for team in teams}
+    scope_sql, scope_params = scope_filter(scope, 'id')
+    rows = conn.execute(f"""
+        SELECT DISTINCT entity_id, {column}
+        FROM repositories
+        WHERE entity_id IN (SELECT value FROM json_each(?)){scope_sql}
+        ORDER BY entity_id, {column}
+    """, (json.dumps(list(members)), *scope_params))
+    for entity_id, value in rows:
+        members[entity_id].append(value)
+    for team in teams:
+        team[expand] = members[team["team_id"]]
+    return teams
+
+def roll_up_subtree_totals(teams):
+    """Adds subtree_total_jobs/subtree_total_cost to each team, bottom-up in one pass.
+
+    Teams need team_id, parent_team_id and depth. Within a team listing a parent
+    sits exactly one level above its children, so visiting the deepest teams
+    first finishes every subtree before its total is added to the parent.
+    """
+    by_id = {team["team_id"]: team for team in teams}
+    for team in teams:
+        team["subtree_total_jobs"] = team["total_jobs"]
+        team["subtree_total_cost"] = team["total_cost"]
+    for team in sorted(teams, key=lambda t: t["depth"], reverse=True):
+        parent = by_id.get(team["parent_team_id"])
+        if parent is not None:
+            parent["subtree_total_jobs"] += team["subtree_total_jobs"]
+            parent["subtree_total_cost"] += team["subtree_total_cost"]
+    for team in teams:
+        team["subtree_total_cost"] = round(team["subtree_total_cost"], COST_DIGITS)
+    return teams
 
 @app.route('/api/dashboard-summary', methods=['GET'])
+@cached_response
 def get_dashboard_summary():
+    try:
+        start_str, end_str = window_bounds(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     conn = get_db_connection()
     if conn is None:
         return jsonify({"error": "Failed to connect to database."}), 500
 
-    range_str = request.args.get('range', '')
-    start_date, end_date = calculate_date_range(range_str)
-    start_str = start_date.strftime('%Y-%m-%d')
-    end_str = end_date.strftime('%Y-%m-%d')
-
-    query = """
-    WITH RECURSIVE EnterpriseHierarchy AS (
-        SELECT id FROM entities WHERE name = 'My Global Enterprise' AND type = 'enterprise'
-        UNION ALL
-        SELECT e.id FROM entities e
-        JOIN EnterpriseHierarchy eh ON e.parent_id = eh.id
-    )
-    SELECT
-        SUM(ccr.cost) AS total_enterprise_ci_cd_cost,
-        SUM(CASE WHEN ccr.status = 'failed' THEN ccr.cost ELSE 0 END) AS total_failed_build_cost_enterprise,
-        COUNT(ccr.id) AS total_runs_enterprise,
-        SUM(CASE WHEN ccr.status = 'success' THEN 1 ELSE 0 END) AS successful_runs_enterprise,
-        SUM(CASE WHEN ccr.status = 'failed' THEN 1 ELSE 0 END) AS failed_runs_enterprise
-    FROM ci_cd_runs ccr
-    JOIN repositories r ON ccr.repository_id = r.id
-    JOIN entities e ON r.entity_id = e.id
-    WHERE e.id IN (SELECT id FROM EnterpriseHierarchy)
-      AND ccr.start_time >= ? AND ccr.start_time < ?;
-    """
     try:
-        cursor = conn.execute(query, (start_str, end_str))
+        window_sql, window_params = window_source(conn, start_str, end_str)
+        query = f"""
+        WITH EnterpriseHierarchy AS (
+            SELECT ec.descendant_id AS id
+            FROM entities root
+            JOIN entity_closure ec ON ec.ancestor_id = root.id
+            WHERE root.name = 'My Global Enterprise' AND root.type = 'enterprise'
+        ),
+        window_runs AS ({window_sql}
+        )
+        SELECT
+            ROUND(SUM(w.cost), {COST_DIGITS}) AS total_enterprise_ci_cd_cost,
+            ROUND(SUM(CASE WHEN w.status = 'failed' THEN w.cost ELSE 0 END), {COST_DIGITS}) AS total_failed_build_cost_enterprise,
+            COALESCE(SUM(w.runs), 0) AS total_runs_enterprise,
+            SUM(CASE WHEN w.status = 'success' THEN w.runs ELSE 0 END) AS successful_runs_enterprise,
+            SUM(CASE WHEN w.status = 'failed' THEN w.runs ELSE 0 END) AS failed_runs_enterprise
+        FROM window_runs w
+        JOIN repositories r ON w.repository_id = r.id
+        WHERE r.entity_id IN (SELECT id FROM EnterpriseHierarchy);
+        """
+        cursor = conn.execute(query, window_params)
         row = cursor.fetchone()
         summary_data = dict(row) if row else {}
         return jsonify(summary_data)
@@ -77,32 +527,35 @@ def get_dashboard_summary():
     finally:
         conn.close()
 @app.route('/api/platform-costs', methods=['GET'])
+@cached_response
 def get_platform_costs():
+    try:
+        start_str, end_str = window_bounds(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     conn = get_db_connection()
     if conn is None:
         return jsonify({"error": "Failed to connect to database."}), 500
 
-    range_str = request.args.get('range', '')
-    start_date, end_date = calculate_date_range(range_str)
-    start_str = start_date.strftime('%Y-%m-%d')
-    end_str = end_date.strftime('%Y-%m-%d')
-
-    query = """
-    SELECT
-      LOWER(ccr.platform) AS platform,
-      SUM(ccr.cost) AS total_cost_by_platform,
-      SUM(CASE WHEN ccr.status = 'failed' THEN ccr.cost ELSE 0 END) AS failed_cost_by_platform,
-      COUNT(ccr.id) AS total_jobs,
-      SUM(CASE WHEN ccr.status = 'success' THEN 1 ELSE 0 END) AS successful_jobs,
-      SUM(CASE WHEN ccr.status = 'failed' THEN 1 ELSE 0 END) AS failed_jobs,
-      ROUND(CAST(SUM(CASE WHEN ccr.status = 'success' THEN 1 ELSE 0 END) AS REAL) * 100 / COUNT(ccr.id), 2) AS success_rate_percent
-    FROM ci_cd_runs ccr
-    WHERE ccr.start_time >= ? AND ccr.start_time < ?
-    GROUP BY platform
-    ORDER BY total_cost_by_platform DESC;
-    """
     try:
-        cursor = conn.execute(query, (start_str, end_str))
+        window_sql, window_params = window_source(conn, start_str, end_str)
+        query = f"""
+        WITH window_runs AS ({window_sql}
+        )
+        SELECT
+          w.platform AS platform,
+          ROUND(SUM(w.cost), {COST_DIGITS}) AS total_cost_by_platform,
+          ROUND(SUM(CASE WHEN w.status = 'failed' THEN w.cost ELSE 0 END), {COST_DIGITS}) AS failed_cost_by_platform,
+          SUM(w.runs) AS total_jobs,
+          SUM(CASE WHEN w.status = 'success' THEN w.runs ELSE 0 END) AS successful_jobs,
+          SUM(CASE WHEN w.status = 'failed' THEN w.runs ELSE 0 END) AS failed_jobs,
+          ROUND(CAST(SUM(CASE WHEN w.status = 'success' THEN w.runs ELSE 0 END) AS REAL) * 100 / SUM(w.runs), 2) AS success_rate_percent
+        FROM window_runs w
+        GROUP BY platform
+        ORDER BY total_cost_by_platform DESC;
+        """
+        cursor = conn.execute(query, window_params)
         platform_data = [dict(row) for row in cursor.fetchall()]
         return jsonify(platform_data)
     except sqlite3.Error as e:
@@ -112,53 +565,87 @@ def get_platform_costs():
         conn.close()
         
 @app.route('/api/platform-summary', methods=['GET'])
+@cached_response
 def get_platform_summary():
-    conn = get_db_connection()
-    if conn is None:
-        return jsonify({"error": "Failed to connect to database."}), 500
-
     platform = request.args.get('platform', '').lower()
-    range_str = request.args.get('range', '')
     if not platform:
         return jsonify({"error": "Platform is required"}), 400
 
-    start_date, end_date = calculate_date_range(range_str)
-    start_str = start_date.strftime('%Y-%m-%d')
-    end_str = end_date.strftime('%Y-%m-%d')
+    try:
+        start_str, end_str = window_bounds(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    conn = get_db_connection()
+    if conn is None:
+        return jsonify({"error": "Failed to connect to database."}), 500
 
     try:
-        # Summary: total cost, total jobs, failed jobs
-        summary_query = """
-        SELECT
-          SUM(ccr.cost) AS total_cost,
-          COUNT(ccr.id) AS total_jobs,
-          SUM(CASE WHEN ccr.status = 'failed' THEN 1 ELSE 0 END) AS failed_jobs
-        FROM ci_cd_runs ccr
-        WHERE LOWER(ccr.platform) = ?
-          AND ccr.start_time >= ? AND ccr.start_time < ?;
-        """
-        summary_row = conn.execute(summary_query, (platform, start_str, end_str)).fetchone()
-
-        # Most costly repo
-        repo_query = """
-        SELECT r.name AS repo_name, SUM(ccr.cost) AS repo_cost
-        FROM ci_cd_runs ccr
-        JOIN repositories r ON ccr.repository_id = r.id
-        WHERE LOWER(ccr.platform) = ?
-          AND ccr.start_time >= ? AND ccr.start_time < ?
-        GROUP BY r.id
-        ORDER BY repo_cost DESC
-        LIMIT 1;
-        """
-        repo_row = conn.execute(repo_query, (platform, start_str, end_str)).fetchone()
+        board = leaderboard_range(conn, start_str, end_str)
+        if board is not None:
+            # A materialized leaderboard covers the window: the totals are one
+            # row and the most costly repository an index lookup.
+            query = f"""
+            SELECT
+              ROUND(p.total_cost, {COST_DIGITS}) AS total_cost,
+              COALESCE(p.total_jobs, 0) AS total_jobs,
+              p.failed_jobs AS failed_jobs,
+              mc.repo_name AS most_costly_repo,
+              mc.total_cost AS most_costly_repo_cost
+            FROM (SELECT 1)
+            LEFT JOIN leaderboard p
+              ON p.range_name = ? AND p.platform = ? AND p.kind = 'platform' AND p.entity_id = 0
+            LEFT JOIN (
+                SELECT r.name AS repo_name, ROUND(lb.total_cost, {COST_DIGITS}) AS total_cost
+                FROM leaderboard lb
+                JOIN repositories r ON r.id = lb.entity_id
+                WHERE lb.range_name = ? AND lb.platform = ? AND lb.kind = 'repository'
+                ORDER BY lb.total_cost DESC
+                LIMIT 1
+            ) mc ON 1;
+            """
+            params = (board, platform, board, platform)
+        else:
+            window_sql, window_params = window_source(conn, start_str, end_str)
+            # One pass over the window: per-repo totals, then the summary derived from them
+            query = f"""
+            WITH window_runs AS ({window_sql}
+            ),
+            repo_totals AS MATERIALIZED (
+                SELECT
+                  w.repository_id,
+                  ROUND(SUM(w.cost), {COST_DIGITS}) AS total_cost,
+                  SUM(w.runs) AS total_jobs,
+                  SUM(CASE WHEN w.status = 'failed' THEN w.runs ELSE 0 END) AS failed_jobs
+                FROM window_runs w
+                WHERE w.platform = ?
+                GROUP BY w.repository_id
+            )
+            SELECT
+              (SELECT ROUND(SUM(total_cost), {COST_DIGITS}) FROM repo_totals) AS total_cost,
+              (SELECT COALESCE(SUM(total_jobs), 0) FROM repo_totals) AS total_jobs,
+              (SELECT SUM(failed_jobs) FROM repo_totals) AS failed_jobs,
+              mc.repo_name AS most_costly_repo,
+              mc.total_cost AS most_costly_repo_cost
+            FROM (SELECT 1)
+            LEFT JOIN (
+                SELECT r.name AS repo_name, rt.total_cost
+                FROM repo_totals rt
+                JOIN repositories r ON r.id = rt.repository_id
+                ORDER BY rt.total_cost DESC
+                LIMIT 1
+            ) mc ON 1;
+            """
+            params = (*window_params, platform)
+        row = conn.execute(query, params).fetchone()
 
         response = {
             "platform": platform,
-            "total_cost": summary_row["total_cost"] if summary_row else 0,
-            "total_jobs": summary_row["total_jobs"] if summary_row else 0,
-            "failed_jobs": summary_row["failed_jobs"] if summary_row else 0,
-            "most_costly_repo": repo_row["repo_name"] if repo_row else None,
-            "most_costly_repo_cost": repo_row["repo_cost"] if repo_row else 0
+            "total_cost": row["total_cost"],
+            "total_jobs": row["total_jobs"],
+            "failed_jobs": row["failed_jobs"],
+            "most_costly_repo": row["most_costly_repo"],
+            "most_costly_repo_cost": row["most_costly_repo_cost"] if row["most_costly_repo"] is not None else 0
         }
 
         return jsonify(response)
@@ -169,118 +656,137 @@ def get_platform_summary():
     finally:
         conn.close()
 @app.route('/api/platform-teams-summary', methods=['GET'])
+@cached_response
 def get_platform_teams_summary():
-    conn = get_db_connection()
-    if conn is None:
-        return jsonify({"error": "Failed to connect to database."}), 500
-
     platform = request.args.get('platform', '').lower()
-    range_str = request.args.get('range', '')
     if not platform:
         return jsonify({"error": "Platform is required"}), 400
 
-    start_date, end_date = calculate_date_range(range_str)
-    start_str, end_str = start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')
-
-    # Decide entity types per platform
-    if platform == 'bitbucket':
-        entity_types = ("workspace",)
-    else:
-        entity_types = ("team", "group", "subgroup")
-
-    # Prepare placeholders for SQL IN clause dynamically
-    placeholders = ','.join(['?'] * len(entity_types))
-
-    try:
-        most_costly_team_query = f"""
-        SELECT e.name AS team_name, SUM(ccr.cost) AS total_cost
-        FROM entities e
-        JOIN repositories r ON r.entity_id = e.id AND r.is_active = 1
-        LEFT JOIN ci_cd_runs ccr ON ccr.repository_id = r.id
-            AND LOWER(ccr.platform) = ?
-            AND ccr.start_time >= ? AND ccr.start_time < ?
-        WHERE e.platform = ? AND e.type IN ({placeholders})
-        GROUP BY e.id
-        ORDER BY total_cost DESC
-        LIMIT 1;
-        """
-
-        most_jobs_team_query = f"""
-        SELECT e.name AS team_name, COUNT(ccr.id) AS total_jobs
-        FROM entities e
-        JOIN repositories r ON r.entity_id = e.id AND r.is_active = 1
-        LEFT JOIN ci_cd_runs ccr ON ccr.repository_id = r.id
-            AND LOWER(ccr.platform) = ?
-            AND ccr.start_time >= ? AND ccr.start_time < ?
-        WHERE e.platform = ? AND e.type IN ({placeholders})
-        GROUP BY e.id
-        ORDER BY total_jobs DESC
-        LIMIT 1;
-        """
-
-        most_failed_jobs_team_query = f"""
-        SELECT e.name AS team_name, COUNT(ccr.id) AS failed_jobs
-        FROM entities e
-        JOIN repositories r ON r.entity_id = e.id AND r.is_active = 1
-        LEFT JOIN ci_cd_runs ccr ON ccr.repository_id = r.id
-            AND LOWER(ccr.platform) = ?
-            AND ccr.start_time >= ? AND ccr.start_time < ?
-            AND ccr.status = 'failed'
-        WHERE e.platform = ? AND e.type IN ({placeholders})
-        GROUP BY e.id
-        ORDER BY failed_jobs DESC
-        LIMIT 1;
-        """
-
-        total_teams_query = f"""
-        SELECT COUNT(DISTINCT e.id) AS total_teams
-        FROM entities e
-        JOIN repositories r ON r.entity_id = e.id AND r.is_active = 1
-        WHERE e.platform = ? AND e.type IN ({placeholders});
-        """
-
-        total_cost_query = """
-        SELECT SUM(ccr.cost) AS total_cost
-        FROM ci_cd_runs ccr
-        WHERE LOWER(ccr.platform) = ? AND ccr.start_time >= ? AND ccr.start_time < ?;
-        """
-
-        total_jobs_query = f"""
-        SELECT COUNT(ccr.id) AS total_jobs_count
-        FROM ci_cd_runs ccr
-        JOIN repositories r ON ccr.repository_id = r.id AND r.is_active = 1
-        JOIN entities e ON r.entity_id = e.id
-        WHERE LOWER(ccr.platform) = ? 
-            AND ccr.start_time >= ? AND ccr.start_time < ?
-            AND e.platform = ? AND e.type IN ({placeholders});
-        """
+    try:
+        start_str, end_str = window_bounds(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-        # Params for queries with entity types
-        params_with_types = (platform, start_str, end_str, platform, *entity_types)
-        params_total_jobs = (platform, start_str, end_str, platform, *entity_types)
+    conn = get_db_connection()
+    if conn is None:
+        return jsonify({"error": "Failed to connect to database."}), 500
 
-        most_costly = conn.execute(most_costly_team_query, params_with_types).fetchone()
-        most_jobs = conn.execute(most_jobs_team_query, params_with_types).fetchone()
-        most_failed = conn.execute(most_failed_jobs_team_query, params_with_types).fetchone()
-        total_teams = conn.execute(total_teams_query, (platform, *entity_types)).fetchone()
-        total_cost = conn.execute(total_cost_query, (platform, start_str, end_str)).fetchone()
-        total_jobs = conn.execute(total_jobs_query, params_total_jobs).fetchone()
+    try:
+        scope = user_scope(conn, request.args)
+        # Decide entity types per platform
+        if platform == 'bitbucket':
+            entity_types = ("workspace",)
+        else:
+            entity_types = ("team", "group", "subgroup")
+
+        # Prepare placeholders for SQL IN clause dynamically
+        placeholders = ','.join(['?'] * len(entity_types))
+
+        # The leaderboards are enterprise-wide, so scoped requests aggregate the window.
+        board = leaderboard_range(conn, start_str, end_str) if scope is None else None
+        if board is not None:
+            # A materialized leaderboard covers the window: each team's totals
+            # are a lookup, so only the platform's teams are read.
+            query = f"""
+            WITH team_totals AS MATERIALIZED (
+                SELECT
+                  e.id,
+                  e.name AS team_name,
+                  ROUND(lb.total_cost, {COST_DIGITS}) AS total_cost,
+                  COALESCE(lb.total_jobs, 0) AS total_jobs,
+                  COALESCE(lb.failed_jobs, 0) AS failed_jobs
+                FROM entities e
+                LEFT JOIN leaderboard lb
+                  ON lb.range_name = ? AND lb.platform = ? AND lb.kind = 'team' AND lb.entity_id = e.id
+                WHERE e.platform = ? AND e.type IN ({placeholders})
+                  AND EXISTS (SELECT 1 FROM repositories r WHERE r.entity_id = e.id AND r.is_active = 1)
+                ORDER BY e.id
+            )
+            SELECT
+              mc.team_name AS most_costly_team,
+              mc.total_cost AS most_costly_team_cost,
+              mj.team_name AS team_with_most_jobs,
+              mj.total_jobs AS team_with_most_jobs_count,
+              mf.team_name AS team_with_most_failed_jobs,
+              mf.failed_jobs AS team_with_most_failed_jobs_count,
+              (SELECT COUNT(*) FROM team_totals) AS total_active_teams,
+              ROUND(p.total_cost, {COST_DIGITS}) AS total_cost,
+              (SELECT COALESCE(SUM(total_jobs), 0) FROM team_totals) AS total_jobs_count
+            FROM (SELECT 1)
+            LEFT JOIN leaderboard p
+              ON p.range_name = ? AND p.platform = ? AND p.kind = 'platform' AND p.entity_id = 0
+            LEFT JOIN (SELECT team_name, total_cost FROM team_totals ORDER BY total_cost DESC LIMIT 1) mc ON 1
+            LEFT JOIN (SELECT team_name, total_jobs FROM team_totals ORDER BY total_jobs DESC LIMIT 1) mj ON 1
+            LEFT JOIN (SELECT team_name, failed_jobs FROM team_totals ORDER BY failed_jobs DESC LIMIT 1) mf ON 1;
+            """
+            params = (board, platform, platform, *entity_types, board, platform)
+        else:
+            window_sql, window_params = scoped_window(conn, start_str, end_str, scope)
+            repo_scope_sql, repo_scope_params = scope_filter(scope, 'r.id')
+            # One pass over the window: per-repo totals feed per-team totals, and
+            # every card below is an argmax or a sum over those two small sets.
+            query = f"""
+            WITH window_runs AS ({window_sql}
+            ),
+            repo_totals AS MATERIALIZED (
+                SELECT
+                  w.repository_id,
+                  ROUND(SUM(w.cost), {COST_DIGITS}) AS total_cost,
+                  SUM(w.runs) AS total_jobs,
+                  SUM(CASE WHEN w.status = 'failed' THEN w.runs ELSE 0 END) AS failed_jobs
+                FROM window_runs w
+                WHERE w.platform = ?
+                GROUP BY w.repository_id
+            ),
+            team_totals AS MATERIALIZED (
+                SELECT
+                  e.id,
+                  e.name AS team_name,
+                  ROUND(SUM(rt.total_cost), {COST_DIGITS}) AS total_cost,
+                  COALESCE(SUM(rt.total_jobs), 0) AS total_jobs,
+                  COALESCE(SUM(rt.failed_jobs), 0) AS failed_jobs
+                FROM entities e
+                JOIN repositories r ON r.entity_id = e.id AND r.is_active = 1{repo_scope_sql}
+                LEFT JOIN repo_totals rt ON rt.repository_id = r.id
+                WHERE e.platform = ? AND e.type IN ({placeholders})
+                GROUP BY e.id
+            )
+            SELECT
+              mc.team_name AS most_costly_team,
+              mc.total_cost AS most_costly_team_cost,
+              mj.team_name AS team_with_most_jobs,
+              mj.total_jobs AS team_with_most_jobs_count,
+              mf.team_name AS team_with_most_failed_jobs,
+              mf.failed_jobs AS team_with_most_failed_jobs_count,
+              (SELECT COUNT(*) FROM team_totals) AS total_active_teams,
+              (SELECT ROUND(SUM(total_cost), {COST_DIGITS}) FROM repo_totals) AS total_cost,
+              (SELECT COALESCE(SUM(total_jobs), 0) FROM team_totals) AS total_jobs_count
+            FROM (SELECT 1)
+            LEFT JOIN (SELECT team_name, total_cost FROM team_totals ORDER BY total_cost DESC LIMIT 1) mc ON 1
+            LEFT JOIN (SELECT team_name, total_jobs FROM team_totals ORDER BY total_jobs DESC LIMIT 1) mj ON 1
+            LEFT JOIN (SELECT team_name, failed_jobs FROM team_totals ORDER BY failed_jobs DESC LIMIT 1) mf ON 1;
+            """
+            params = (*window_params, platform, *repo_scope_params, platform, *entity_types)
+        row = conn.execute(query, params).fetchone()
+        has_teams = row["total_active_teams"] > 0
 
         response = {
             "platform": platform,
-            "most_costly_team": most_costly["team_name"] if most_costly else None,
-            "most_costly_team_cost": most_costly["total_cost"] if most_costly else 0,
-            "team_with_most_jobs": most_jobs["team_name"] if most_jobs else None,
-            "team_with_most_jobs_count": most_jobs["total_jobs"] if most_jobs else 0,
-            "team_with_most_failed_jobs": most_failed["team_name"] if most_failed else None,
-            "team_with_most_failed_jobs_count": most_failed["failed_jobs"] if most_failed else 0,
-            "total_active_teams": total_teams["total_teams"] if total_teams else 0,
-            "total_cost": total_cost["total_cost"] if total_cost else 0,
-            "total_jobs_count": total_jobs["total_jobs_count"] if total_jobs else 0,
+            "most_costly_team": row["most_costly_team"],
+            "most_costly_team_cost": row["most_costly_team_cost"] if has_teams else 0,
+            "team_with_most_jobs": row["team_with_most_jobs"],
+            "team_with_most_jobs_count": row["team_with_most_jobs_count"] if has_teams else 0,
+            "team_with_most_failed_jobs": row["team_with_most_failed_jobs"],
+            "team_with_most_failed_jobs_count": row["team_with_most_failed_jobs_count"] if has_teams else 0,
+            "total_active_teams": row["total_active_teams"],
+            "total_cost": row["total_cost"],
+            "total_jobs_count": row["total_jobs_count"],
         }
 
         return jsonify(response)
 
+    except ScopeError as e:
+        return jsonify({"error": str(e)}), e.status
     except sqlite3.Error as e:
         print(f"Error fetching team summary: {e}")
         return jsonify({"error": f"Database query error: {e}"}), 500
@@ -289,14 +795,12 @@ def get_platform_teams_summary():
 
         
 @app.route('/api/platform-teams', methods=['GET'])
+@cached_response
 def get_platform_teams():
-    conn = get_db_connection()
-    if conn is None:
-        return jsonify({"error": "Failed to connect to database."}), 500
-
     platform = request.args.get('platform', '').lower()
-    range_str = request.args.get('range', '')
     sort_by = request.args.get('sort_by', 'total_cost')
+    rollup = request.args.get('rollup', 'none')
+    expand = request.args.get('expand', '')
 
     if not platform:
         return jsonify({"error": "Platform is required"}), 400
@@ -304,8 +808,11 @@ def get_platform_teams():
     if sort_by not in ['total_cost', 'total_jobs']:
         return jsonify({"error": "Invalid sort_by field"}), 400
 
-    start_date, end_date = calculate_date_range(range_str)
-    start_str, end_str = start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')
+    if rollup not in ['none', 'subtree']:
+        return jsonify({"error": "Invalid rollup field"}), 400
+
+    if expand and expand not in TEAM_EXPANSIONS:
+        return jsonify({"error": "Invalid expand field"}), 400
 
     # Map platform to team entity types
     platform_team_types = {
@@ -318,144 +825,204 @@ def get_platform_teams():
     if not team_types:
         return jsonify({"error": f"Unsupported platform: {platform}"}), 400
 
-    placeholders = ','.join(['?'] * len(team_types))
+    try:
+        start_str, end_str = window_bounds(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    conn = get_db_connection()
+    if conn is None:
+        return jsonify({"error": "Failed to connect to database."}), 500
 
     try:
+        scope = user_scope(conn, request.args)
+        placeholders = ','.join(['?'] * len(team_types))
+        window_sql, window_params = scoped_window(conn, start_str, end_str, scope)
+        # A scoped listing keeps the teams above a visible repository and counts only those.
+        team_scope_sql, team_scope_params = scope_filter(scope, 'e.id', 'entities')
+        repo_scope_sql, repo_scope_params = scope_filter(scope, 'r.id')
+        count_scope_sql, count_scope_params = scope_filter(scope, 'id')
+
         query = f"""
-        WITH RECURSIVE team_tree AS (
-            SELECT id, name, parent_id, 0 as depth
-            FROM entities
-            WHERE platform = ? AND type IN ({placeholders})
-            UNION ALL
-            SELECT e.id, e.name, e.parent_id, tt.depth + 1
-            FROM entities e
-            JOIN team_tree tt ON e.parent_id = tt.id
-            WHERE e.platform = ? AND e.type IN ({placeholders})
+        WITH window_runs AS ({window_sql}
         ),
-        team_tree_deduped AS (
-            SELECT id, name, parent_id, MAX(depth) as depth
-            FROM team_tree
-            GROUP BY id
+        -- depth counts the unbroken chain of platform teams above each team:
+        -- the nearest ancestor that is not one stops it, else the root does.
+        team_tree AS (
+            SELECT
+                e.id, e.name, e.parent_id,
+                COALESCE(
+                    MIN(CASE WHEN a.platform = ? AND a.type IN ({placeholders}) THEN NULL ELSE ec.depth END) - 1,
+                    MAX(ec.depth)
+                ) AS depth
+            FROM entities e
+            JOIN entity_closure ec ON ec.descendant_id = e.id
+            JOIN entities a ON a.id = ec.ancestor_id
+            WHERE e.platform = ? AND e.type IN ({placeholders}){team_scope_sql}
+            GROUP BY e.id
         ),
         team_jobs AS (
             SELECT 
                 tt.id as team_id,
-                COUNT(ccr.id) as total_jobs,
-                SUM(IFNULL(ccr.cost, 0.0)) as total_cost
-            FROM team_tree_deduped tt
-            LEFT JOIN repositories r ON r.entity_id = tt.id
-            LEFT JOIN ci_cd_runs ccr ON ccr.repository_id = r.id
-            WHERE LOWER(ccr.platform) = ?
-              AND ccr.start_time >= ? AND ccr.start_time < ?
+                SUM(w.runs) as total_jobs,
+                ROUND(SUM(IFNULL(w.cost, 0.0)), {COST_DIGITS}) as total_cost
+            FROM team_tree tt
+            LEFT JOIN repositories r ON r.entity_id = tt.id{repo_scope_sql}
+            LEFT JOIN window_runs w ON w.repository_id = r.id
+            WHERE w.platform = ?
             GROUP BY tt.id
-        ),
-        team_repos AS (
-            SELECT e.id as team_id, GROUP_CONCAT(DISTINCT r.name) as repos
-            FROM repositories r
-            JOIN entities e ON r.entity_id = e.id
-            GROUP BY e.id
         )
         SELECT
+            tt.id AS team_id,
             tt.name AS team_name,
+            tt.parent_id AS parent_team_id,
             (SELECT name FROM entities WHERE id = tt.parent_id) AS parent_team_name,
             COALESCE(tj.total_jobs, 0) AS total_jobs,
             COALESCE(tj.total_cost, 0.0) AS total_cost,
             COALESCE(tt.depth, 0) AS depth,
-            COALESCE(tr.repos, '') AS repositories
-        FROM team_tree_deduped tt
+            (SELECT COUNT(*) FROM repositories WHERE entity_id = tt.id{count_scope_sql}) AS repository_count
+        FROM team_tree tt
         LEFT JOIN team_jobs tj ON tj.team_id = tt.id
-        LEFT JOIN team_repos tr ON tr.team_id = tt.id
         ORDER BY {sort_by} DESC;
         """
 
-        params = [platform] + team_types + [platform] + team_types + [platform, start_str, end_str]
+        params = (window_params + [platform] + team_types + [platform] + team_types + team_scope_params
+                  + repo_scope_params + [platform] + count_scope_params)
 
         cursor = conn.execute(query, params)
-        rows = cursor.fetchall()
+        fmt = stream_format(request)
+        attach = partial(expand_team_repositories, conn, expand=expand, scope=scope) if expand else None
+        if fmt and rollup == 'none':
+            # The response drains the cursor as it is sent and releases conn after.
+            response = stream_rows(fmt, cursor=cursor, conn=conn, attach=attach)
+            conn = None
+            return response
 
-        result = []
-        for row in rows:
-            d = dict(row)
-            d['repositories'] = d['repositories'].split(',') if d['repositories'] else []
-            result.append(d)
+        result = [dict(row) for row in cursor.fetchall()]
+        if attach:
+            attach(result)
 
-        return jsonify(result)
+        if rollup == 'subtree':
+            roll_up_subtree_totals(result)
+            result.sort(key=lambda t: t[f'subtree_{sort_by}'], reverse=True)
 
+        return stream_rows(fmt, result) if fmt else jsonify(result)
+
+    except ScopeError as e:
+        return jsonify({"error": str(e)}), e.status
     except sqlite3.Error as e:
         print(f"Error fetching teams: {e}")
         return jsonify({"error": f"Database query error: {e}"}), 500
     finally:
-        conn.close()
+        if conn is not None:
+            conn.close()
 
         
 @app.route('/api/platform-repositories-summary', methods=['GET'])
+@cached_response
 def get_platform_repositories_summary():
-    conn = get_db_connection()
-    if conn is None:
-        return jsonify({"error": "Failed to connect to database."}), 500
-
     platform = request.args.get('platform', '').lower()
-    range_str = request.args.get('range', '')
     if not platform:
         return jsonify({"error": "Platform is required"}), 400
 
-    start_date, end_date = calculate_date_range(range_str)
-    start_str, end_str = start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')
-
     try:
-        # Most costly repository
-        most_costly_query = """
-        SELECT r.name AS repo_name, SUM(ccr.cost) AS total_cost
-        FROM ci_cd_runs ccr
-        JOIN repositories r ON r.id = ccr.repository_id
-        WHERE LOWER(ccr.platform) = ? AND ccr.start_time >= ? AND ccr.start_time < ?
-        GROUP BY r.id
-        ORDER BY total_cost DESC
-        LIMIT 1;
-        """
+        start_str, end_str = window_bounds(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-        # Most active repository
-        most_jobs_query = """
-        SELECT r.name AS repo_name, COUNT(ccr.id) AS total_jobs
-        FROM ci_cd_runs ccr
-        JOIN repositories r ON r.id = ccr.repository_id
-        WHERE LOWER(ccr.platform) = ? AND ccr.start_time >= ? AND ccr.start_time < ?
-        GROUP BY r.id
-        ORDER BY total_jobs DESC
-        LIMIT 1;
-        """
-
-        # Total active repositories
-        total_repos_query = """
-        SELECT COUNT(*) AS total_repos
-        FROM repositories
-        WHERE LOWER(platform) = ? AND is_active = 1;
-        """
-
-        # Total cost for platform
-        total_cost_query = """
-        SELECT SUM(ccr.cost) AS total_cost
-        FROM ci_cd_runs ccr
-        WHERE LOWER(ccr.platform) = ? AND ccr.start_time >= ? AND ccr.start_time < ?;
-        """
+    conn = get_db_connection()
+    if conn is None:
+        return jsonify({"error": "Failed to connect to database."}), 500
 
-        most_costly = conn.execute(most_costly_query, (platform, start_str, end_str)).fetchone()
-        most_jobs = conn.execute(most_jobs_query, (platform, start_str, end_str)).fetchone()
-        total_repos = conn.execute(total_repos_query, (platform,)).fetchone()
-        total_cost = conn.execute(total_cost_query, (platform, start_str, end_str)).fetchone()
+    try:
+        scope = user_scope(conn, request.args)
+        # The leaderboards are enterprise-wide, so scoped requests aggregate the window.
+        board = leaderboard_range(conn, start_str, end_str) if scope is None else None
+        if board is not None:
+            # A materialized leaderboard covers the window: every card is an
+            # index lookup.
+            query = f"""
+            SELECT
+              mc.repo_name AS most_costly_repo,
+              mc.total_cost AS most_costly_repo_cost,
+              mj.repo_name AS repo_with_most_jobs,
+              mj.total_jobs AS repo_with_most_jobs_count,
+              (SELECT COUNT(*) FROM repositories WHERE platform = ? AND is_active = 1) AS total_active_repositories,
+              ROUND(p.total_cost, {COST_DIGITS}) AS total_cost
+            FROM (SELECT 1)
+            LEFT JOIN leaderboard p
+              ON p.range_name = ? AND p.platform = ? AND p.kind = 'platform' AND p.entity_id = 0
+            LEFT JOIN (
+                SELECT r.name AS repo_name, ROUND(lb.total_cost, {COST_DIGITS}) AS total_cost
+                FROM leaderboard lb
+                JOIN repositories r ON r.id = lb.entity_id
+                WHERE lb.range_name = ? AND lb.platform = ? AND lb.kind = 'repository'
+                ORDER BY lb.total_cost DESC
+                LIMIT 1
+            ) mc ON 1
+            LEFT JOIN (
+                SELECT r.name AS repo_name, lb.total_jobs
+                FROM leaderboard lb
+                JOIN repositories r ON r.id = lb.entity_id
+                WHERE lb.range_name = ? AND lb.platform = ? AND lb.kind = 'repository'
+                ORDER BY lb.total_jobs DESC
+                LIMIT 1
+            ) mj ON 1;
+            """
+            params = (platform, *(board, platform) * 3)
+        else:
+            window_sql, window_params = scoped_window(conn, start_str, end_str, scope)
+            count_scope_sql, count_scope_params = scope_filter(scope, 'id')
+            # One pass over the window: per-repo totals, then the summary derived from them
+            query = f"""
+            WITH window_runs AS ({window_sql}
+            ),
+            repo_totals AS MATERIALIZED (
+                SELECT r.name AS repo_name, ROUND(SUM(w.cost), {COST_DIGITS}) AS total_cost, SUM(w.runs) AS total_jobs
+                FROM window_runs w
+                LEFT JOIN repositories r ON r.id = w.repository_id
+                WHERE w.platform = ?
+                GROUP BY w.repository_id
+            )
+            SELECT
+              mc.repo_name AS most_costly_repo,
+              mc.total_cost AS most_costly_repo_cost,
+              mj.repo_name AS repo_with_most_jobs,
+              mj.total_jobs AS repo_with_most_jobs_count,
+              (SELECT COUNT(*) FROM repositories
+               WHERE platform = ? AND is_active = 1{count_scope_sql}) AS total_active_repositories,
+              (SELECT ROUND(SUM(total_cost), {COST_DIGITS}) FROM repo_totals) AS total_cost
+            FROM (SELECT 1)
+            LEFT JOIN (
+                SELECT repo_name, total_cost FROM repo_totals
+                WHERE repo_name IS NOT NULL
+                ORDER BY total_cost DESC
+                LIMIT 1
+            ) mc ON 1
+            LEFT JOIN (
+                SELECT repo_name, total_jobs FROM repo_totals
+                WHERE repo_name IS NOT NULL
+                ORDER BY total_jobs DESC
+                LIMIT 1
+            ) mj ON 1;
+            """
+            params = (*window_params, platform, platform, *count_scope_params)
+        row = conn.execute(query, params).fetchone()
 
         response = {
             "platform": platform,
-            "most_costly_repo": most_costly["repo_name"] if most_costly else None,
-            "most_costly_repo_cost": most_costly["total_cost"] if most_costly else 0,
-            "repo_with_most_jobs": most_jobs["repo_name"] if most_jobs else None,
-            "repo_with_most_jobs_count": most_jobs["total_jobs"] if most_jobs else 0,
-            "total_active_repositories": total_repos["total_repos"] if total_repos else 0,
-            "total_cost": total_cost["total_cost"] if total_cost else 0,
+            "most_costly_repo": row["most_costly_repo"],
+            "most_costly_repo_cost": row["most_costly_repo_cost"] if row["most_costly_repo"] is not None else 0,
+            "repo_with_most_jobs": row["repo_with_most_jobs"],
+            "repo_with_most_jobs_count": row["repo_with_most_jobs_count"] if row["repo_with_most_jobs"] is not None else 0,
+            "total_active_repositories": row["total_active_repositories"],
+            "total_cost": row["total_cost"],
         }
 
         return jsonify(response)
 
+    except ScopeError as e:
+        return jsonify({"error": str(e)}), e.status
     except sqlite3.Error as e:
         print(f"Error fetching repository summary: {e}")
         return jsonify({"error": f"Database query error: {e}"}), 500
@@ -463,13 +1030,9 @@ def get_platform_repositories_summary():
         conn.close()
 
 @app.route('/api/platform-repositories', methods=['GET'])
+@cached_response
 def get_platform_repositories():
-    conn = get_db_connection()
-    if conn is None:
-        return jsonify({"error": "Failed to connect to database."}), 500
-
     platform = request.args.get('platform', '').lower()
-    range_str = request.args.get('range', '')
     sort_by = request.args.get('sort_by', 'total_cost')
 
     if not platform:
@@ -478,169 +1041,966 @@ def get_platform_repositories():
     if sort_by not in ['total_cost', 'total_jobs']:
         return jsonify({"error": "Invalid sort_by field"}), 400
 
-    start_date, end_date = calculate_date_range(range_str)
-    start_str, end_str = start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')
+    try:
+        limit, after = parse_page_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        start_str, end_str = window_bounds(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    conn = get_db_connection()
+    if conn is None:
+        return jsonify({"error": "Failed to connect to database."}), 500
 
     try:
+        scope = user_scope(conn, request.args)
+        window_sql, window_params = scoped_window(conn, start_str, end_str, scope)
+        filter_sql, filter_params = repository_filters(request.args)
+        scope_sql, scope_params = scope_filter(scope, 'r.id')
+        page_sql, page_params = keyset_clause(sort_by, limit, after)
+
         query = f"""
-        SELECT 
-            r.name AS repo_name,
-            e.name AS team_name,
-            COUNT(ccr.id) AS total_jobs,
-            COALESCE(SUM(ccr.cost), 0.0) AS total_cost
-        FROM repositories r
-        JOIN entities e ON r.entity_id = e.id
-        LEFT JOIN ci_cd_runs ccr ON r.id = ccr.repository_id
-            AND LOWER(ccr.platform) = ?
-            AND ccr.start_time >= ? AND ccr.start_time < ?
-        WHERE LOWER(r.platform) = ? AND r.is_active = 1
-        GROUP BY r.id
-        ORDER BY {sort_by} DESC;
+        WITH window_runs AS ({window_sql}
+        ),
+        repo_totals AS (
+            SELECT 
+                r.id AS repo_id,
+                r.name AS repo_name,
+                e.name AS team_name,
+                COALESCE(SUM(w.runs), 0) AS total_jobs,
+                ROUND(COALESCE(SUM(w.cost), 0.0), {COST_DIGITS}) AS total_cost
+            FROM repositories r
+            JOIN entities e ON r.entity_id = e.id
+            LEFT JOIN window_runs w ON r.id = w.repository_id
+                AND w.platform = ?
+            WHERE r.platform = ? AND r.is_active = 1{filter_sql}{scope_sql}
+            GROUP BY r.id
+        )
+        SELECT repo_name, team_name, total_jobs, total_cost, repo_id
+        FROM repo_totals
+        {page_sql};
         """
-        cursor = conn.execute(query, (platform, start_str, end_str, platform))
-        repos = [dict(row) for row in cursor.fetchall()]
+        params = (*window_params, platform, platform, *filter_params, *scope_params, *page_params)
+        cursor = conn.execute(query, params)
+        fmt = stream_format(request)
+        if fmt and limit is None:
+            response = stream_rows(fmt, cursor=cursor, conn=conn)
+            conn = None
+            return response
+
+        repos, next_cursor = split_page([dict(row) for row in cursor.fetchall()], sort_by, limit)
 
-        return jsonify(repos)
+        response = stream_rows(fmt, repos) if fmt else jsonify(repos)
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response
 
+    except ScopeError as e:
+        return jsonify({"error": str(e)}), e.status
     except sqlite3.Error as e:
         print(f"Error fetching repository list: {e}")
         return jsonify({"error": f"Database query error: {e}"}), 500
+    finally:
+        if conn is not None:
+            conn.close()
+
+MAX_LEADERBOARD_SIZE = 100
+
+@app.route('/api/leaderboard', methods=['GET'])
+@cached_response
+def get_leaderboard():
+    platform = request.args.get('platform', '').lower()
+    kind = request.args.get('kind', 'repository')
+    sort_by = request.args.get('sort_by', 'total_cost')
+
+    if not platform:
+        return jsonify({"error": "Platform is required"}), 400
+
+    if kind not in ['repository', 'team']:
+        return jsonify({"error": "Invalid kind. Use 'repository' or 'team'"}), 400
+
+    if sort_by not in ['total_cost', 'total_jobs', 'failed_jobs']:
+        return jsonify({"error": "Invalid sort_by field"}), 400
+
+    try:
+        k = int(request.args.get('k', 10))
+    except ValueError:
+        return jsonify({"error": "k must be an integer"}), 400
+    if not 1 <= k <= MAX_LEADERBOARD_SIZE:
+        return jsonify({"error": f"k must be between 1 and {MAX_LEADERBOARD_SIZE}"}), 400
+
+    try:
+        start_str, end_str = window_bounds(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    conn = get_db_connection()
+    if conn is None:
+        return jsonify({"error": "Failed to connect to database."}), 500
+
+    try:
+        scope = user_scope(conn, request.args)
+        names = "repositories" if kind == 'repository' else "entities"
+        board = leaderboard_range(conn, start_str, end_str) if scope is None else None
+        if board is not None:
+            query = f"""
+            SELECT lb.entity_id AS id, n.name AS name, ROUND(lb.total_cost, {COST_DIGITS}) AS total_cost,
+                   lb.total_jobs, lb.failed_jobs
+            FROM leaderboard lb
+            JOIN {names} n ON n.id = lb.entity_id
+            WHERE lb.range_name = ? AND lb.platform = ? AND lb.kind = '{kind}'
+            ORDER BY lb.{sort_by} DESC, lb.entity_id
+            LIMIT ?;
+            """
+            params = (board, platform, k)
+        else:
+            window_sql, window_params = scoped_window(conn, start_str, end_str, scope)
+            # Teams count their active repositories only, as in the team summaries
+            owner_sql = "w.repository_id" if kind == 'repository' else "r.entity_id"
+            active_sql = "" if kind == 'repository' else " AND r.is_active = 1"
+            query = f"""
+            WITH window_runs AS ({window_sql}
+            ),
+            totals AS (
+                SELECT
+                  {owner_sql} AS id,
+                  ROUND(SUM(w.cost), {COST_DIGITS}) AS total_cost,
+                  SUM(w.runs) AS total_jobs,
+                  SUM(CASE WHEN w.status = 'failed' THEN w.runs ELSE 0 END) AS failed_jobs
+                FROM window_runs w
+                JOIN repositories r ON r.id = w.repository_id{active_sql}
+                WHERE w.platform = ?
+                GROUP BY {owner_sql}
+            )
+            SELECT t.id, n.name, t.total_cost, t.total_jobs, t.failed_jobs
+            FROM totals t
+            JOIN {names} n ON n.id = t.id
+            ORDER BY t.{sort_by} DESC, t.id
+            LIMIT ?;
+            """
+            params = (*window_params, platform, k)
+
+        prefix = "repo" if kind == 'repository' else "team"
+        leaders = [
+            {
+                "rank": rank,
+                f"{prefix}_id": row["id"],
+                f"{prefix}_name": row["name"],
+                "total_cost": row["total_cost"],
+                "total_jobs": row["total_jobs"],
+                "failed_jobs": row["failed_jobs"],
+            }
+            for rank, row in enumerate(conn.execute(query, params).fetchall(), start=1)
+        ]
+        return jsonify(leaders)
+
+    except ScopeError as e:
+        return jsonify({"error": str(e)}), e.status
+    except sqlite3.Error as e:
+        print(f"Error fetching leaderboard: {e}")
+        return jsonify({"error": f"Database query error: {e}"}), 500
     finally:
         conn.close()
         
         
 @app.route('/api/teams', methods=['GET'])
+@cached_response
 def get_global_teams():
-    conn = get_db_connection()
-    if conn is None:
-        return jsonify({"error": "Failed to connect to database."}), 500
-
-    range_str = request.args.get('range', '')
     sort_by = request.args.get('sort_by', 'total_cost')
+    rollup = request.args.get('rollup', 'none')
+    expand = request.args.get('expand', '')
 
     valid_sort_fields = ["total_cost", "total_jobs"]
     if sort_by not in valid_sort_fields:
         return jsonify({"error": f"Invalid sort_by. Use one of {valid_sort_fields}"}), 400
 
-    start_date, end_date = calculate_date_range(range_str)
-    start_str = start_date.strftime('%Y-%m-%d')
-    end_str = end_date.strftime('%Y-%m-%d')
+    valid_rollups = ["none", "subtree"]
+    if rollup not in valid_rollups:
+        return jsonify({"error": f"Invalid rollup. Use one of {valid_rollups}"}), 400
+
+    if expand and expand not in TEAM_EXPANSIONS:
+        return jsonify({"error": f"Invalid expand. Use one of {sorted(TEAM_EXPANSIONS)}"}), 400
 
     try:
+        start_str, end_str = window_bounds(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    conn = get_db_connection()
+    if conn is None:
+        return jsonify({"error": "Failed to connect to database."}), 500
+
+    try:
+        scope = user_scope(conn, request.args)
+        window_sql, window_params = scoped_window(conn, start_str, end_str, scope)
+        # A scoped listing keeps the teams above a visible repository and counts only those.
+        team_scope_sql, team_scope_params = scope_filter(scope, 'e.id', 'entities')
+        repo_scope_sql, repo_scope_params = scope_filter(scope, 'r.id')
+        count_scope_sql, count_scope_params = scope_filter(scope, 'id')
+
         query = f"""
-        WITH RECURSIVE team_tree AS (
-            SELECT id, name, parent_id, platform, type, 0 AS depth
-            FROM entities
-            WHERE type IN ('team', 'group', 'subgroup', 'workspace', 'project')
-            UNION ALL
-            SELECT e.id, e.name, e.parent_id, e.platform, e.type, tt.depth + 1
-            FROM entities e
-            JOIN team_tree tt ON e.parent_id = tt.id
+        WITH window_runs AS ({window_sql}
         ),
-        team_tree_deduped AS (
-            SELECT id, name, parent_id, platform, type, MAX(depth) as depth
-            FROM team_tree
-            GROUP BY id
+        -- Every entity under (or at) a team-like entity, at its deepest distance from one.
+        team_tree AS (
+            SELECT e.id, e.name, e.parent_id, e.platform, e.type, MAX(ec.depth) AS depth
+            FROM entity_closure ec
+            JOIN entities a ON a.id = ec.ancestor_id
+            JOIN entities e ON e.id = ec.descendant_id
+            WHERE a.type IN ('team', 'group', 'subgroup', 'workspace', 'project'){team_scope_sql}
+            GROUP BY e.id
         ),
         team_jobs AS (
             SELECT 
                 tt.id as team_id,
-                COUNT(ccr.id) as total_jobs,
-                SUM(IFNULL(ccr.cost, 0.0)) as total_cost
-            FROM team_tree_deduped tt
-            LEFT JOIN repositories r ON r.entity_id = tt.id
-            LEFT JOIN ci_cd_runs ccr ON ccr.repository_id = r.id
-                AND ccr.start_time >= ? AND ccr.start_time < ?
+                COALESCE(SUM(w.runs), 0) as total_jobs,
+                ROUND(SUM(IFNULL(w.cost, 0.0)), {COST_DIGITS}) as total_cost
+            FROM team_tree tt
+            LEFT JOIN repositories r ON r.entity_id = tt.id{repo_scope_sql}
+            LEFT JOIN window_runs w ON w.repository_id = r.id
             GROUP BY tt.id
-        ),
-        team_repos AS (
-            SELECT r.entity_id as team_id, GROUP_CONCAT(DISTINCT r.name) as repos
-            FROM repositories r
-            GROUP BY r.entity_id
         )
         SELECT
+            tt.id AS team_id,
             tt.name AS team_name,
             tt.platform AS platform,
             tt.type AS entity_type,
+            tt.parent_id AS parent_team_id,
             (SELECT name FROM entities WHERE id = tt.parent_id) AS parent_team_name,
             COALESCE(tj.total_jobs, 0) AS total_jobs,
             COALESCE(tj.total_cost, 0.0) AS total_cost,
             COALESCE(tt.depth, 0) AS depth,
-            COALESCE(tr.repos, '') AS repositories
-        FROM team_tree_deduped tt
+            (SELECT COUNT(*) FROM repositories WHERE entity_id = tt.id{count_scope_sql}) AS repository_count
+        FROM team_tree tt
         LEFT JOIN team_jobs tj ON tj.team_id = tt.id
-        LEFT JOIN team_repos tr ON tr.team_id = tt.id
         ORDER BY {sort_by} DESC;
         """
 
-        params = [start_str, end_str]
-        cursor = conn.execute(query, params)
+        cursor = conn.execute(
+            query, window_params + team_scope_params + repo_scope_params + count_scope_params
+        )
+        fmt = stream_format(request)
+        attach = partial(expand_team_repositories, conn, expand=expand, scope=scope) if expand else None
+        if fmt and rollup == 'none':
+            response = stream_rows(fmt, cursor=cursor, conn=conn, attach=attach)
+            conn = None
+            return response
+
         result = [dict(row) for row in cursor.fetchall()]
-        for r in result:
-            r["repositories"] = r["repositories"].split(',') if r["repositories"] else []
+        if attach:
+            attach(result)
 
-        return jsonify(result)
+        if rollup == 'subtree':
+            roll_up_subtree_totals(result)
+            result.sort(key=lambda t: t[f"subtree_{sort_by}"], reverse=True)
 
+        return stream_rows(fmt, result) if fmt else jsonify(result)
+
+    except ScopeError as e:
+        return jsonify({"error": str(e)}), e.status
     except sqlite3.Error as e:
         print(f"Error fetching global teams: {e}")
         return jsonify({"error": f"Database query error: {e}"}), 500
     finally:
-        conn.close()
+        if conn is not None:
+            conn.close()
         
 
 @app.route('/api/repositories', methods=['GET'])
+@cached_response
 def get_global_repositories():
+    sort_by = request.args.get('sort_by', 'total_cost')
+
+    valid_sort_fields = ["total_cost", "total_jobs"]
+    if sort_by not in valid_sort_fields:
+        return jsonify({"error": f"Invalid sort_by. Use one of {valid_sort_fields}"}), 400
+
+    try:
+        limit, after = parse_page_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        start_str, end_str = window_bounds(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     conn = get_db_connection()
     if conn is None:
         return jsonify({"error": "Failed to connect to database."}), 500
 
-    range_str = request.args.get('range', '')
+    try:
+        scope = user_scope(conn, request.args)
+        window_sql, window_params = scoped_window(conn, start_str, end_str, scope)
+        filter_sql, filter_params = repository_filters(request.args)
+        scope_sql, scope_params = scope_filter(scope, 'r.id')
+        page_sql, page_params = keyset_clause(sort_by, limit, after)
+
+        # The summary covers every filtered repository, not just this page, so it
+        # is computed over repo_totals and returned alongside the page rows.
+        query = f"""
+        WITH window_runs AS ({window_sql}
+        ),
+        repo_totals AS MATERIALIZED (
+            SELECT 
+                r.id AS repo_id,
+                r.name AS repo_name,
+                e.name AS team_name,
+                r.platform AS platform,
+                COALESCE(SUM(w.runs), 0) AS total_jobs,
+                ROUND(COALESCE(SUM(w.cost), 0.0), {COST_DIGITS}) AS total_cost
+            FROM repositories r
+            JOIN entities e ON r.entity_id = e.id
+            LEFT JOIN window_runs w
+                ON r.id = w.repository_id
+            WHERE r.is_active = 1{filter_sql}{scope_sql}
+            GROUP BY r.id
+        ),
+        page AS (
+            SELECT * FROM repo_totals
+            {page_sql}
+        )
+        SELECT
+            (SELECT repo_name FROM repo_totals ORDER BY total_cost DESC, repo_id LIMIT 1) AS most_expensive_repo,
+            (SELECT repo_name FROM repo_totals ORDER BY total_jobs DESC, repo_id LIMIT 1) AS most_jobs_repo,
+            (SELECT repo_name FROM repo_totals ORDER BY total_cost ASC, repo_id LIMIT 1) AS cheapest_repo,
+            page.repo_name, page.team_name, page.platform, page.total_jobs, page.total_cost, page.repo_id
+        FROM (SELECT 1)
+        LEFT JOIN page ON 1
+        ORDER BY page.{sort_by} DESC, page.repo_id
+        """
+
+        cursor = conn.execute(query, (*window_params, *filter_params, *scope_params, *page_params))
+        summary_columns = ("most_expensive_repo", "most_jobs_repo", "cheapest_repo")
+
+        def repo_row(row):
+            return {k: row[k] for k in row.keys() if k not in summary_columns}
+
+        # Every row repeats the summary; an empty page is a single row of NULLs.
+        first = cursor.fetchone()
+        summary = {column: first[column] for column in summary_columns}
+        rows = [first] if first["repo_id"] is not None else []
+
+        fmt = stream_format(request)
+        # Streamed JSON keeps the usual envelope, with the rows written in between.
+        prefix = f'{{"summary":{json.dumps(summary, sort_keys=True)},"repositories":['
+        if fmt and limit is None:
+            response = stream_rows(
+                fmt, rows, cursor=cursor, conn=conn, transform=repo_row,
+                prefix=prefix, suffix='],"next_cursor":null}',
+            )
+            conn = None
+            return response
+
+        rows += cursor.fetchall()
+        repos, next_cursor = split_page([repo_row(row) for row in rows], sort_by, limit)
+
+        if fmt:
+            response = stream_rows(fmt, repos, prefix=prefix, suffix=f'],"next_cursor":{json.dumps(next_cursor)}}}')
+            if next_cursor:
+                response.headers['X-Next-Cursor'] = next_cursor
+            return response
+        return jsonify({"repositories": repos, "summary": summary, "next_cursor": next_cursor})
+
+    except ScopeError as e:
+        return jsonify({"error": str(e)}), e.status
+    except sqlite3.Error as e:
+        print(f"Error fetching repositories: {e}")
+        return jsonify({"error": f"Database query error: {e}"}), 500
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+# SQL for the first day of each ?bucket= of the cost timeseries, over the
+# rollup's YYYY-MM-DD day column. Weeks start on Monday.
+TIMESERIES_BUCKETS = {
+    'day': "w.day",
+    'week': "date(w.day, '-6 days', 'weekday 1')",
+    'month': "strftime('%Y-%m-01', w.day)",
+}
+
+def bucket_start(day, bucket):
+    """Python twin of TIMESERIES_BUCKETS for filling in empty buckets."""
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+def next_bucket(day, bucket):
+    """The bucket after the one starting on day."""
+    if bucket == 'week':
+        return day + timedelta(days=7)
+    if bucket == 'month':
+        return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return day + timedelta(days=1)
+
+@app.route('/api/cost-timeseries', methods=['GET'])
+@cached_response
+def get_cost_timeseries():
+    bucket = request.args.get('bucket', 'day')
+    platform = request.args.get('platform', '').lower()
+    team_id = request.args.get('team_id', '')
+    repo_id = request.args.get('repo_id', '')
+
+    if bucket not in TIMESERIES_BUCKETS:
+        return jsonify({"error": f"Invalid bucket. Use one of {list(TIMESERIES_BUCKETS)}"}), 400
+
+    for name, value in (('team_id', team_id), ('repo_id', repo_id)):
+        if value and not value.isdigit():
+            return jsonify({"error": f"{name} must be an integer"}), 400
+
+    try:
+        start_str, end_str = window_bounds(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    conn = get_db_connection()
+    if conn is None:
+        return jsonify({"error": "Failed to connect to database."}), 500
+
+    try:
+        # Always served from the daily rollup, so even multi-year charts are one
+        # range read on its (day, ...) or (repository_id, day) keys.
+        window_sql, window_params = window_runs(start_str, end_str, by_day=True, run_tables=conn.run_tables)
+
+        conditions, params = [], []
+        if platform:
+            conditions.append("w.platform = ?")
+            params.append(platform)
+        if repo_id:
+            conditions.append("w.repository_id = ?")
+            params.append(int(repo_id))
+        if team_id:
+            # The team and every entity below it.
+            conditions.append("""w.repository_id IN (
+                SELECT r.id
+                FROM entity_closure ec
+                JOIN repositories r ON r.entity_id = ec.descendant_id
+                WHERE ec.ancestor_id = ?
+            )""")
+            params.append(int(team_id))
+        where_sql = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        query = f"""
+        WITH window_runs AS ({window_sql}
+        )
+        SELECT
+            {TIMESERIES_BUCKETS[bucket]} AS bucket,
+            ROUND(SUM(w.cost), {COST_DIGITS}) AS total_cost,
+            SUM(w.runs) AS total_jobs,
+            SUM(CASE WHEN w.status = 'failed' THEN w.runs ELSE 0 END) AS failed_jobs,
+            ROUND(SUM(CASE WHEN w.status = 'failed' THEN w.cost ELSE 0 END), {COST_DIGITS}) AS failed_cost
+        FROM window_runs w
+        {where_sql}
+        GROUP BY bucket
+        ORDER BY bucket;
+        """
+        rows = {row["bucket"]: dict(row) for row in conn.execute(query, (*window_params, *params))}
+
+        # Every bucket the window touches is listed, with zeros where nothing ran.
+        series = []
+        day = bucket_start(datetime.fromisoformat(start_str).date(), bucket)
+        last_day = (datetime.fromisoformat(end_str) - timedelta(seconds=1)).date()
+        while day <= last_day:
+            key = day.isoformat()
+            series.append(rows.get(key) or {
+                "bucket": key, "total_cost": 0.0, "total_jobs": 0, "failed_jobs": 0, "failed_cost": 0.0,
+            })
+            day = next_bucket(day, bucket)
+
+        return jsonify({"bucket": bucket, "start": start_str, "end": end_str, "series": series})
+
+    except sqlite3.Error as e:
+        print(f"Error fetching cost timeseries: {e}")
+        return jsonify({"error": f"Database query error: {e}"}), 500
+    finally:
+        conn.close()
+
+# ?group_by= and filter names of the breakdown, mapped to their columns.
+BREAKDOWN_DIMENSIONS = {
+    'workflow': 'workflow_name',
+    'branch': 'branch',
+    'os': 'os',
+    'platform': 'platform',
+}
+BREAKDOWN_QUANTILES = (('p50', 0.5), ('p90', 0.9), ('p99', 0.99))
+BREAKDOWN_SORT_FIELDS = ['total_cost', 'total_jobs', 'failed_jobs', 'failure_rate_percent'] + [
+    f'{name}_duration_seconds' for name, _ in BREAKDOWN_QUANTILES
+]
+
+@app.route('/api/breakdown', methods=['GET'])
+@cached_response
+def get_breakdown():
+    group_by = [name for name in request.args.get('group_by', 'workflow').split(',') if name]
     sort_by = request.args.get('sort_by', 'total_cost')
 
-    valid_sort_fields = ["total_cost", "total_jobs"]
-    if sort_by not in valid_sort_fields:
-        return jsonify({"error": f"Invalid sort_by. Use one of {valid_sort_fields}"}), 400
+    for name in group_by:
+        if name not in BREAKDOWN_DIMENSIONS:
+            return jsonify({"error": f"Invalid group_by. Use a comma-separated list of {list(BREAKDOWN_DIMENSIONS)}"}), 400
+    group_by = list(dict.fromkeys(group_by))
+
+    if sort_by not in BREAKDOWN_SORT_FIELDS:
+        return jsonify({"error": f"Invalid sort_by. Use one of {BREAKDOWN_SORT_FIELDS}"}), 400
+
+    limit = request.args.get('limit', '100')
+    if not limit.isdigit() or not 1 <= int(limit) <= MAX_PAGE_SIZE:
+        return jsonify({"error": f"limit must be an integer between 1 and {MAX_PAGE_SIZE}"}), 400
+    limit = int(limit)
+
+    try:
+        start_str, end_str = window_bounds(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    conn = get_db_connection()
+    if conn is None:
+        return jsonify({"error": "Failed to connect to database."}), 500
+
+    try:
+        window_sql, window_params = breakdown_window(start_str, end_str, run_tables=conn.run_tables)
+
+        # ?platform=, ?workflow=, ?branch= and ?os= narrow the breakdown to one value each.
+        conditions, params = [], []
+        for name, column in BREAKDOWN_DIMENSIONS.items():
+            value = request.args.get(name)
+            if value is not None:
+                conditions.append(f"b.{column} = ?")
+                params.append(value.lower() if name == 'platform' else value)
+        where_sql = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        columns = [BREAKDOWN_DIMENSIONS[name] for name in group_by]
+        group_sql = ''.join(f"b.{column}, " for column in columns)
+
+        # One row per group and duration bucket; the buckets of a group are
+        # its merged sketch, so the percentiles are read off in Python.
+        query = f"""
+        WITH breakdown AS ({window_sql}
+        )
+        SELECT
+            {group_sql}b.bucket,
+            SUM(b.runs) AS runs,
+            SUM(b.failed_runs) AS failed_runs,
+            SUM(b.cost) AS cost,
+            SUM(b.duration_seconds) AS duration_seconds
+        FROM breakdown b
+        {where_sql}
+        GROUP BY {group_sql}b.bucket;
+        """
+        groups = {}
+        for row in conn.execute(query, (*window_params, *params)):
+            key = tuple(row[column] for column in columns)
+            group = groups.get(key)
+            if group is None:
+                # '' stands for runs that did not record the dimension.
+                group = groups[key] = {column: value or None for column, value in zip(columns, key)}
+                group.update(total_cost=0.0, total_jobs=0, failed_jobs=0, duration=0, sketch={})
+            group["total_cost"] += row["cost"]
+            group["total_jobs"] += row["runs"]
+            group["failed_jobs"] += row["failed_runs"]
+            group["sketch"][row["bucket"]] = row["runs"]
+            if row["bucket"]:
+                group["duration"] += row["duration_seconds"]
+
+        result = []
+        for group in groups.values():
+            sketch = group.pop("sketch")
+            timed_jobs = group["total_jobs"] - sketch.get(0, 0)
+            duration = group.pop("duration")
+            group["total_cost"] = round(group["total_cost"], COST_DIGITS)
+            group["failure_rate_percent"] = round(group["failed_jobs"] * 100 / group["total_jobs"], 2)
+            group["avg_duration_seconds"] = round(duration / timed_jobs, 1) if timed_jobs else None
+            values = sketch_percentiles(sketch, [q for _, q in BREAKDOWN_QUANTILES])
+            for (name, _), value in zip(BREAKDOWN_QUANTILES, values):
+                group[f"{name}_duration_seconds"] = round(value, 1) if value is not None else None
+            result.append(group)
+        # Groups without durations sort last on the percentile fields.
+        result.sort(key=lambda group: (group[sort_by] is not None, group[sort_by] or 0), reverse=True)
+
+        return jsonify({
+            "group_by": group_by, "start": start_str, "end": end_str,
+            "total_groups": len(result), "groups": result[:limit],
+        })
+
+    except sqlite3.Error as e:
+        print(f"Error fetching breakdown: {e}")
+        return jsonify({"error": f"Database query error: {e}"}), 500
+    finally:
+        conn.close()
+
+@app.route('/api/anomalies', methods=['GET'])
+@cached_response
+def get_anomalies():
+    platform = request.args.get('platform', '').lower()
+    team_id = request.args.get('team_id', '')
+    kind = request.args.get('kind', '')
+    days = request.args.get('days', '30')
+
+    if kind not in ['', 'repository', 'workflow']:
+        return jsonify({"error": "Invalid kind. Use 'repository' or 'workflow'"}), 400
 
-    start_date, end_date = calculate_date_range(range_str)
-    start_str = start_date.strftime('%Y-%m-%d')
-    end_str = end_date.strftime('%Y-%m-%d')
+    if team_id and not team_id.isdigit():
+        return jsonify({"error": "team_id must be an integer"}), 400
+
+    if not days.isdigit() or int(days) < 1:
+        return jsonify({"error": "days must be a positive integer"}), 400
+
+    conn = get_db_connection()
+    if conn is None:
+        return jsonify({"error": "Failed to connect to database."}), 500
+
+    # Only baselines that are warmed up, still running, and whose fast
+    # average has moved enough to possibly be flagged; scoring is in Python.
+    since = (datetime.today() - timedelta(days=int(days))).strftime('%Y-%m-%d %H:%M:%S')
+    conditions = [
+        "b.runs >= ?",
+        "b.last_run_at >= ?",
+        """(b.fast_failure - b.slow_failure >= ?
+            OR (b.fast_failed_cost > 0 AND b.fast_failed_cost >= b.slow_failed_cost * ?))""",
+    ]
+    params = [anomalies.MIN_RUNS, since, anomalies.MIN_FAILURE_RATE_INCREASE, anomalies.MIN_FAILED_COST_RATIO]
+    if kind:
+        conditions.append("b.kind = ?")
+        params.append(kind)
+    if platform:
+        conditions.append("r.platform = ?")
+        params.append(platform)
+    if team_id:
+        # The team and every entity below it.
+        conditions.append("r.entity_id IN (SELECT descendant_id FROM entity_closure WHERE ancestor_id = ?)")
+        params.append(int(team_id))
 
     try:
         query = f"""
-        SELECT 
+        SELECT b.*, r.name AS repo_name, r.platform, e.id AS team_id, e.name AS team_name
+        FROM run_baselines b
+        JOIN repositories r ON r.id = b.repository_id
+        JOIN entities e ON e.id = r.entity_id
+        WHERE {' AND '.join(conditions)};
+        """
+        result = []
+        for row in conn.execute(query, params):
+            flags, failure_z, failed_cost_z = anomalies.score(row)
+            if not flags:
+                continue
+            result.append({
+                "kind": row["kind"],
+                "repo_id": row["repository_id"],
+                "repo_name": row["repo_name"],
+                "workflow_name": (row["workflow_name"] or None) if row["kind"] == 'workflow' else None,
+                "platform": row["platform"],
+                "team_id": row["team_id"],
+                "team_name": row["team_name"],
+                "runs": row["runs"],
+                "last_run_at": row["last_run_at"],
+                "flags": flags,
+                "recent_failure_rate_percent": round(row["fast_failure"] * 100, 2),
+                "baseline_failure_rate_percent": round(row["slow_failure"] * 100, 2),
+                "failure_rate_z": round(failure_z, 2),
+                "recent_failed_cost_per_run": round(row["fast_failed_cost"], 4),
+                "baseline_failed_cost_per_run": round(row["slow_failed_cost"], 4),
+                "failed_cost_z": round(failed_cost_z, 2),
+                "recent_cost_per_run": round(row["fast_cost"], 4),
+                "baseline_cost_per_run": round(row["slow_cost"], 4),
+            })
+        result.sort(key=lambda a: max(a["failure_rate_z"], a["failed_cost_z"]), reverse=True)
+        return jsonify(result)
+
+    except sqlite3.Error as e:
+        print(f"Error fetching anomalies: {e}")
+        return jsonify({"error": f"Database query error: {e}"}), 500
+    finally:
+        conn.close()
+
+@app.route('/api/users/<int:user_id>/costs', methods=['GET'])
+@cached_response
+def get_user_costs(user_id):
+    platform = request.args.get('platform', '').lower()
+
+    try:
+        start_str, end_str = window_bounds(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    conn = get_db_connection()
+    if conn is None:
+        return jsonify({"error": "Failed to connect to database."}), 500
+
+    try:
+        user = conn.execute("SELECT id, username, email, platform FROM users WHERE id = ?", (user_id,)).fetchone()
+        if user is None:
+            return jsonify({"error": f"User {user_id} not found"}), 404
+
+        window_sql, window_params = user_window(user_id, start_str, end_str, run_tables=conn.run_tables)
+        platform_sql = "WHERE u.platform = ?" if platform else ""
+        query = f"""
+        WITH user_runs AS ({window_sql}
+        )
+        SELECT
+            u.repository_id AS repo_id,
             r.name AS repo_name,
+            u.platform AS platform,
+            e.id AS team_id,
             e.name AS team_name,
-            LOWER(r.platform) AS platform,
-            COUNT(ccr.id) AS total_jobs,
-            COALESCE(SUM(ccr.cost), 0.0) AS total_cost
-        FROM repositories r
-        JOIN entities e ON r.entity_id = e.id
-        LEFT JOIN ci_cd_runs ccr 
-            ON r.id = ccr.repository_id
-            AND ccr.start_time >= ? AND ccr.start_time < ?
-        WHERE r.is_active = 1
-        GROUP BY r.id
-        ORDER BY {sort_by} DESC
+            SUM(u.runs) AS total_jobs,
+            SUM(u.failed_runs) AS failed_jobs,
+            ROUND(SUM(u.cost), {COST_DIGITS}) AS total_cost
+        FROM user_runs u
+        LEFT JOIN repositories r ON r.id = u.repository_id
+        LEFT JOIN entities e ON e.id = r.entity_id
+        {platform_sql}
+        GROUP BY u.repository_id, u.platform
+        ORDER BY total_cost DESC, repo_id;
         """
+        params = window_params + ([platform] if platform else [])
+        repositories = [dict(row) for row in conn.execute(query, params).fetchall()]
+
+        # The per-platform and overall totals are sums over the repository rows.
+        platforms = {}
+        for repo in repositories:
+            totals = platforms.setdefault(repo["platform"], {
+                "platform": repo["platform"], "total_jobs": 0, "failed_jobs": 0, "total_cost": 0.0,
+            })
+            for field in ("total_jobs", "failed_jobs", "total_cost"):
+                totals[field] += repo[field]
+        for totals in platforms.values():
+            totals["total_cost"] = round(totals["total_cost"], COST_DIGITS)
+
+        return jsonify({
+            "user_id": user["id"],
+            "username": user["username"],
+            "email": user["email"],
+            "user_platform": user["platform"],
+            "start": start_str,
+            "end": end_str,
+            "total_jobs": sum(repo["total_jobs"] for repo in repositories),
+            "failed_jobs": sum(repo["failed_jobs"] for repo in repositories),
+            "total_cost": round(sum(repo["total_cost"] for repo in repositories), COST_DIGITS),
+            "platforms": sorted(platforms.values(), key=lambda p: p["total_cost"], reverse=True),
+            "repositories": repositories,
+        })
 
-        cursor = conn.execute(query, (start_str, end_str))
-        repos = [dict(row) for row in cursor.fetchall()]
+    except sqlite3.Error as e:
+        print(f"Error fetching user costs: {e}")
+        return jsonify({"error": f"Database query error: {e}"}), 500
+    finally:
+        conn.close()
 
-        summary = {
-            "most_expensive_repo": max(repos, key=lambda r: r["total_cost"])["repo_name"] if repos else None,
-            "most_jobs_repo": max(repos, key=lambda r: r["total_jobs"])["repo_name"] if repos else None,
-            "cheapest_repo": min(repos, key=lambda r: r["total_cost"])["repo_name"] if repos else None,
-        }
+# Held by every export until its body has been sent (export.py).
+export_slots = threading.BoundedSemaphore(export.MAX_CONCURRENT_EXPORTS)
 
-        return jsonify({"repositories": repos, "summary": summary})
+@app.route('/api/export', methods=['GET'])
+def get_export():
+    """Streams runs, or an aggregate ?view=, of a date window as CSV or Parquet.
 
+    ?after_id= continues a runs export after the last run received and
+    ?offset= an aggregate one after that many rows. Not cached, and at most
+    export.MAX_CONCURRENT_EXPORTS run at once; the rest get 429.
+    """
+    view = request.args.get('view', 'runs')
+    fmt = request.args.get('format', 'csv')
+    if fmt not in export.FORMATS:
+        return jsonify({"error": f"Invalid format. Use one of {sorted(export.FORMATS)}"}), 400
+    if fmt == 'parquet' and export.pa is None:
+        return jsonify({"error": "Parquet export requires pyarrow, which is not installed"}), 501
+    after_id, offset = request.args.get('after_id'), request.args.get('offset', '0')
+    if after_id is not None and not after_id.isdigit():
+        return jsonify({"error": "after_id must be a run id"}), 400
+    if not offset.isdigit():
+        return jsonify({"error": "offset must be a non-negative integer"}), 400
+    try:
+        start_str, end_str = window_bounds(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if g.get('batch_connection') is not None:
+        return jsonify({"error": "Exports are not available in /api/batch"}), 400
+
+    if not export_slots.acquire(blocking=False):
+        response = jsonify({"error": "Too many exports in progress; retry later"})
+        response.headers['Retry-After'] = '30'
+        return response, 429
+    conn = get_db_connection()
+    if conn is None:
+        export_slots.release()
+        return jsonify({"error": "Failed to connect to database."}), 500
+
+    try:
+        columns, kinds, batches = export.export_view(
+            conn, view, start_str, end_str, int(after_id) if after_id is not None else None, int(offset)
+        )
+    except (ValueError, sqlite3.Error) as e:
+        conn.close()
+        export_slots.release()
+        if isinstance(e, ValueError):
+            return jsonify({"error": str(e)}), 400
+        print(f"Error starting export: {e}")
+        return jsonify({"error": f"Database query error: {e}"}), 500
+
+    if fmt == 'csv':
+        chunks = export.csv_chunks(columns, batches)
+    else:
+        chunks = export.parquet_chunks(columns, kinds, batches)
+
+    def generate():
+        try:
+            yield from chunks
+        except (sqlite3.Error, PartitionLimitError) as e:
+            # The status is already sent; the client sees a truncated body and resumes.
+            print(f"Error streaming export: {e}")
+
+    def release():
+        # The server closes every response, so this also runs when the body
+        # is never read: HEAD requests and clients gone before the first chunk.
+        chunks.close()
+        conn.close()
+        export_slots.release()
+
+    filename = f"{view}_{start_str[:10]}_{end_str[:10]}.{fmt}"
+    response = app.response_class(
+        generate(),
+        mimetype=export.FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'},
+    )
+    response.call_on_close(release)
+    return response
+
+MAX_BATCH_REQUESTS = 20
+
+def run_subrequest(url):
+    """Dispatches a GET for url inside the current request and returns its response.
+
+    Request hooks do not run, so the queries count towards the batch's profile,
+    named after the sub-request's endpoint.
+    """
+    path, _, query_string = url.partition('?')
+    with app.test_request_context(path, query_string=query_string):
+        profile = g.get('profile')
+        if profile is not None:
+            profile.endpoint = request.endpoint or 'unmatched'
+        try:
+            response = app.make_response(app.dispatch_request())
+        except HTTPException as e:
+            response = e.get_response()
+        except PartitionLimitError as e:
+            response = app.make_response(partition_limit_exceeded(e))
+        response.get_data()
+        response.close()
+    return response
+
+def shared_windows(urls):
+    """The windows more than one of urls reads, with the platforms they read them for.
+
+    Maps (start, end) to the TEMP table window_source materializes it into on
+    first use; platforms is None when some reader needs every platform.
+    """
+    readers = {}
+    for url in urls:
+        args = MultiDict(parse_qsl(url.partition('?')[2]))
+        try:
+            key = window_bounds(args)
+        except ValueError:
+            continue
+        readers.setdefault(key, []).append(args.get('platform', '').lower() or None)
+    windows = {}
+    for key, platforms in readers.items():
+        if len(platforms) > 1:
+            windows[key] = {
+                "table": f"batch_window_{len(windows) + 1}",
+                "platforms": None if None in platforms else sorted(set(platforms)),
+                "source": None,
+            }
+    return windows
+
+def batch_entry(name, response):
+    """The '"name": {...}' member for one sub-response, reusing its encoded JSON body."""
+    body = response.get_data(as_text=True)
+    body = body.rstrip() if response.is_json else json.dumps(body)
+    entry = f'{json.dumps(name)}:{{"status":{response.status_code},"body":{body}'
+    headers = {header: value for header, value in response.headers if header.startswith('X-')}
+    if headers:
+        entry += f',"headers":{json.dumps(headers)}'
+    return entry + '}'
+
+@app.route('/api/batch', methods=['POST'])
+def get_batch():
+    """Answers several GET /api requests in one round trip.
+
+    Takes {"requests": {name: "/api/...?..."}} and returns {name: {"status", "body"}},
+    plus "headers" for any X- headers. The sub-requests share one connection
+    and one read transaction, so they see the same data, and each date window
+    is aggregated once for all of them. Together they can read the partial
+    days of at most db.MAX_ATTACHED_PARTITIONS archived months; a sub-request
+    past that gets a 400.
+    """
+    payload = request.get_json(silent=True)
+    subrequests = payload.get('requests') if isinstance(payload, dict) else None
+    if not isinstance(subrequests, dict) or not subrequests:
+        return jsonify({"error": "Body must be a JSON object with a non-empty requests object"}), 400
+    if len(subrequests) > MAX_BATCH_REQUESTS:
+        return jsonify({"error": f"At most {MAX_BATCH_REQUESTS} requests per batch"}), 400
+    for url in subrequests.values():
+        if not isinstance(url, str) or not url.startswith('/api/') or url.startswith('/api/batch'):
+            return jsonify({"error": f"Invalid request URL: {json.dumps(url)}"}), 400
+
+    conn = get_db_connection()
+    if conn is None:
+        return jsonify({"error": "Failed to connect to database."}), 500
+
+    conn.pinned = True
+    g.batch_connection = conn
+    g.batch_windows = shared_windows(subrequests.values())
+    try:
+        entries = [batch_entry(name, run_subrequest(url)) for name, url in subrequests.items()]
+        return app.response_class('{' + ','.join(entries) + '}', mimetype='application/json')
     except sqlite3.Error as e:
-        print(f"Error fetching repositories: {e}")
+        print(f"Error executing batch: {e}")
         return jsonify({"error": f"Database query error: {e}"}), 500
     finally:
+        g.pop('batch_connection', None)
+        g.pop('batch_windows', None)
+        conn.pinned = False
         conn.close()
 
-       
+
+INGEST_FORMATS = {
+    'application/x-ndjson': 'ndjson',
+    'application/ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+    'text/csv': 'csv',
+    'application/csv': 'csv',
+}
+
+@app.route('/api/runs/bulk', methods=['POST'])
+def ingest_runs_bulk():
+    fmt = INGEST_FORMATS.get(request.mimetype)
+    if fmt is None:
+        return jsonify({"error": f"Unsupported Content-Type. Use one of {sorted(INGEST_FORMATS)}"}), 415
+
+    if not os.path.exists(DATABASE):
+        print(f"Error: Database file '{DATABASE}' not found.")
+        return jsonify({"error": "Failed to connect to database."}), 500
+
+    try:
+        ensure_schema()
+        conn = connect_writer(DATABASE)
+    except sqlite3.Error as e:
+        print(f"Database connection error: {e}")
+        return jsonify({"error": "Failed to connect to database."}), 500
+
+    try:
+        summary = ingest_runs(conn, read_records(request.stream, fmt))
+        roll_leaderboards(conn, leaderboard_windows())
+        status = 400 if summary["rejected"] and not (summary["written"] or summary["unchanged"]) else 200
+        return jsonify(summary), status
+    except sqlite3.Error as e:
+        print(f"Error ingesting runs: {e}")
+        return jsonify({"error": f"Database write error: {e}"}), 500
+    finally:
+        conn.close()
+        response_cache.bump(DATABASE)
 
 
 # --- Run the Flask App ---
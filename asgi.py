@@ -0,0 +1,20 @@
+# ASGI entry point serving the same Flask routes:
+#
+#     gunicorn -c gunicorn.conf.py          (production, several workers)
+#     uvicorn asgi:application --port 5000  (single process)
+#
+# Requests run on a bounded pool of ASGI_THREADS threads per worker process,
+# each checking out its own pooled read-only connection, so concurrent
+# dashboard users are served in parallel instead of queueing behind one
+# another. The default matches the connection pool size so every thread can
+# keep a warm connection.
+import os
+
+from uvicorn.middleware.wsgi import WSGIMiddleware
+
+from app import app
+from db import MAX_IDLE_CONNECTIONS
+
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', MAX_IDLE_CONNECTIONS))
+
+application = WSGIMiddleware(app, workers=ASGI_THREADS)
@@ -0,0 +1,204 @@
+import argparse
+import json
+import os
+import platform as python_platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+RANGES = ('', '7d', '30d', '6mo', '1yr', 'all')
+PLATFORMS = ('github', 'gitlab', 'bitbucket')
+SORT_OPTIONS = ('total_cost', 'total_jobs')
+# Query parameters that each route is exercised with, beyond ?range=.
+ROUTE_PARAMS = {
+    '/api/teams': {'sort_by': SORT_OPTIONS},
+    '/api/repositories': {'sort_by': SORT_OPTIONS},
+    '/api/platform-teams': {'platform': PLATFORMS, 'sort_by': SORT_OPTIONS},
+    '/api/platform-repositories': {'platform': PLATFORMS, 'sort_by': SORT_OPTIONS},
+    '/api/leaderboard': {'platform': PLATFORMS, 'kind': ('repository', 'team')},
+    '/api/cost-timeseries': {'bucket': ('day', 'week', 'month')},
+    '/api/breakdown': {'group_by': ('workflow', 'workflow,os', 'platform,branch')},
+    '/api/export': {'view': ('runs', 'daily', 'repositories', 'teams', 'breakdown')},
+}
+# SQLite calls the progress handler every PROGRESS_STEP VM instructions; the
+# count is a cheap, deterministic stand-in for rows scanned.
+PROGRESS_STEP = 100
+
+
+def _expand(path, params):
+    urls = [path]
+    for name, values in params.items():
+        urls = [f"{url}{'&' if '?' in url else '?'}{name}={value}" for url in urls for value in values]
+    return urls
+
+
+def benchmark_urls(flask_app, windows=None):
+    """Every GET /api route crossed with every range and its sort/platform options.
+
+    windows, if given, are query strings (such as start=&end=) used instead of
+    the ranges.
+    """
+    urls = []
+    for rule in sorted(flask_app.url_map.iter_rules(), key=lambda r: r.rule):
+        if not rule.rule.startswith('/api/') or 'GET' not in rule.methods:
+            continue
+        path = rule.rule
+        for argument in rule.arguments:
+            path = path.replace(f'<int:{argument}>', '1').replace(f'<{argument}>', '1')
+        params = dict(ROUTE_PARAMS.get(rule.rule, {}))
+        if path.startswith('/api/platform-'):
+            params.setdefault('platform', PLATFORMS)
+        if windows is None:
+            params['range'] = RANGES
+            urls.extend(_expand(path, params))
+        else:
+            urls.extend(f"{url}{'&' if '?' in url else '?'}{window}"
+                        for url in _expand(path, params) for window in windows)
+    return urls
+
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    index = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def run_benchmark(database, iterations=10, warmup=1, use_cache=False):
+    """Times every benchmark URL against database and returns per-URL results.
+
+    Latency passes run untraced; a final pass per URL measures SQLite VM
+    steps and the peak Python heap while serving it.
+    """
+    import app as dashboard
+
+    dashboard.DATABASE = database
+    dashboard.ensure_schema()
+    flask_app = dashboard.app
+    flask_app.config['RESPONSE_CACHE'] = use_cache
+    client = flask_app.test_client()
+
+    results = {}
+    for url in benchmark_urls(flask_app):
+        for _ in range(warmup):
+            client.get(url)
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            response = client.get(url)
+            response.get_data()
+            timings.append((time.perf_counter() - started) * 1000)
+
+        steps = [0]
+
+        def count_steps():
+            steps[0] += PROGRESS_STEP
+            return 0
+
+        flask_app.config['QUERY_PROGRESS'] = (count_steps, PROGRESS_STEP)
+        tracemalloc.start()
+        try:
+            response = client.get(url)
+            body = response.get_data()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+            flask_app.config.pop('QUERY_PROGRESS', None)
+
+        results[url] = {
+            'status': response.status_code,
+            'bytes': len(body),
+            'p50_ms': round(_percentile(timings, 0.50), 3),
+            'p95_ms': round(_percentile(timings, 0.95), 3),
+            'p99_ms': round(_percentile(timings, 0.99), 3),
+            'mean_ms': round(statistics.fmean(timings), 3),
+            'vm_steps': steps[0],
+            'peak_kib': round(peak / 1024, 1),
+        }
+    return results
+
+
+def _describe(database):
+    conn = sqlite3.connect(f"file:{database}?mode=ro", uri=True)
+    try:
+        counts = {
+            table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ('entities', 'repositories', 'ci_cd_runs')
+        }
+    finally:
+        conn.close()
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'database': database,
+        'rows': counts,
+        'python': python_platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+    }
+
+
+def compare(results, baseline):
+    """Prints the p95 and VM-step change of every URL present in both runs."""
+    for url, current in results.items():
+        previous = baseline.get(url)
+        if previous is None:
+            continue
+        p95 = (current['p95_ms'] - previous['p95_ms']) / previous['p95_ms'] * 100 if previous['p95_ms'] else 0.0
+        print(f"{p95:+7.1f}% p95  {current['vm_steps'] - previous['vm_steps']:+10d} steps  {url}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every API endpoint against a (synthetic) database.")
+    parser.add_argument('--database', help="existing SQLite file to benchmark")
+    parser.add_argument('--generate', metavar='PATH',
+                        help="generate a synthetic database at PATH first (see synthetic.py) and benchmark it")
+    parser.add_argument('--repos', type=int, default=1000)
+    parser.add_argument('--runs', type=int, default=1000000)
+    parser.add_argument('--days', type=int, default=730)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--cache', action='store_true', help="leave the response cache on")
+    parser.add_argument('--output', default='benchmark.json', help="where to write the JSON report")
+    parser.add_argument('--baseline', help="earlier report to compare against")
+    args = parser.parse_args(argv)
+
+    if args.generate:
+        from synthetic import generate
+
+        generate(args.generate, args.repos, args.runs, args.days, seed=args.seed)
+        database = args.generate
+    elif args.database:
+        database = args.database
+    else:
+        parser.error("pass --database or --generate")
+
+    report = {'meta': _describe(database)}
+    report['meta'].update(iterations=args.iterations, cache=args.cache)
+    report['results'] = run_benchmark(database, args.iterations, args.warmup, args.cache)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=1, sort_keys=True)
+
+    slowest = sorted(report['results'].items(), key=lambda item: item[1]['p95_ms'], reverse=True)[:10]
+    for url, result in slowest:
+        print(f"{result['p95_ms']:9.2f} ms p95  {result['vm_steps']:10d} steps  {url}")
+    print(f"Wrote {len(report['results'])} results to '{args.output}'.")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(report['results'], json.load(f)['results'])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
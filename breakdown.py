@@ -0,0 +1,185 @@
+import math
+
+from rollup import split_window
+
+# Per-day aggregate of ci_cd_runs by the dimensions the rollup leaves out:
+# one row per (day, platform, workflow, branch, runner OS, duration bucket).
+# Each group's rows for a day form a log-bucketed duration sketch, so merging
+# days is a SUM(runs) per bucket and percentiles over any window never sort
+# raw durations. '' stands in for a missing workflow, branch or OS.
+#
+# Bucket 1 holds durations up to 1s and bucket i > 1 those in
+# (GAMMA^(i-2), GAMMA^(i-1)]; reporting a bucket as 2 * upper / (GAMMA + 1)
+# keeps every percentile within RELATIVE_ACCURACY of a true duration.
+# Durations beyond the last bucket (a week) are counted in it. Bucket 0
+# holds runs without a duration; they count towards totals only.
+RELATIVE_ACCURACY = 0.02
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+MAX_DURATION_SECONDS = 7 * 86400
+BUCKET_BOUNDS = [GAMMA ** i for i in range(math.ceil(math.log(MAX_DURATION_SECONDS, GAMMA)) + 1)]
+LAST_BUCKET = len(BUCKET_BOUNDS)
+
+# Triggers cannot rely on SQLite's optional math functions, so the bucket of
+# a duration is an index seek into this table of upper bounds.
+def _bucket(row):
+    return f"""CASE WHEN {row}.duration_seconds IS NULL THEN 0 ELSE IFNULL((
+          SELECT bucket FROM duration_buckets WHERE upper_seconds >= {row}.duration_seconds
+          ORDER BY upper_seconds LIMIT 1
+        ), {LAST_BUCKET}) END"""
+
+
+def _group_key(row):
+    return (
+        f"date({row}.start_time), {row}.platform, IFNULL({row}.workflow_name, ''), "
+        f"IFNULL({row}.branch, ''), IFNULL({row}.os, ''), {_bucket(row)}"
+    )
+
+
+def _add_run(row):
+    return f"""
+      INSERT INTO run_breakdown_rollup (day, platform, workflow_name, branch, os, bucket,
+                                        runs, failed_runs, cost, duration_seconds)
+      VALUES ({_group_key(row)}, 1, CASE WHEN {row}.status = 'failed' THEN 1 ELSE 0 END,
+              IFNULL({row}.cost, 0.0), IFNULL({row}.duration_seconds, 0))
+      ON CONFLICT (day, platform, workflow_name, branch, os, bucket) DO UPDATE SET
+        runs = runs + 1,
+        failed_runs = failed_runs + excluded.failed_runs,
+        cost = cost + excluded.cost,
+        duration_seconds = duration_seconds + excluded.duration_seconds;"""
+
+
+def _remove_run(row):
+    where = f"""(day, platform, workflow_name, branch, os, bucket) = ({_group_key(row)})"""
+    return f"""
+      UPDATE run_breakdown_rollup SET
+        runs = runs - 1,
+        failed_runs = failed_runs - CASE WHEN {row}.status = 'failed' THEN 1 ELSE 0 END,
+        cost = cost - IFNULL({row}.cost, 0.0),
+        duration_seconds = duration_seconds - IFNULL({row}.duration_seconds, 0)
+      WHERE {where};
+      DELETE FROM run_breakdown_rollup WHERE {where} AND runs <= 0;"""
+
+
+BREAKDOWN_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS duration_buckets (
+      upper_seconds REAL PRIMARY KEY,
+      bucket INTEGER NOT NULL
+    ) WITHOUT ROWID;
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS run_breakdown_rollup (
+      day DATE NOT NULL,
+      platform TEXT NOT NULL,
+      workflow_name TEXT NOT NULL,
+      branch TEXT NOT NULL,
+      os TEXT NOT NULL,
+      bucket INTEGER NOT NULL,
+      runs INTEGER NOT NULL DEFAULT 0,
+      failed_runs INTEGER NOT NULL DEFAULT 0,
+      cost REAL NOT NULL DEFAULT 0.0,
+      duration_seconds INTEGER NOT NULL DEFAULT 0,
+      PRIMARY KEY (day, platform, workflow_name, branch, os, bucket)
+    ) WITHOUT ROWID;
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS run_breakdown_rollup_insert
+    AFTER INSERT ON ci_cd_runs
+    BEGIN{_add_run('NEW')}
+    END;
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS run_breakdown_rollup_delete
+    AFTER DELETE ON ci_cd_runs
+    BEGIN{_remove_run('OLD')}
+    END;
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS run_breakdown_rollup_update
+    AFTER UPDATE OF platform, start_time, status, cost, duration_seconds, workflow_name, branch, os
+    ON ci_cd_runs
+    BEGIN{_remove_run('OLD')}{_add_run('NEW')}
+    END;
+    """,
+]
+
+BACKFILL_QUERY = f"""
+INSERT INTO run_breakdown_rollup (day, platform, workflow_name, branch, os, bucket,
+                                  runs, failed_runs, cost, duration_seconds)
+SELECT
+  {_group_key('ci_cd_runs')},
+  COUNT(*), SUM(CASE WHEN status = 'failed' THEN 1 ELSE 0 END),
+  SUM(IFNULL(cost, 0.0)), SUM(IFNULL(duration_seconds, 0))
+FROM ci_cd_runs
+GROUP BY 1, 2, 3, 4, 5, 6;
+"""
+
+
+def create_breakdown(conn):
+    """Creates the breakdown rollup, its bucket table and triggers, backfilling on first creation."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'run_breakdown_rollup'"
+    ).fetchone()
+    for statement in BREAKDOWN_SCHEMA:
+        conn.execute(statement)
+    conn.executemany(
+        "INSERT OR IGNORE INTO duration_buckets (upper_seconds, bucket) VALUES (?, ?)",
+        [(upper, i) for i, upper in enumerate(BUCKET_BOUNDS, start=1)],
+    )
+    if not exists:
+        conn.execute(BACKFILL_QUERY)
+
+
+def breakdown_window(start, end, run_tables=None):
+    """Returns (sql, params) for a CTE body with the breakdown rows of [start, end).
+
+    The CTE yields (platform, workflow_name, branch, os, bucket, runs,
+    failed_runs, cost, duration_seconds); like rollup.window_runs(), only the
+    partial days at either edge are read from ci_cd_runs, or the tables
+    run_tables(start, end) names for them.
+    """
+    days, edges = split_window(start, end)
+    parts, params = [], []
+    if days:
+        parts.append("""
+        SELECT platform, workflow_name, branch, os, bucket, runs, failed_runs, cost, duration_seconds
+        FROM run_breakdown_rollup
+        WHERE day >= ? AND day < ?""")
+        params += days
+    for edge in edges:
+        for table in run_tables(*edge) if run_tables else ['ci_cd_runs']:
+            parts.append(f"""
+        SELECT platform, IFNULL(workflow_name, '') AS workflow_name, IFNULL(branch, '') AS branch,
+               IFNULL(os, '') AS os, {_bucket('r')} AS bucket, 1 AS runs,
+               CASE WHEN status = 'failed' THEN 1 ELSE 0 END AS failed_runs,
+               IFNULL(cost, 0.0) AS cost, IFNULL(duration_seconds, 0) AS duration_seconds
+        FROM {table} r
+        WHERE start_time >= ? AND start_time < ?""")
+            params += edge
+    return "\n        UNION ALL".join(parts), params
+
+
+def bucket_value(bucket):
+    """The duration in seconds a sketch bucket stands for."""
+    return 2 * BUCKET_BOUNDS[bucket - 1] / (GAMMA + 1)
+
+
+def sketch_percentiles(counts, quantiles):
+    """Percentile durations of a merged sketch, given as {bucket: runs}.
+
+    Returns one value per quantile, or Nones when no run in it has a duration.
+    """
+    buckets = sorted(b for b in counts if b > 0 and counts[b] > 0)
+    total = sum(counts[b] for b in buckets)
+    if not total:
+        return [None] * len(quantiles)
+    values = []
+    for q in quantiles:
+        rank = q * (total - 1)
+        seen = 0
+        for b in buckets:
+            seen += counts[b]
+            if seen > rank:
+                values.append(bucket_value(b))
+                break
+    return values
@@ -0,0 +1,96 @@
+import threading
+import time
+from collections import OrderedDict
+
+# How long a cached response may live for each ?range= bucket, in seconds.
+# Relative ranges move with the clock; the fixed default quarter never does.
+RANGE_TTLS = {
+    '7d': 60,
+    '30d': 300,
+    '6mo': 900,
+    '1yr': 1800,
+    'all': 1800,
+}
+DEFAULT_TTL = 3600
+MAX_ENTRIES = 512
+VERSION_POLL_SECONDS = 1.0
+
+
+class CachedResponse:
+    __slots__ = ('body', 'mimetype', 'etag', 'expires_at', 'version', 'headers')
+
+    def __init__(self, body, mimetype, etag, expires_at, version, headers=()):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = etag
+        self.expires_at = expires_at
+        self.version = version
+        self.headers = headers
+
+
+class ResponseCache:
+    """Bounded LRU of rendered responses, invalidated by TTL and data version.
+
+    load_version(database) returns the database's current data version. It is
+    polled at most once per VERSION_POLL_SECONDS per database, so most hits
+    never touch SQLite; bump() forces the next lookup to poll again.
+    """
+
+    def __init__(self, load_version, max_entries=MAX_ENTRIES):
+        self.load_version = load_version
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def current_version(self, database):
+        now = time.monotonic()
+        known = self._versions.get(database)
+        if known is not None and now - known[1] < VERSION_POLL_SECONDS:
+            return known[0]
+        version = self.load_version(database)
+        self._versions[database] = (version, now)
+        return version
+
+    def bump(self, database):
+        self._versions.pop(database, None)
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.version != version or entry.expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+
+def ttl_for_range(range_str):
+    return RANGE_TTLS.get(range_str, DEFAULT_TTL)
+
+
+def ttl_for_window(range_str, start=None, end=None):
+    """TTL for a request's date window.
+
+    Explicit start/end windows never move with the clock, so only the data
+    version can make them stale; a start without an end runs up to today.
+    """
+    if start and end:
+        return DEFAULT_TTL
+    if start:
+        return RANGE_TTLS['7d']
+    return ttl_for_range(range_str)
@@ -0,0 +1,242 @@
+import argparse
+import calendar
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+
+try:
+    import numpy as np
+except ImportError:  # the columnar backend is optional
+    np = None
+
+from partitions import readable_partition
+from rollup import _parse_bound
+
+# Columnar copy of ci_cd_runs, one .npy file per column, sorted by start time
+# and memory-mapped at load. Each run is reduced to what window aggregates
+# need: its start (UTC epoch seconds), cost, duration and a dense group code
+# for its (repository, platform, status), decoded through meta.json.
+COLUMNS = ('start_time', 'group', 'cost', 'duration_seconds')
+FETCH_SIZE = 65536
+
+
+def _snapshot_query(platforms, statuses):
+    """SELECT for the snapshot columns, with platform and status already coded."""
+    platform_code = ' '.join(f"WHEN ? THEN {i}" for i in range(len(platforms)))
+    status_code = ' '.join(f"WHEN ? THEN {i}" for i in range(len(statuses)))
+    sql = f"""
+    SELECT unixepoch(start_time), repository_id,
+           CASE platform {platform_code} END,
+           CASE IFNULL(status, '') {status_code} END,
+           IFNULL(cost, 0.0), IFNULL(duration_seconds, 0)
+    FROM ci_cd_runs
+    WHERE unixepoch(start_time) IS NOT NULL
+    ORDER BY start_time;
+    """
+    return sql, [*platforms, *statuses]
+
+
+# Stands in for run_daily_rollup's CTE body in the endpoint queries; the
+# aggregated window is passed in as one JSON parameter and materialized once.
+WINDOW_QUERY = """
+        WITH columnar_window AS MATERIALIZED (
+            SELECT value ->> 0 AS repository_id, value ->> 1 AS platform, value ->> 2 AS status,
+                   value ->> 3 AS runs, value ->> 4 AS cost, value ->> 5 AS duration_seconds
+            FROM json_each(?)
+        )
+        SELECT * FROM columnar_window"""
+
+
+def snapshot_path(database):
+    return database + '.columnar'
+
+
+def _epoch(value):
+    return calendar.timegm(_parse_bound(value).timetuple())
+
+
+class ColumnarSnapshot:
+    """A loaded snapshot; window_runs() is a drop-in for rollup.window_runs()."""
+
+    def __init__(self, path, meta, arrays):
+        self.path = path
+        self.version = meta['data_version']
+        self.repository_ids = meta['repository_ids']
+        self.platforms = meta['platforms']
+        self.statuses = meta['statuses']
+        self.n_groups = len(self.repository_ids) * len(self.platforms) * len(self.statuses)
+        for column in COLUMNS:
+            setattr(self, column, arrays[column])
+
+    @classmethod
+    def load(cls, path):
+        if np is None:
+            raise RuntimeError("the columnar backend needs numpy")
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        arrays = {c: np.load(os.path.join(path, f'{c}.npy'), mmap_mode='r') for c in COLUMNS}
+        return cls(path, meta, arrays)
+
+    def aggregate(self, start, end):
+        """Returns [repository_id, platform, status, runs, cost, duration_seconds] rows for [start, end)."""
+        lo, hi = np.searchsorted(self.start_time, [_epoch(start), _epoch(end)])
+        group = self.group[lo:hi]
+        runs = np.bincount(group, minlength=self.n_groups)
+        cost = np.bincount(group, weights=self.cost[lo:hi], minlength=self.n_groups)
+        duration = np.bincount(group, weights=self.duration_seconds[lo:hi], minlength=self.n_groups)
+
+        n_platforms, n_statuses = len(self.platforms), len(self.statuses)
+        rows = []
+        for g in np.flatnonzero(runs).tolist():
+            repo, rest = divmod(g, n_platforms * n_statuses)
+            platform, status = divmod(rest, n_statuses)
+            rows.append([
+                self.repository_ids[repo], self.platforms[platform], self.statuses[status],
+                int(runs[g]), float(cost[g]), int(duration[g]),
+            ])
+        return rows
+
+    def window_runs(self, start, end):
+        return WINDOW_QUERY, [json.dumps(self.aggregate(start, end))]
+
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+
+def get_snapshot(database):
+    """Returns the current snapshot for database, or None if none has been built.
+
+    Reloads when the snapshot on disk has been rebuilt since it was last loaded.
+    """
+    path = snapshot_path(database)
+    try:
+        stamp = os.stat(os.path.join(path, 'meta.json')).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    loaded = _snapshots.get(database)
+    if loaded is None or loaded[0] != stamp:
+        with _snapshots_lock:
+            loaded = (stamp, ColumnarSnapshot.load(path))
+            _snapshots[database] = loaded
+    return loaded[1]
+
+
+def build_snapshot(database):
+    """Writes a fresh snapshot of ci_cd_runs next to database and returns its row count.
+
+    The runs and the data version are read in one transaction, so the
+    snapshot is exactly the data at that version; archived months are
+    read from their partitions, which never change. The new files replace the
+    old ones only once complete; processes still mapping the old files keep
+    reading them until they reload.
+    """
+    if np is None:
+        raise RuntimeError("the columnar backend needs numpy")
+    conn = sqlite3.connect(database)
+    sources = []
+    try:
+        conn.execute("BEGIN")
+        version = conn.execute("SELECT version FROM data_version WHERE id = 1").fetchone()[0]
+        # Archived months first, oldest first, then the hot table: in start time order.
+        sources = [
+            sqlite3.connect(f"file:{readable_partition(path, compressed)}?mode=ro&immutable=1", uri=True)
+            for path, compressed in conn.execute("SELECT path, compressed FROM run_partitions ORDER BY month")
+        ] + [conn]
+        count = sum(
+            source.execute("SELECT COUNT(*) FROM ci_cd_runs WHERE unixepoch(start_time) IS NOT NULL").fetchone()[0]
+            for source in sources
+        )
+        platforms = sorted({row[0] for source in sources for row in source.execute(
+            "SELECT DISTINCT platform FROM ci_cd_runs"
+        )})
+        statuses = sorted({row[0] for source in sources for row in source.execute(
+            "SELECT DISTINCT IFNULL(status, '') FROM ci_cd_runs"
+        )})
+
+        start_time = np.empty(count, dtype=np.int64)
+        repository = np.empty(count, dtype=np.int64)
+        codes = np.empty((count, 2), dtype=np.int64)
+        cost = np.empty(count, dtype=np.float64)
+        duration = np.empty(count, dtype=np.float64)
+        filled = 0
+        for source in sources:
+            cursor = source.execute(*_snapshot_query(platforms, statuses))
+            while True:
+                batch = cursor.fetchmany(FETCH_SIZE)
+                if not batch:
+                    break
+                block = np.array(batch, dtype=np.float64)
+                end = filled + len(batch)
+                start_time[filled:end] = block[:, 0]
+                repository[filled:end] = block[:, 1]
+                codes[filled:end] = block[:, 2:4]
+                cost[filled:end] = block[:, 4]
+                duration[filled:end] = block[:, 5]
+                filled = end
+        conn.rollback()
+    finally:
+        for source in sources[:-1]:
+            source.close()
+        conn.close()
+
+    # Text order matches time order for the canonical format; sort anyway so
+    # odd timestamps cannot break the binary search.
+    if count and np.any(start_time[1:] < start_time[:-1]):
+        order = np.argsort(start_time, kind='stable')
+        start_time, repository, codes = start_time[order], repository[order], codes[order]
+        cost, duration = cost[order], duration[order]
+
+    repository_ids, repository_index = np.unique(repository, return_inverse=True)
+    group = (repository_index * len(platforms) + codes[:, 0]) * len(statuses) + codes[:, 1]
+    group_dtype = np.int32 if len(repository_ids) * len(platforms) * len(statuses) < 2 ** 31 else np.int64
+    arrays = {
+        'start_time': start_time,
+        'group': group.astype(group_dtype),
+        'cost': cost,
+        'duration_seconds': duration,
+    }
+    meta = {
+        'data_version': version,
+        'row_count': count,
+        'repository_ids': repository_ids.tolist(),
+        'platforms': platforms,
+        'statuses': statuses,
+    }
+
+    path = snapshot_path(database)
+    staging, retired = path + '.tmp', path + '.old'
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    for column, array in arrays.items():
+        np.save(os.path.join(staging, f'{column}.npy'), array)
+    with open(os.path.join(staging, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    shutil.rmtree(retired, ignore_errors=True)
+    if os.path.exists(path):
+        os.replace(path, retired)
+    os.replace(staging, path)
+    shutil.rmtree(retired, ignore_errors=True)
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the columnar ci_cd_runs snapshot for the analytics backend.")
+    parser.add_argument('--database', help="SQLite file to snapshot (defaults to app.DATABASE)")
+    args = parser.parse_args(argv)
+
+    import app as dashboard
+
+    if args.database:
+        dashboard.DATABASE = args.database
+    dashboard.ensure_schema()
+    count = build_snapshot(dashboard.DATABASE)
+    print(f"Wrote {count} runs to '{snapshot_path(dashboard.DATABASE)}'.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,238 @@
+import os
+import sqlite3
+import threading
+import time
+
+from partitions import readable_partition
+
+# Read connections are long-lived, so these are paid once per connection
+# instead of once per request.
+READ_PRAGMAS = (
+    "PRAGMA query_only = ON",
+    "PRAGMA cache_size = -32768",     # 32 MiB page cache per connection
+    "PRAGMA mmap_size = 268435456",   # map up to 256 MiB of the file
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+)
+STATEMENT_CACHE_SIZE = 256
+HEALTH_CHECK_INTERVAL = 30.0
+MAX_IDLE_CONNECTIONS = 16
+# SQLite's default SQLITE_MAX_ATTACHED; a pooled connection keeps its
+# partitions attached across checkouts unless it holds more than half, and
+# detaches the least recently used ones to make room. One checkout can read at
+# most this many archived months (only an /api/batch of many windows gets close).
+MAX_ATTACHED_PARTITIONS = 10
+
+# Archived months (partitions.py) overlapping a [start, end) start_time window.
+PARTITIONS_QUERY = """
+SELECT month, path, compressed FROM run_partitions
+WHERE month >= substr(?, 1, 7) AND month || '-01' < ?
+ORDER BY month
+"""
+
+
+class PartitionLimitError(ValueError):
+    """Raised when one checkout would read more than MAX_ATTACHED_PARTITIONS archived months."""
+
+
+class PooledConnection(sqlite3.Connection):
+    """A read-only connection whose close() hands it back to its pool."""
+
+    pool = None
+    last_checked = 0.0
+    file_id = None
+    profile = None  # a metrics.RequestProfile while checked out by a profiled request
+    attached = frozenset()  # aliases of the partitions attached by run_tables(), least recently used first
+    checkout_partitions = frozenset()  # aliases run_tables() has returned since the last checkout
+    pinned = False  # while set, close() leaves the connection checked out (see /api/batch)
+
+    def execute(self, sql, parameters=()):
+        if self.profile is None:
+            return super().execute(sql, parameters)
+        return self.profile.execute(self, sql, parameters)
+
+    def begin(self):
+        """Opens a read transaction, so every later query sees one snapshot until release."""
+        if not self.in_transaction:
+            super().execute("BEGIN")
+
+    def run_tables(self, start_str, end_str):
+        """The tables to UNION ALL for the ci_cd_runs rows that started in [start, end).
+
+        The hot table plus every archived month overlapping the window, each
+        attached read-only on first use; months outside it are never opened.
+        At the attach limit the least recently used partition that this
+        checkout has not used is detached; if there is none, raises
+        PartitionLimitError.
+        """
+        tables = ['main.ci_cd_runs']
+        for month, path, compressed in super().execute(PARTITIONS_QUERY, (start_str, end_str)).fetchall():
+            alias = f"runs_{month.replace('-', '_')}"
+            if alias in self.attached:
+                del self.attached[alias]  # re-added below as the most recently used
+            else:
+                if len(self.attached) >= MAX_ATTACHED_PARTITIONS:
+                    self._detach_least_recent()
+                uri = f"file:{readable_partition(path, compressed)}?mode=ro&immutable=1"
+                super().execute(f"ATTACH DATABASE ? AS {alias}", (uri,))
+            self.attached[alias] = month
+            self.checkout_partitions.add(alias)
+            tables.append(f"{alias}.ci_cd_runs")
+        return tables
+
+    def _detach_least_recent(self):
+        # Partitions returned during this checkout may still be read by its
+        # queries (and SQLite refuses to detach one read in the open transaction).
+        for alias in self.attached:
+            if alias not in self.checkout_partitions:
+                super().execute(f"DETACH DATABASE {alias}")
+                del self.attached[alias]
+                return
+        raise PartitionLimitError(
+            f"A request can read at most {MAX_ATTACHED_PARTITIONS} archived months; split it into smaller ones"
+        )
+
+    def create_temp_table(self, name, sql, parameters=()):
+        """Creates TEMP table name from a SELECT, despite query_only.
+
+        The table is created inside a transaction, so the rollback on release
+        drops it and the next user of the connection never sees it.
+        """
+        self.begin()
+        super().execute("PRAGMA query_only = OFF")
+        try:
+            self.execute(f"CREATE TEMP TABLE {name} AS {sql}", parameters)
+        finally:
+            super().execute("PRAGMA query_only = ON")
+
+    def close(self):
+        if self.pinned:
+            return
+        if self.pool is None:
+            super().close()
+        else:
+            self.pool.release(self)
+
+    def dispose(self):
+        self.pool = None
+        super().close()
+
+
+class ConnectionPool:
+    """Reuses read-only connections to one SQLite file across requests.
+
+    A connection is owned by one worker thread between acquire() and close(),
+    then goes back on a LIFO idle stack so the next request on any thread picks
+    up a connection with a warm page and statement cache.
+    """
+
+    def __init__(self, path, max_idle=MAX_IDLE_CONNECTIONS):
+        self.path = path
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _file_id(self):
+        stat = os.stat(self.path)
+        return (stat.st_dev, stat.st_ino)
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            factory=PooledConnection,
+            cached_statements=STATEMENT_CACHE_SIZE,
+            check_same_thread=False,
+        )
+        conn.row_factory = sqlite3.Row
+        for pragma in READ_PRAGMAS:
+            conn.execute(pragma)
+        conn.file_id = self._file_id()
+        conn.attached = {}
+        conn.checkout_partitions = set()
+        conn.last_checked = time.monotonic()
+        conn.pool = self
+        return conn
+
+    def _is_healthy(self, conn):
+        try:
+            # A replaced file (a refreshed replica) means our handle points at
+            # stale data; a stat is cheap enough to check on every checkout.
+            if self._file_id() != conn.file_id:
+                return False
+        except OSError:
+            return False
+        now = time.monotonic()
+        if now - conn.last_checked < HEALTH_CHECK_INTERVAL:
+            return True
+        try:
+            conn.execute("SELECT 1").fetchone()
+        except (OSError, sqlite3.Error):
+            return False
+        conn.last_checked = now
+        return True
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                return self._connect()
+            if self._is_healthy(conn):
+                return conn
+            conn.dispose()
+
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.set_trace_callback(None)
+            conn.set_progress_handler(None, 0)
+            conn.profile = None
+            conn.checkout_partitions.clear()
+            # DETACH is refused inside a transaction, so only idle connections shed partitions.
+            if len(conn.attached) > MAX_ATTACHED_PARTITIONS // 2:
+                for alias in conn.attached:
+                    conn.execute(f"DETACH DATABASE {alias}")
+                conn.attached.clear()
+        except sqlite3.Error:
+            conn.dispose()
+            return
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.dispose()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.dispose()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path):
+    """Returns the shared pool for a database file, creating it on first use."""
+    pool = _pools.get(path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault(path, ConnectionPool(path))
+    return pool
+
+
+def connect_writer(path):
+    """Opens a read-write connection tuned for large ingest transactions.
+
+    WAL keeps pooled readers unblocked while the writer holds its transaction;
+    synchronous=NORMAL is durable across application crashes in WAL mode.
+    """
+    conn = sqlite3.connect(path, cached_statements=STATEMENT_CACHE_SIZE)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA busy_timeout = 30000")
+    conn.execute("PRAGMA cache_size = -65536")
+    return conn
@@ -6,8 +6,16 @@ import { useClickAway } from "react-use";
 
 const API_BASE_URL = "http://127.0.0.1:5000/api";
 
+// A batch entry's body, or fallback when that sub-request failed.
+function batchBody(entry, fallback) {
+  if (entry && entry.status === 200) return entry.body;
+  console.error("Batch request failed:", entry ? entry.body : "no response");
+  return fallback;
+}
+
 export default function DashboardPage() {
   const [dashboardSummary, setDashboardSummary] = useState(null);
+  const [summaryError, setSummaryError] = useState(null);
   const [platformCosts, setPlatformCosts] = useState([]);
   const [selectedRange, setSelectedRange] = useState("1y");
   const [selectedPlatforms, setSelectedPlatforms] = useState(["github", "gitlab", "bitbucket"]);
@@ -31,13 +39,26 @@ export default function DashboardPage() {
   });
 
   useEffect(() => {
-    fetch(`${API_BASE_URL}/dashboard-summary?range=${selectedRange}`)
+    // One round trip for both cards; the server shares the window between them.
+    fetch(`${API_BASE_URL}/batch`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({
+        requests: {
+          summary: `/api/dashboard-summary?range=${selectedRange}`,
+          costs: `/api/platform-costs?range=${selectedRange}`,
+        },
+      }),
+    })
       .then((res) => res.json())
-      .then((data) => setDashboardSummary(data));
+      .then(({ summary, costs }) => {
+        const summaryData = batchBody(summary, null);
+        setDashboardSummary(summaryData);
+        setSummaryError(
+          summaryData ? null : (summary && summary.body && summary.body.error) || "Failed to load summary."
+        );
 
-    fetch(`${API_BASE_URL}/platform-costs?range=${selectedRange}`)
-      .then((res) => res.json())
-      .then((data) => {
+        const data = batchBody(costs, []);
         setPlatformCosts(data);
 
         const filtered = data.filter((d) =>
@@ -128,9 +149,17 @@ export default function DashboardPage() {
             };
 
         vegaEmbed(pieChartContainerRef.current, spec, { actions: false }).catch(console.error);
+      })
+      .catch((error) => {
+        console.error("Failed to fetch dashboard data:", error);
+        setSummaryError("Failed to load summary.");
       });
   }, [selectedRange, selectedPlatforms]);
 
+  if (summaryError) {
+    return <div className="p-4 text-lg text-red-600">{summaryError}</div>;
+  }
+
   if (!dashboardSummary) {
     return <div className="p-4 text-lg">Loading summary...</div>;
   }
@@ -5,6 +5,13 @@ import Card from '../components/Card';
 
 const API_BASE_URL = 'http://127.0.0.1:5000/api';
 
+// A batch entry's body, or fallback when that sub-request failed.
+function batchBody(entry, fallback) {
+  if (entry && entry.status === 200) return entry.body;
+  console.error('Batch request failed:', entry ? entry.body : 'no response');
+  return fallback;
+}
+
 export default function PlatformRepositoriesPage() {
   const { platformName } = useParams();
   const [sidebarOpen, setSidebarOpen] = useState(true);
@@ -17,18 +24,26 @@ export default function PlatformRepositoriesPage() {
   useEffect(() => {
     async function fetchSummaryAndRepos() {
       try {
-        const [summaryRes, reposRes] = await Promise.all([
-          fetch(`${API_BASE_URL}/platform-repositories-summary?platform=${platformName}&range=${dateRange}`),
-          fetch(`${API_BASE_URL}/platform-repositories?platform=${platformName}&range=${dateRange}`)
-        ]);
+        const res = await fetch(`${API_BASE_URL}/batch`, {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({
+            requests: {
+              summary: `/api/platform-repositories-summary?platform=${platformName}&range=${dateRange}`,
+              repos: `/api/platform-repositories?platform=${platformName}&range=${dateRange}`
+            }
+          })
+        });
 
-        const summaryData = await summaryRes.json();
-        const reposData = await reposRes.json();
+        const results = await res.json();
+        const summaryData = batchBody(results.summary, null);
+        const reposData = batchBody(results.repos, []);
 
         setSummary(summaryData);
         setRepos(Array.isArray(reposData) ? reposData : []);
       } catch (error) {
         console.error('Failed to fetch repository data:', error);
+        setSummary(null);
         setRepos([]);
       }
     }
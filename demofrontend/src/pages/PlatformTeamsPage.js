@@ -5,6 +5,13 @@ import Card from '../components/Card';
 
 const API_BASE_URL = 'http://127.0.0.1:5000/api';
 
+// A batch entry's body, or fallback when that sub-request failed.
+function batchBody(entry, fallback) {
+  if (entry && entry.status === 200) return entry.body;
+  console.error('Batch request failed:', entry ? entry.body : 'no response');
+  return fallback;
+}
+
 export default function PlatformTeamsPage() {
   const { platformName } = useParams();
   const [sidebarOpen, setSidebarOpen] = useState(true);
@@ -15,24 +22,30 @@ export default function PlatformTeamsPage() {
   const [sortOrder, setSortOrder] = useState('desc');
 
   useEffect(() => {
-    async function fetchTeamSummary() {
-      const res = await fetch(
-        `${API_BASE_URL}/platform-teams-summary?platform=${platformName}&range=${dateRange}`
-      );
-      const data = await res.json();
-      setSummary(data);
-    }
-
-    async function fetchTeams() {
-      const res = await fetch(
-        `${API_BASE_URL}/platform-teams?platform=${platformName}&range=${dateRange}`
-      );
-      const data = await res.json();
-      setTeams(data);
+    async function fetchSummaryAndTeams() {
+      try {
+        const res = await fetch(`${API_BASE_URL}/batch`, {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({
+            requests: {
+              summary: `/api/platform-teams-summary?platform=${platformName}&range=${dateRange}`,
+              teams: `/api/platform-teams?platform=${platformName}&range=${dateRange}&expand=repositories`
+            }
+          })
+        });
+        const results = await res.json();
+        const teamsData = batchBody(results.teams, []);
+        setSummary(batchBody(results.summary, null));
+        setTeams(Array.isArray(teamsData) ? teamsData : []);
+      } catch (error) {
+        console.error('Failed to fetch team data:', error);
+        setSummary(null);
+        setTeams([]);
+      }
     }
 
-    fetchTeamSummary();
-    fetchTeams();
+    fetchSummaryAndTeams();
   }, [platformName, dateRange]);
 
   const sortedTeams = [...teams].sort((a, b) => {
@@ -0,0 +1,402 @@
+import argparse
+import csv
+import io
+import os
+import sqlite3
+import sys
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = pq = None
+
+from breakdown import breakdown_window
+from db import PARTITIONS_QUERY
+from partitions import _month_bounds, readable_partition
+from rollup import split_window, window_runs
+
+# Bulk export of ci_cd_runs rows or of a window aggregate, as CSV or Parquet.
+# Every view is read through open cursors BATCH_SIZE rows at a time and each
+# batch is encoded and handed on before the next is fetched, so memory stays
+# bounded however many rows an export holds. Raw runs come out in
+# (start_time, id) order, month by month from the hot table or the month's
+# partition file, which the start_time indexes return without sorting; an
+# export resumes after the last id a client received. Aggregates are small
+# and ordered by their key, and resume at a row offset.
+BATCH_SIZE = 10000
+FORMATS = {
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+}
+# Exports run for seconds to minutes; beyond this many at once the endpoint
+# answers 429 instead of letting them crowd out the dashboard's requests.
+MAX_CONCURRENT_EXPORTS = 2
+
+
+def _batches(cursor):
+    while True:
+        rows = cursor.fetchmany(BATCH_SIZE)
+        if not rows:
+            return
+        yield rows
+
+
+def _kind(declared_type):
+    """'int', 'float' or 'text' for a column's declared SQLite type."""
+    declared = (declared_type or '').upper()
+    if 'INT' in declared or declared == 'BOOLEAN':
+        return 'int'
+    if any(name in declared for name in ('REAL', 'FLOA', 'DOUB')):
+        return 'float'
+    return 'text'
+
+
+def _open_partition(path, compressed):
+    return sqlite3.connect(f"file:{readable_partition(path, compressed)}?mode=ro&immutable=1", uri=True)
+
+
+def _months(start, end):
+    """The 'YYYY-MM' months overlapping [start, end), with each one's share of the window."""
+    month = start[:7]
+    while True:
+        month_start, month_end = _month_bounds(month)
+        if month_start >= end:
+            return
+        yield month, max(start, month_start), min(end, month_end)
+        month = month_end[:7]
+
+
+def _resume_point(conn, partitions, after_id):
+    """The start_time of run after_id, looked up in the hot table or the window's partitions."""
+    row = conn.execute("SELECT start_time FROM main.ci_cd_runs WHERE id = ?", (after_id,)).fetchone()
+    if row is not None:
+        return row[0]
+    for path, compressed in partitions.values():
+        partition = _open_partition(path, compressed)
+        try:
+            row = partition.execute("SELECT start_time FROM ci_cd_runs WHERE id = ?", (after_id,)).fetchone()
+        finally:
+            partition.close()
+        if row is not None:
+            return row[0]
+    raise ValueError(f"after_id {after_id} is not a run in the export window")
+
+
+def export_runs(conn, start, end, after_id=None):
+    """Returns (columns, kinds, batches) for the ci_cd_runs rows that started in [start, end).
+
+    Archived months are read from their partition files with a connection of
+    their own, one month at a time, so any number of them can be exported.
+    With after_id, the export continues after that run.
+    """
+    columns = conn.execute("PRAGMA main.table_info(ci_cd_runs)").fetchall()
+    names = [column[1] for column in columns]
+    kinds = [_kind(column[2]) for column in columns]
+    partitions = {
+        month: (path, compressed)
+        for month, path, compressed in conn.execute(PARTITIONS_QUERY, (start, end)).fetchall()
+    }
+    after = None
+    if after_id is not None:
+        after = (_resume_point(conn, partitions, after_id), after_id)
+
+    query = f"""
+        SELECT {', '.join(names)} FROM {{table}}
+        WHERE start_time >= ? AND start_time < ?
+          AND NOT (start_time = ? AND id <= ?)
+        ORDER BY start_time, id"""
+
+    def batches():
+        for month, month_start, month_end in _months(start, end):
+            if after is not None:
+                if after[0] >= month_end:
+                    continue
+                month_start = max(month_start, after[0])
+            params = (month_start, month_end, *(after or ('', 0)))
+            if month not in partitions:
+                yield from _batches(conn.execute(query.format(table='main.ci_cd_runs'), params))
+                continue
+            partition = _open_partition(*partitions[month])
+            try:
+                yield from _batches(partition.execute(query.format(table='ci_cd_runs'), params))
+            finally:
+                partition.close()
+
+    return names, kinds, batches()
+
+
+def _daily(conn, start, end):
+    """run_daily_rollup rows of the window's whole days, with the partial days summed the same way."""
+    days, edges = split_window(start, end)
+    columns = (('day', 'text'), ('repository_id', 'int'), ('platform', 'text'), ('status', 'text'),
+               ('runs', 'int'), ('cost', 'float'), ('duration_seconds', 'int'))
+
+    def edge_query(edge):
+        sql, params = window_runs(*edge, by_day=True, run_tables=conn.run_tables)
+        return f"""
+        WITH window_runs AS ({sql}
+        )
+        SELECT day, repository_id, platform, status, SUM(runs), SUM(cost), SUM(duration_seconds)
+        FROM window_runs
+        GROUP BY day, repository_id, platform, status
+        ORDER BY day, repository_id, platform, status""", params
+
+    def batches():
+        # The rollup's primary key already orders its rows, so only the
+        # partial days at either edge are grouped and sorted.
+        if edges and (not days or edges[0][1] <= days[0]):
+            yield from _batches(conn.execute(*edge_query(edges[0])))
+        if days:
+            yield from _batches(conn.execute("""
+                SELECT day, repository_id, platform, status, runs, cost, duration_seconds
+                FROM run_daily_rollup
+                WHERE day >= ? AND day < ?
+                ORDER BY day, repository_id, platform, status""", days))
+            if edges and edges[-1][0] >= days[1]:
+                yield from _batches(conn.execute(*edge_query(edges[-1])))
+
+    return columns, batches()
+
+
+def _repositories(conn, start, end):
+    sql, params = window_runs(start, end, run_tables=conn.run_tables)
+    columns = (('repo_id', 'int'), ('repo_name', 'text'), ('platform', 'text'), ('is_active', 'int'),
+               ('team_id', 'int'), ('team_name', 'text'), ('total_jobs', 'int'), ('failed_jobs', 'int'),
+               ('total_cost', 'float'), ('total_duration_seconds', 'int'))
+    query = f"""
+        WITH window_runs AS ({sql}
+        )
+        SELECT
+            r.id, r.name, r.platform, r.is_active, e.id, e.name,
+            COALESCE(SUM(w.runs), 0),
+            COALESCE(SUM(CASE WHEN w.status = 'failed' THEN w.runs END), 0),
+            COALESCE(SUM(w.cost), 0.0),
+            COALESCE(SUM(w.duration_seconds), 0)
+        FROM repositories r
+        JOIN entities e ON e.id = r.entity_id
+        LEFT JOIN window_runs w ON w.repository_id = r.id
+        GROUP BY r.id
+        ORDER BY r.id"""
+    return columns, _batches(conn.execute(query, params))
+
+
+def _teams(conn, start, end):
+    """Every entity's totals over the repositories it owns, and over its whole subtree."""
+    sql, params = window_runs(start, end, run_tables=conn.run_tables)
+    columns = (('team_id', 'int'), ('team_name', 'text'), ('platform', 'text'), ('entity_type', 'text'),
+               ('parent_team_id', 'int'), ('total_jobs', 'int'), ('total_cost', 'float'),
+               ('subtree_total_jobs', 'int'), ('subtree_total_cost', 'float'))
+    query = f"""
+        WITH window_runs AS ({sql}
+        ),
+        repo_totals AS MATERIALIZED (
+            SELECT repository_id, SUM(runs) AS jobs, SUM(cost) AS cost
+            FROM window_runs
+            GROUP BY repository_id
+        )
+        SELECT
+            e.id, e.name, e.platform, e.type, e.parent_id,
+            COALESCE(SUM(CASE WHEN ec.depth = 0 THEN rt.jobs END), 0),
+            COALESCE(SUM(CASE WHEN ec.depth = 0 THEN rt.cost END), 0.0),
+            COALESCE(SUM(rt.jobs), 0),
+            COALESCE(SUM(rt.cost), 0.0)
+        FROM entities e
+        JOIN entity_closure ec ON ec.ancestor_id = e.id
+        LEFT JOIN repositories r ON r.entity_id = ec.descendant_id
+        LEFT JOIN repo_totals rt ON rt.repository_id = r.id
+        GROUP BY e.id
+        ORDER BY e.id"""
+    return columns, _batches(conn.execute(query, params))
+
+
+def _breakdown(conn, start, end):
+    sql, params = breakdown_window(start, end, run_tables=conn.run_tables)
+    columns = (('platform', 'text'), ('workflow_name', 'text'), ('branch', 'text'), ('os', 'text'),
+               ('runs', 'int'), ('failed_runs', 'int'), ('cost', 'float'), ('duration_seconds', 'int'))
+    query = f"""
+        WITH breakdown AS ({sql}
+        )
+        SELECT platform, workflow_name, branch, os,
+               SUM(runs), SUM(failed_runs), SUM(cost), SUM(duration_seconds)
+        FROM breakdown
+        GROUP BY platform, workflow_name, branch, os
+        ORDER BY platform, workflow_name, branch, os"""
+    return columns, _batches(conn.execute(query, params))
+
+
+# Aggregate views: name -> function(conn, start, end) returning
+# (((column, kind), ...), batches), ordered by their key columns.
+AGGREGATE_VIEWS = {
+    'daily': _daily,
+    'repositories': _repositories,
+    'teams': _teams,
+    'breakdown': _breakdown,
+}
+VIEWS = ('runs',) + tuple(AGGREGATE_VIEWS)
+
+
+def _skip(batches, offset):
+    for batch in batches:
+        if offset >= len(batch):
+            offset -= len(batch)
+            continue
+        yield batch[offset:]
+        offset = 0
+
+
+def export_view(conn, view, start, end, after_id=None, offset=0):
+    """Returns (columns, kinds, batches) for one export view over [start, end).
+
+    conn needs run_tables() (db.PooledConnection) and should hold a read
+    transaction, so the whole export reads one snapshot. after_id resumes
+    the runs view, offset the aggregates. Raises ValueError with a
+    client-facing message on bad input.
+    """
+    if view not in VIEWS:
+        raise ValueError(f"Invalid view. Use one of {list(VIEWS)}")
+    if view == 'runs':
+        if offset:
+            raise ValueError("The runs view resumes with after_id, not offset")
+        return export_runs(conn, start, end, after_id)
+    if after_id is not None:
+        raise ValueError("Aggregate views resume with offset, not after_id")
+    columns, batches = AGGREGATE_VIEWS[view](conn, start, end)
+    if offset:
+        batches = _skip(batches, offset)
+    return [name for name, _ in columns], [kind for _, kind in columns], batches
+
+
+def csv_chunks(columns, batches, header=True):
+    """Encodes batches as CSV text, one chunk per batch."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    if header:
+        writer.writerow(columns)
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+class _ChunkSink(io.RawIOBase):
+    """A write-only stream that keeps what was written until drained."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+PARQUET_TYPES = {'int': 'int64', 'float': 'float64', 'text': 'string'}
+
+
+def parquet_chunks(columns, kinds, batches):
+    """Encodes batches as one Parquet file, a row group per batch, yielding bytes as they are written."""
+    if pa is None:
+        raise RuntimeError("Parquet export requires pyarrow")
+    schema = pa.schema([(name, PARQUET_TYPES[kind]) for name, kind in zip(columns, kinds)])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for batch in batches:
+            arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*batch), schema)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def _resume_csv(path, view):
+    """Trims a partly written last line off an earlier CSV export and returns (after_id, offset)."""
+    with open(path, 'rb+') as f:
+        data = f.read()
+        end = data.rfind(b'\n') + 1
+        f.truncate(end)
+    rows = list(csv.reader(io.StringIO(data[:end].decode(), newline='')))[1:]
+    if view == 'runs':
+        return (int(rows[-1][0]) if rows else None), 0
+    return None, len(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export runs or an aggregate view of a date window as CSV or Parquet.")
+    parser.add_argument('view', choices=VIEWS)
+    parser.add_argument('--database', help="SQLite file to export from (defaults to app.DATABASE)")
+    parser.add_argument('--range', default='', help="7d, 30d, 6mo or 1yr, as on the dashboard")
+    parser.add_argument('--start', help="ISO-8601 start of the window; wins over --range")
+    parser.add_argument('--end', help="ISO-8601 end of the window (a date includes that day)")
+    parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+    parser.add_argument('--output', required=True, help="file to write, or - for stdout")
+    parser.add_argument('--after-id', type=int, help="continue a runs export after this run id")
+    parser.add_argument('--offset', type=int, default=0, help="continue an aggregate export after this many rows")
+    parser.add_argument('--resume', action='store_true',
+                        help="append to an interrupted CSV export at --output, continuing where it stopped")
+    args = parser.parse_args(argv)
+
+    import app as dashboard
+    from db import get_pool
+
+    if args.database:
+        dashboard.DATABASE = args.database
+    try:
+        start, end = dashboard.window_bounds({'range': args.range, 'start': args.start, 'end': args.end})
+    except ValueError as e:
+        parser.error(str(e))
+    if args.format == 'parquet' and pa is None:
+        parser.error("Parquet export requires pyarrow")
+
+    after_id, offset, header = args.after_id, args.offset, True
+    if args.resume:
+        if args.format != 'csv' or args.output == '-':
+            parser.error("--resume needs a CSV --output file")
+        if os.path.exists(args.output) and os.path.getsize(args.output):
+            after_id, offset = _resume_csv(args.output, args.view)
+            header = False
+
+    dashboard.ensure_schema()
+    conn = get_pool(dashboard.DATABASE).acquire()
+    try:
+        conn.begin()
+        try:
+            columns, kinds, batches = export_view(conn, args.view, start, end, after_id, offset)
+        except ValueError as e:
+            parser.error(str(e))
+        if args.format == 'csv':
+            chunks = csv_chunks(columns, batches, header)
+            out = sys.stdout if args.output == '-' else open(args.output, 'a' if not header else 'w', newline='')
+        else:
+            chunks = parquet_chunks(columns, kinds, batches)
+            out = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+        try:
+            for chunk in chunks:
+                out.write(chunk)
+        finally:
+            if args.output != '-':
+                out.close()
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,27 @@
+# Production launcher: gunicorn -c gunicorn.conf.py
+#
+# Runs asgi.py under uvicorn workers. Every worker process keeps its own
+# connection pool (db.py) and ASGI_THREADS request threads, so a burst of
+# requests waits for a thread instead of opening more SQLite connections
+# than the pool will keep warm.
+import multiprocessing
+import os
+
+wsgi_app = 'asgi:application'
+worker_class = 'uvicorn.workers.UvicornWorker'
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then so long-lived page caches and mmaps are released.
+max_requests = 10000
+max_requests_jitter = 1000
+
+
+def on_starting(server):
+    # Migrate once in the master so freshly forked workers never race on it.
+    import app
+
+    app.ensure_schema()
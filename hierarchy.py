@@ -0,0 +1,96 @@
+# Ancestor/descendant closure of the entities tree: one row per (ancestor,
+# descendant) pair, including each entity paired with itself at depth 0.
+# Triggers on entities keep it current, so hierarchy queries are plain joins
+# instead of WITH RECURSIVE walks.
+CLOSURE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS entity_closure (
+      ancestor_id INTEGER NOT NULL,
+      descendant_id INTEGER NOT NULL,
+      depth INTEGER NOT NULL, -- number of parent_id hops from ancestor down to descendant
+      PRIMARY KEY (ancestor_id, descendant_id)
+    ) WITHOUT ROWID;
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_entity_closure_descendant ON entity_closure (descendant_id, depth);",
+    """
+    CREATE TRIGGER IF NOT EXISTS entity_closure_insert
+    AFTER INSERT ON entities
+    BEGIN
+      INSERT INTO entity_closure (ancestor_id, descendant_id, depth) VALUES (NEW.id, NEW.id, 0);
+      INSERT INTO entity_closure (ancestor_id, descendant_id, depth)
+      SELECT ancestor_id, NEW.id, depth + 1 FROM entity_closure WHERE descendant_id = NEW.parent_id;
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS entity_closure_reject_cycle
+    BEFORE UPDATE OF parent_id ON entities
+    WHEN NEW.parent_id IS NOT NULL
+    BEGIN
+      SELECT RAISE(ABORT, 'entity parent_id would create a cycle')
+      WHERE EXISTS (
+        SELECT 1 FROM entity_closure WHERE ancestor_id = NEW.id AND descendant_id = NEW.parent_id
+      );
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS entity_closure_move
+    AFTER UPDATE OF parent_id ON entities
+    WHEN OLD.parent_id IS NOT NEW.parent_id
+    BEGIN
+      -- Detach the subtree from its old ancestors, then hang it under the new parent.
+      DELETE FROM entity_closure
+      WHERE descendant_id IN (SELECT descendant_id FROM entity_closure WHERE ancestor_id = NEW.id)
+        AND ancestor_id NOT IN (SELECT descendant_id FROM entity_closure WHERE ancestor_id = NEW.id);
+      INSERT INTO entity_closure (ancestor_id, descendant_id, depth)
+      SELECT above.ancestor_id, below.descendant_id, above.depth + below.depth + 1
+      FROM entity_closure above
+      JOIN entity_closure below ON below.ancestor_id = NEW.id
+      WHERE above.descendant_id = NEW.parent_id;
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS entity_closure_delete
+    AFTER DELETE ON entities
+    BEGIN
+      -- Children keep their own subtrees but are no longer reachable from above.
+      DELETE FROM entity_closure
+      WHERE descendant_id IN (SELECT descendant_id FROM entity_closure WHERE ancestor_id = OLD.id)
+        AND ancestor_id NOT IN (
+          SELECT descendant_id FROM entity_closure WHERE ancestor_id = OLD.id AND descendant_id <> OLD.id
+        );
+    END;
+    """,
+]
+
+BACKFILL_QUERY = """
+INSERT INTO entity_closure (ancestor_id, descendant_id, depth)
+WITH RECURSIVE paths (ancestor_id, descendant_id, depth) AS (
+    SELECT id, id, 0 FROM entities
+    UNION ALL
+    SELECT p.ancestor_id, e.id, p.depth + 1
+    FROM paths p
+    JOIN entities e ON e.parent_id = p.descendant_id
+)
+SELECT ancestor_id, descendant_id, depth FROM paths;
+"""
+
+
+def create_closure(conn):
+    """Creates the closure table and its triggers, backfilling it on first creation.
+
+    Runs inside the caller's transaction.
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'entity_closure'"
+    ).fetchone()
+    for statement in CLOSURE_SCHEMA:
+        conn.execute(statement)
+    if not exists:
+        conn.execute(BACKFILL_QUERY)
+
+
+def rebuild_closure(conn):
+    """Recomputes the whole closure from entities.parent_id."""
+    with conn:
+        conn.execute("DELETE FROM entity_closure")
+        conn.execute(BACKFILL_QUERY)
@@ -0,0 +1,228 @@
+import argparse
+import csv
+import io
+import json
+import math
+import sqlite3
+import sys
+from datetime import datetime
+
+from db import connect_writer
+from leaderboard import roll_leaderboards
+
+PLATFORMS = ('github', 'gitlab', 'bitbucket')
+STATUSES = ('success', 'failed', 'cancelled', 'pending', 'running', 'queued')
+RUN_COLUMNS = (
+    'repository_id', 'platform', 'run_id', 'workflow_name', 'branch', 'commit_sha',
+    'start_time', 'end_time', 'duration_seconds', 'status', 'cost', 'triggered_by_user_id', 'os',
+)
+BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 100
+
+_updated_columns = [c for c in RUN_COLUMNS if c not in ('platform', 'run_id')]
+
+# Re-delivered runs update in place; identical re-deliveries are skipped so the
+# rollup triggers do not churn.
+UPSERT_QUERY = f"""
+INSERT INTO ci_cd_runs ({', '.join(RUN_COLUMNS)})
+VALUES ({', '.join('?' * len(RUN_COLUMNS))})
+ON CONFLICT (platform, run_id) DO UPDATE SET
+  {', '.join(f'{c} = excluded.{c}' for c in _updated_columns)}
+WHERE ({', '.join(f'ci_cd_runs.{c}' for c in _updated_columns)})
+   IS NOT ({', '.join(f'excluded.{c}' for c in _updated_columns)});
+"""
+
+
+class InvalidRun(ValueError):
+    pass
+
+
+def parse_ndjson(lines):
+    """Yields (line_number, record) for each non-blank line of an NDJSON stream."""
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except json.JSONDecodeError as e:
+            yield number, InvalidRun(f"invalid JSON: {e.msg}")
+
+
+def parse_csv(lines):
+    """Yields (line_number, record) for each data row of a CSV stream with a header."""
+    reader = csv.DictReader(lines)
+    for record in reader:
+        yield reader.line_num, {k: (v if v != '' else None) for k, v in record.items()}
+
+
+def _timestamp(value, field):
+    if value is None:
+        return None
+    text = str(value)
+    try:
+        parsed = datetime.fromisoformat(text.replace('Z', '+00:00'))
+    except ValueError:
+        raise InvalidRun(f"{field} is not an ISO-8601 timestamp: {value!r}")
+    # Stored naive in UTC, in the same text form the range filters compare against.
+    if parsed.utcoffset() is not None:
+        parsed = (parsed - parsed.utcoffset()).replace(tzinfo=None)
+    elif len(text) == 19:
+        return text.replace('T', ' ')
+    return parsed.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _number(value, field, kind):
+    if value is None:
+        return None
+    # JSON true/false would otherwise pass as 1/0.
+    if isinstance(value, bool):
+        raise InvalidRun(f"{field} must be a number: {value!r}")
+    try:
+        number = kind(value)
+    except (TypeError, ValueError, OverflowError):
+        raise InvalidRun(f"{field} must be a number: {value!r}")
+    if not math.isfinite(number):
+        raise InvalidRun(f"{field} must be a finite number: {value!r}")
+    if number < 0:
+        raise InvalidRun(f"{field} must not be negative")
+    return number
+
+
+def validate_run(record, repository_ids, archived_months=frozenset()):
+    """Checks a record against the ci_cd_runs constraints and returns its row tuple.
+
+    Runs of archived months are refused: their partitions are read-only, and
+    an upsert into the hot table would count the run a second time.
+    """
+    if isinstance(record, InvalidRun):
+        raise record
+    if not isinstance(record, dict):
+        raise InvalidRun("run must be an object")
+
+    platform = (record.get('platform') or '').strip().lower()
+    if platform not in PLATFORMS:
+        raise InvalidRun(f"platform must be one of {list(PLATFORMS)}")
+
+    run_id = record.get('run_id')
+    if run_id is None or str(run_id).strip() == '':
+        raise InvalidRun("run_id is required")
+
+    repository_id = _number(record.get('repository_id'), 'repository_id', int)
+    if repository_id not in repository_ids:
+        raise InvalidRun(f"unknown repository_id: {record.get('repository_id')!r}")
+
+    status = record.get('status')
+    if status is not None:
+        status = str(status).strip().lower()
+        if status not in STATUSES:
+            raise InvalidRun(f"status must be one of {list(STATUSES)}")
+
+    start_time = _timestamp(record.get('start_time'), 'start_time')
+    if start_time is None:
+        raise InvalidRun("start_time is required")
+    if start_time[:7] in archived_months:
+        raise InvalidRun(f"start_time falls in archived month {start_time[:7]}")
+    end_time = _timestamp(record.get('end_time'), 'end_time')
+
+    duration = _number(record.get('duration_seconds'), 'duration_seconds', int)
+    if duration is None and end_time is not None:
+        delta = datetime.fromisoformat(end_time) - datetime.fromisoformat(start_time)
+        duration = max(int(delta.total_seconds()), 0)
+
+    cost = _number(record.get('cost'), 'cost', float)
+    user_id = _number(record.get('triggered_by_user_id'), 'triggered_by_user_id', int)
+
+    return (
+        repository_id, platform, str(run_id), record.get('workflow_name'), record.get('branch'),
+        record.get('commit_sha'), start_time, end_time, duration, status,
+        0.0 if cost is None else cost, user_id, record.get('os'),
+    )
+
+
+def ingest_runs(conn, records, batch_size=BATCH_SIZE):
+    """Validates (line_number, record) pairs and upserts them in batched transactions.
+
+    The rollup, closure and data-version triggers run inside the same
+    transactions, so readers never see runs without their aggregates.
+    Returns a summary with counts and the first MAX_REPORTED_ERRORS rejections;
+    valid runs identical to the stored ones count as unchanged, not written.
+    """
+    repository_ids = {row[0] for row in conn.execute("SELECT id FROM repositories")}
+    archived_months = {row[0] for row in conn.execute("SELECT month FROM run_partitions")}
+    summary = {"received": 0, "written": 0, "unchanged": 0, "rejected": 0, "errors": []}
+    batch = []
+
+    def flush():
+        with conn:
+            # rowcount leaves out both the skipped re-deliveries and the rows the triggers write.
+            written = conn.executemany(UPSERT_QUERY, batch).rowcount
+        summary["written"] += written
+        summary["unchanged"] += len(batch) - written
+        del batch[:]
+
+    for line_number, record in records:
+        summary["received"] += 1
+        try:
+            batch.append(validate_run(record, repository_ids, archived_months))
+        except InvalidRun as e:
+            summary["rejected"] += 1
+            if len(summary["errors"]) < MAX_REPORTED_ERRORS:
+                summary["errors"].append({"line": line_number, "error": str(e)})
+            continue
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return summary
+
+
+def read_records(stream, fmt):
+    """Wraps a binary or text stream in the parser for fmt ('ndjson' or 'csv')."""
+    if isinstance(stream, io.TextIOBase):
+        text = stream
+    else:
+        text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    if fmt == 'csv':
+        return parse_csv(text)
+    return parse_ndjson(text)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-load CI/CD runs from NDJSON or CSV files.")
+    parser.add_argument('files', nargs='+', help="input files, or - for stdin")
+    parser.add_argument('--database', help="SQLite file to load into (defaults to app.DATABASE)")
+    parser.add_argument('--format', choices=['ndjson', 'csv'],
+                        help="input format (defaults to the file extension, else ndjson)")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    import app as dashboard
+
+    if args.database:
+        dashboard.DATABASE = args.database
+    dashboard.ensure_schema()
+    conn = connect_writer(dashboard.DATABASE)
+    failed = False
+    try:
+        for path in args.files:
+            fmt = args.format or ('csv' if path.endswith('.csv') else 'ndjson')
+            stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+            try:
+                summary = ingest_runs(conn, read_records(stream, fmt), args.batch_size)
+            except sqlite3.Error as e:
+                print(f"Error loading '{path}': {e}")
+                failed = True
+                continue
+            finally:
+                if stream is not sys.stdin:
+                    stream.close()
+            print(f"{path}: {json.dumps(summary)}")
+            failed = failed or summary["rejected"] > 0
+        roll_leaderboards(conn, dashboard.leaderboard_windows())
+    finally:
+        conn.close()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,241 @@
+import argparse
+import sys
+
+# Per-range totals of the window each leaderboard range currently covers,
+# one row per (range, run platform, kind, entity):
+#   kind 'platform'   -- entity_id 0, the platform's totals
+#   kind 'repository' -- entity_id is the repository
+#   kind 'team'       -- entity_id is the entity owning the repositories; only
+#                        active repositories count, as in the team summaries
+# leaderboard_windows holds the [start_day, end_day) each range was built for.
+# Triggers on run_daily_rollup add every change that falls inside a range's
+# window, so the "most costly"/"most jobs" cards are index lookups; ranges
+# relative to today are moved by roll_leaderboards() once the day changes.
+# Those running float sums drift from the rollup's by a few last bits, so the
+# daily job (main) rebuilds every range from run_daily_rollup.
+def _entry_keys(row):
+    """(kind, entity_id) pairs a run_daily_rollup row counts towards."""
+    return f"""(
+        SELECT 'platform' AS kind, 0 AS entity_id
+        UNION ALL SELECT 'repository', {row}.repository_id
+        UNION ALL SELECT 'team', entity_id FROM repositories WHERE id = {row}.repository_id AND is_active = 1
+      ) k"""
+
+
+def _add(row, cost, runs, failed):
+    """Upserts the given amounts into every entry row counts towards in a current window."""
+    return f"""
+      INSERT INTO leaderboard (range_name, platform, kind, entity_id, total_cost, total_jobs, failed_jobs)
+      SELECT lw.range_name, {row}.platform, k.kind, k.entity_id, {cost}, {runs}, {failed}
+      FROM leaderboard_windows lw, {_entry_keys(row)}
+      WHERE {row}.day >= lw.start_day AND {row}.day < lw.end_day
+      ON CONFLICT (range_name, platform, kind, entity_id) DO UPDATE SET
+        total_cost = total_cost + excluded.total_cost,
+        total_jobs = total_jobs + excluded.total_jobs,
+        failed_jobs = failed_jobs + excluded.failed_jobs;"""
+
+
+def _prune(row, when='1'):
+    """Deletes the entries row counts towards once they no longer hold any runs."""
+    return f"""
+      DELETE FROM leaderboard
+      WHERE {when} AND total_jobs <= 0 AND (range_name, platform, kind, entity_id) IN (
+        SELECT lw.range_name, {row}.platform, k.kind, k.entity_id
+        FROM leaderboard_windows lw, {_entry_keys(row)}
+        WHERE {row}.day >= lw.start_day AND {row}.day < lw.end_day
+      );"""
+
+
+def _failed(row):
+    return f"CASE WHEN {row}.status = 'failed' THEN {row}.runs ELSE 0 END"
+
+
+def _move_team(row, sign):
+    """Adds (sign '') or removes (sign '-') a repositories row's totals from its team, if active."""
+    return f"""
+      INSERT INTO leaderboard (range_name, platform, kind, entity_id, total_cost, total_jobs, failed_jobs)
+      SELECT range_name, platform, 'team', {row}.entity_id, {sign}total_cost, {sign}total_jobs, {sign}failed_jobs
+      FROM leaderboard
+      WHERE kind = 'repository' AND entity_id = {row}.id AND {row}.is_active = 1
+      ON CONFLICT (range_name, platform, kind, entity_id) DO UPDATE SET
+        total_cost = total_cost + excluded.total_cost,
+        total_jobs = total_jobs + excluded.total_jobs,
+        failed_jobs = failed_jobs + excluded.failed_jobs;
+      DELETE FROM leaderboard WHERE kind = 'team' AND entity_id = {row}.entity_id AND total_jobs <= 0;"""
+
+
+LEADERBOARD_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS leaderboard_windows (
+      range_name TEXT PRIMARY KEY,
+      start_day DATE NOT NULL,
+      end_day DATE NOT NULL
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS leaderboard (
+      range_name TEXT NOT NULL,
+      platform TEXT NOT NULL,
+      kind TEXT NOT NULL,
+      entity_id INTEGER NOT NULL,
+      total_cost REAL NOT NULL DEFAULT 0.0,
+      total_jobs INTEGER NOT NULL DEFAULT 0,
+      failed_jobs INTEGER NOT NULL DEFAULT 0,
+      PRIMARY KEY (range_name, platform, kind, entity_id)
+    ) WITHOUT ROWID;
+    """,
+    # Every run touches these, so only repositories, the one kind too numerous
+    # to rank by reading all of a platform's entries, are indexed by value.
+    """
+    CREATE INDEX IF NOT EXISTS idx_leaderboard_repository_cost
+    ON leaderboard (range_name, platform, total_cost) WHERE kind = 'repository';
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_leaderboard_repository_jobs
+    ON leaderboard (range_name, platform, total_jobs) WHERE kind = 'repository';
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_leaderboard_entity ON leaderboard (kind, entity_id);",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS leaderboard_rollup_insert
+    AFTER INSERT ON run_daily_rollup
+    BEGIN{_add('NEW', 'NEW.cost', 'NEW.runs', _failed('NEW'))}
+    END;
+    """,
+    # The rollup triggers only ever change a row's totals, so the difference
+    # is added in place; anything else is handled as a delete plus an insert.
+    f"""
+    CREATE TRIGGER IF NOT EXISTS leaderboard_rollup_update
+    AFTER UPDATE ON run_daily_rollup
+    WHEN NEW.day = OLD.day AND NEW.repository_id = OLD.repository_id
+     AND NEW.platform = OLD.platform AND NEW.status = OLD.status
+    BEGIN{_add('NEW', 'NEW.cost - OLD.cost', 'NEW.runs - OLD.runs', f"{_failed('NEW')} - {_failed('OLD')}")}{_prune('NEW', 'NEW.runs < OLD.runs')}
+    END;
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS leaderboard_rollup_move
+    AFTER UPDATE ON run_daily_rollup
+    WHEN NOT (NEW.day = OLD.day AND NEW.repository_id = OLD.repository_id
+              AND NEW.platform = OLD.platform AND NEW.status = OLD.status)
+    BEGIN{_add('OLD', '-OLD.cost', '-OLD.runs', f"-{_failed('OLD')}")}{_prune('OLD')}{_add('NEW', 'NEW.cost', 'NEW.runs', _failed('NEW'))}
+    END;
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS leaderboard_rollup_delete
+    AFTER DELETE ON run_daily_rollup
+    BEGIN{_add('OLD', '-OLD.cost', '-OLD.runs', f"-{_failed('OLD')}")}{_prune('OLD')}
+    END;
+    """,
+    # Team entries follow their repositories' owner and active flag.
+    f"""
+    CREATE TRIGGER IF NOT EXISTS leaderboard_repository_insert
+    AFTER INSERT ON repositories
+    BEGIN{_move_team('NEW', '')}
+    END;
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS leaderboard_repository_update
+    AFTER UPDATE OF entity_id, is_active ON repositories
+    WHEN OLD.entity_id IS NOT NEW.entity_id OR OLD.is_active IS NOT NEW.is_active
+    BEGIN{_move_team('OLD', '-')}{_move_team('NEW', '')}
+    END;
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS leaderboard_repository_delete
+    AFTER DELETE ON repositories
+    BEGIN{_move_team('OLD', '-')}
+    END;
+    """,
+]
+
+REBUILD_QUERIES = [
+    """
+    INSERT INTO leaderboard (range_name, platform, kind, entity_id, total_cost, total_jobs, failed_jobs)
+    SELECT ?, platform, 'repository', repository_id, SUM(cost), SUM(runs),
+           SUM(CASE WHEN status = 'failed' THEN runs ELSE 0 END)
+    FROM run_daily_rollup
+    WHERE day >= ? AND day < ?
+    GROUP BY platform, repository_id;
+    """,
+    """
+    INSERT INTO leaderboard (range_name, platform, kind, entity_id, total_cost, total_jobs, failed_jobs)
+    SELECT range_name, platform, 'platform', 0, SUM(total_cost), SUM(total_jobs), SUM(failed_jobs)
+    FROM leaderboard
+    WHERE range_name = ? AND kind = 'repository'
+    GROUP BY platform;
+    """,
+    """
+    INSERT INTO leaderboard (range_name, platform, kind, entity_id, total_cost, total_jobs, failed_jobs)
+    SELECT lb.range_name, lb.platform, 'team', r.entity_id,
+           SUM(lb.total_cost), SUM(lb.total_jobs), SUM(lb.failed_jobs)
+    FROM leaderboard lb
+    JOIN repositories r ON r.id = lb.entity_id AND r.is_active = 1
+    WHERE lb.range_name = ? AND lb.kind = 'repository'
+    GROUP BY lb.platform, r.entity_id;
+    """,
+]
+
+
+def create_leaderboards(conn):
+    """Creates the leaderboard tables and triggers; roll_leaderboards() fills them."""
+    for statement in LEADERBOARD_SCHEMA:
+        conn.execute(statement)
+
+
+def roll_leaderboards(conn, windows, rebuild=False):
+    """Points each range at its window, rebuilding the ranges whose window moved.
+
+    windows maps range names to (start_day, end_day) 'YYYY-MM-DD' strings;
+    ranges not in it are dropped. rebuild also rebuilds the ranges whose
+    window has not moved, resetting their totals to the rollup's. Commits,
+    and takes the write lock first so the triggers never apply a run to a
+    half-built range. Returns the rebuilt range names.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        current = {row[0]: (row[1], row[2]) for row in conn.execute(
+            "SELECT range_name, start_day, end_day FROM leaderboard_windows"
+        )}
+        rebuilt = []
+        for range_name in current.keys() - windows.keys():
+            conn.execute("DELETE FROM leaderboard WHERE range_name = ?", (range_name,))
+            conn.execute("DELETE FROM leaderboard_windows WHERE range_name = ?", (range_name,))
+        for range_name, (start_day, end_day) in sorted(windows.items()):
+            if not rebuild and current.get(range_name) == (start_day, end_day):
+                continue
+            conn.execute("DELETE FROM leaderboard WHERE range_name = ?", (range_name,))
+            conn.execute(
+                "INSERT OR REPLACE INTO leaderboard_windows (range_name, start_day, end_day) VALUES (?, ?, ?)",
+                (range_name, start_day, end_day),
+            )
+            conn.execute(REBUILD_QUERIES[0], (range_name, start_day, end_day))
+            for query in REBUILD_QUERIES[1:]:
+                conn.execute(query, (range_name,))
+            rebuilt.append(range_name)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return rebuilt
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild the leaderboards for today's windows (run daily).")
+    parser.add_argument('--database', help="SQLite file to update (defaults to app.DATABASE)")
+    args = parser.parse_args(argv)
+
+    import app as dashboard
+
+    if args.database:
+        dashboard.DATABASE = args.database
+    dashboard.ensure_schema()
+    conn = dashboard.connect_writer(dashboard.DATABASE)
+    try:
+        rebuilt = roll_leaderboards(conn, dashboard.leaderboard_windows(), rebuild=True)
+    finally:
+        conn.close()
+    print(f"Rebuilt leaderboards: {rebuilt or 'none'}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
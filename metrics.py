@@ -0,0 +1,216 @@
+import logging
+import random
+import sqlite3
+import threading
+import time
+
+# Prometheus' default latency buckets, in seconds.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# The progress handler fires every PROGRESS_STEP SQLite VM instructions, so
+# step counts are accurate to that granularity.
+PROGRESS_STEP = 1000
+MAX_LOGGED_SQL = 2000
+
+slow_query_log = logging.getLogger('dashboard.slow_queries')
+
+
+class Histogram:
+    """A Prometheus histogram with one series per label tuple."""
+
+    def __init__(self, name, help_text, label_names, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted(self._series.items())
+            for labels, (counts, total, count) in items:
+                label_text = _labels(self.label_names, labels)
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {bucket_count}')
+                lines.append(f'{self.name}_bucket{{{label_text},le="+Inf"}} {count}')
+                lines.append(f"{self.name}_sum{{{label_text}}} {total}")
+                lines.append(f"{self.name}_count{{{label_text}}} {count}")
+        return lines
+
+
+class Counter:
+    """A Prometheus counter with one series per label tuple."""
+
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels, value=1):
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._series.items()):
+                lines.append(f"{self.name}{{{_labels(self.label_names, labels)}}} {value}")
+        return lines
+
+
+def _labels(names, values):
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in values)
+    return ','.join(f'{n}="{v}"' for n, v in zip(names, escaped))
+
+
+REQUEST_DURATION = Histogram(
+    'dashboard_request_duration_seconds', "Time to produce a response, per route; a streamed one until its body is sent.", ('route', 'method', 'status')
+)
+QUERY_DURATION = Histogram(
+    'dashboard_query_duration_seconds', "Time spent executing and fetching one query.", ('query',)
+)
+QUERY_ROWS = Counter('dashboard_query_rows_total', "Rows fetched by each query.", ('query',))
+QUERY_STEPS = Counter('dashboard_query_vm_steps_total', "SQLite VM instructions run by each query.", ('query',))
+METRICS = (REQUEST_DURATION, QUERY_DURATION, QUERY_ROWS, QUERY_STEPS)
+
+
+def render_metrics():
+    """The Prometheus text exposition of every metric in this process."""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+class QueryRecord:
+    __slots__ = ('name', 'sql', 'params', 'duration', 'rows', 'steps')
+
+    def __init__(self, name, sql, params):
+        self.name = name
+        self.sql = sql
+        self.params = params
+        self.duration = 0.0
+        self.rows = 0
+        self.steps = 0
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """Adds fetch time and fetched rows to its query's record."""
+
+    record = None
+    profile = None
+
+    def _fetched(self, started, rows):
+        self.record.duration += time.perf_counter() - started
+        self.record.rows += rows
+
+    def fetchone(self):
+        self.profile.active = self.record
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(started, row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        self.profile.active = self.record
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(started, len(rows))
+        return rows
+
+    def fetchall(self):
+        self.profile.active = self.record
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(started, len(rows))
+        return rows
+
+    def __next__(self):
+        self.profile.active = self.record
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._fetched(started, 0)
+            raise
+        self._fetched(started, 1)
+        return row
+
+
+class RequestProfile:
+    """The queries one request ran, named '<endpoint>#<n>' in execution order.
+
+    endpoint may be changed mid-request (a batch names each sub-request's
+    queries after its endpoint); n counts per endpoint.
+    """
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.queries = []
+        self.active = None
+        self._counts = {}
+
+    def execute(self, conn, sql, parameters):
+        n = self._counts[self.endpoint] = self._counts.get(self.endpoint, 0) + 1
+        record = QueryRecord(f"{self.endpoint}#{n}", sql, parameters)
+        self.queries.append(record)
+        self.active = record
+        cursor = conn.cursor(ProfiledCursor)
+        cursor.record = record
+        cursor.profile = self
+        started = time.perf_counter()
+        try:
+            cursor.execute(sql, parameters)
+        finally:
+            record.duration += time.perf_counter() - started
+        return cursor
+
+    def on_progress(self):
+        if self.active is not None:
+            self.active.steps += PROGRESS_STEP
+        return 0
+
+    def server_timing(self, total):
+        """Server-Timing header value: the total, the database share and each query."""
+        entries = [
+            f"total;dur={total * 1000:.2f}",
+            f'db;dur={sum(q.duration for q in self.queries) * 1000:.2f};desc="{len(self.queries)} queries"',
+        ]
+        for i, query in enumerate(self.queries, start=1):
+            entries.append(f'q{i};dur={query.duration * 1000:.2f};desc="{query.name}"')
+        return ', '.join(entries)
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def finish(self, route, method, status, slow_query_ms, sample_rate):
+        """Records the request and its queries, logging the slow ones; returns the total time."""
+        total = self.elapsed()
+        REQUEST_DURATION.observe((route, method, str(status)), total)
+        for query in self.queries:
+            labels = (query.name,)
+            QUERY_DURATION.observe(labels, query.duration)
+            QUERY_ROWS.inc(labels, query.rows)
+            QUERY_STEPS.inc(labels, query.steps)
+            if query.duration * 1000 >= slow_query_ms and random.random() < sample_rate:
+                sql = ' '.join(query.sql.split())[:MAX_LOGGED_SQL]
+                slow_query_log.warning(
+                    "slow query %s: %.1f ms, %d rows, %d steps: %s params=%.200r",
+                    query.name, query.duration * 1000, query.rows, query.steps, sql, query.params,
+                )
+        return total
@@ -0,0 +1,225 @@
+import argparse
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+
+from anomalies import create_baselines
+from breakdown import create_breakdown
+from hierarchy import create_closure
+from leaderboard import create_leaderboards
+from partitions import create_partitions
+from rollup import create_rollup
+from users import VISIBILITY_VERSION, create_user_rollup
+
+SECONDARY_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_ci_cd_runs_start_time ON ci_cd_runs (start_time);",
+    "CREATE INDEX IF NOT EXISTS idx_ci_cd_runs_platform_start_time ON ci_cd_runs (platform, start_time);",
+    "CREATE INDEX IF NOT EXISTS idx_ci_cd_runs_repository_start_time ON ci_cd_runs (repository_id, start_time);",
+    "CREATE INDEX IF NOT EXISTS idx_entities_parent_id ON entities (parent_id);",
+    "CREATE INDEX IF NOT EXISTS idx_entities_platform_type ON entities (platform, type);",
+    "CREATE INDEX IF NOT EXISTS idx_entities_type_name ON entities (type, name);",
+    "CREATE INDEX IF NOT EXISTS idx_repositories_entity_active ON repositories (entity_id, is_active);",
+    "CREATE INDEX IF NOT EXISTS idx_repositories_platform_active ON repositories (platform, is_active);",
+    "CREATE INDEX IF NOT EXISTS idx_run_daily_rollup_repository_day ON run_daily_rollup (repository_id, day);",
+]
+
+# repositories.platform has no CHECK constraint, so it is canonicalized to the
+# lowercase form ci_cd_runs and entities enforce, letting queries compare it directly.
+PLATFORM_NORMALIZATION = [
+    "UPDATE repositories SET platform = LOWER(TRIM(platform)) WHERE platform <> LOWER(TRIM(platform));",
+    """
+    CREATE TRIGGER IF NOT EXISTS repositories_platform_insert
+    AFTER INSERT ON repositories
+    WHEN NEW.platform <> LOWER(TRIM(NEW.platform))
+    BEGIN
+      UPDATE repositories SET platform = LOWER(TRIM(NEW.platform)) WHERE id = NEW.id;
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS repositories_platform_update
+    AFTER UPDATE OF platform ON repositories
+    WHEN NEW.platform <> LOWER(TRIM(NEW.platform))
+    BEGIN
+      UPDATE repositories SET platform = LOWER(TRIM(NEW.platform)) WHERE id = NEW.id;
+    END;
+    """,
+]
+
+# A single counter bumped by every write to the tables the endpoints read, so
+# in-process response caches can tell when their entries went stale.
+DATA_VERSION = [
+    """
+    CREATE TABLE IF NOT EXISTS data_version (
+      id INTEGER PRIMARY KEY CHECK (id = 1),
+      version INTEGER NOT NULL
+    );
+    """,
+    "INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0);",
+] + [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS data_version_{table}_{event.lower()}
+    AFTER {event} ON {table}
+    BEGIN
+      UPDATE data_version SET version = version + 1 WHERE id = 1;
+    END;
+    """
+    for table in ("ci_cd_runs", "repositories", "entities")
+    for event in ("INSERT", "UPDATE", "DELETE")
+]
+
+# Ordered list of (version, name, step). A step is a list of SQL statements or a
+# callable taking the connection. Never edit a released step; append a new one.
+MIGRATIONS = [
+    (1, "daily run rollup", create_rollup),
+    (2, "secondary indexes", SECONDARY_INDEXES),
+    (3, "canonical repository platform", PLATFORM_NORMALIZATION),
+    (4, "entity closure table", create_closure),
+    (5, "data version counter", DATA_VERSION),
+    (6, "incremental leaderboards", create_leaderboards),
+    (7, "workflow, branch and OS breakdown rollup", create_breakdown),
+    (8, "cold month partitions", create_partitions),
+    (9, "anomaly baselines", create_baselines),
+    (10, "per-user cost rollup", create_user_rollup),
+    (11, "repository visibility version", VISIBILITY_VERSION),
+]
+
+# Tables that must never be read with a full scan by an endpoint query.
+LARGE_TABLES = ("ci_cd_runs", "run_daily_rollup", "run_breakdown_rollup", "user_cost_rollup")
+
+
+def applied_versions(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+      version INTEGER PRIMARY KEY,
+      name TEXT NOT NULL,
+      applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    """)
+    return {row[0] for row in conn.execute("SELECT version FROM schema_migrations")}
+
+
+def migrate(conn):
+    """Applies every pending migration, each in its own transaction.
+
+    Safe to call from several processes at once: BEGIN IMMEDIATE serializes the
+    writers and the applied set is re-read inside each transaction.
+    """
+    applied = []
+    for version, name, step in MIGRATIONS:
+        if version in applied_versions(conn):
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if version in applied_versions(conn):
+                conn.rollback()
+                continue
+            if callable(step):
+                step(conn)
+            else:
+                for statement in step:
+                    conn.execute(statement)
+            conn.execute(
+                "INSERT INTO schema_migrations (version, name) VALUES (?, ?)", (version, name)
+            )
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        applied.append(version)
+    if applied:
+        conn.execute("ANALYZE")
+        conn.commit()
+    return applied
+
+
+def explain_endpoints(flask_app, get_connection):
+    """Runs every GET /api route and returns the query plans it produced.
+
+    Returns a list of (url, sql, plan_lines, full_scans) tuples, where
+    full_scans lists the plan lines that scan one of LARGE_TABLES.
+    """
+    statements = []
+    flask_app.config['QUERY_TRACE'] = statements.append
+    client = flask_app.test_client()
+    results = []
+    try:
+        for url in _sample_urls(flask_app):
+            del statements[:]
+            # Buffered, so streamed bodies run their queries and the response is closed.
+            client.get(url, buffered=True)
+            queries = [s for s in statements if s.lstrip().upper().startswith(("SELECT", "WITH"))]
+            if not queries:
+                continue
+            conn = get_connection()
+            try:
+                for sql in queries:
+                    plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+                    full_scans = [
+                        line for line in plan
+                        if line.startswith("SCAN") and any(table in line for table in LARGE_TABLES)
+                    ]
+                    results.append((url, sql, plan, full_scans))
+            finally:
+                conn.close()
+    finally:
+        flask_app.config.pop('QUERY_TRACE', None)
+    return results
+
+
+def _sample_urls(flask_app):
+    """The benchmark URLs, plus the query shapes the dashboard ranges never reach.
+
+    Each route is also run over a start/end window cut mid-day at both ends
+    (the raw-run edge queries), scoped to a user, and as a filtered page after
+    a cursor.
+    """
+    from app import encode_cursor
+    from benchmark import benchmark_urls
+
+    today = datetime.today()
+    start = (today - timedelta(days=180)).strftime('%Y-%m-%dT07:45:00')
+    end = (today - timedelta(days=3)).strftime('%Y-%m-%dT16:20:00')
+    windows = [
+        f"start={start}&end={end}",
+        "range=30d&as_user=1",
+        f"range=30d&limit=5&after={encode_cursor(1.0, 1)}&name=a&team=a",
+    ]
+    return benchmark_urls(flask_app) + benchmark_urls(flask_app, windows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply schema migrations to the dashboard database.")
+    parser.add_argument('--database', help="SQLite file to migrate (defaults to app.DATABASE)")
+    parser.add_argument('--explain', action='store_true',
+                        help="dump EXPLAIN QUERY PLAN for every endpoint query and fail on full scans")
+    args = parser.parse_args(argv)
+
+    import app as dashboard
+
+    if args.database:
+        dashboard.DATABASE = args.database
+    conn = sqlite3.connect(dashboard.DATABASE)
+    try:
+        applied = migrate(conn)
+    finally:
+        conn.close()
+    print(f"Applied migrations: {applied or 'none'}")
+
+    if not args.explain:
+        return 0
+
+    regressions = 0
+    for url, sql, plan, full_scans in explain_endpoints(dashboard.app, dashboard.get_db_connection):
+        print(f"== {url}")
+        print(sql.strip())
+        for line in plan:
+            print(f"   {line}")
+        for line in full_scans:
+            print(f"!! full scan: {line}")
+        regressions += len(full_scans)
+    print(f"{regressions} full scan(s) of {', '.join(LARGE_TABLES)}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
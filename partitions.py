@@ -0,0 +1,217 @@
+import argparse
+import gzip
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime
+
+from breakdown import BREAKDOWN_SCHEMA
+from rollup import ROLLUP_SCHEMA
+
+# Cold months of ci_cd_runs live in one SQLite file per month next to the
+# database (runs-YYYY-MM.db in <database>.partitions), VACUUMed, read-only and
+# optionally gzipped; run_partitions lists them. The rollups keep every month,
+# so the endpoints only open a partition for raw reads that fall in it: the
+# pooled connections attach the months a window overlaps on demand
+# (db.PooledConnection.run_tables). Runs are archived by deleting them from
+# the hot table while run_archive_state.archiving is set, which the delete
+# triggers of the rollups skip.
+PARTITIONS_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS run_partitions (
+      month TEXT PRIMARY KEY, -- 'YYYY-MM' of the runs' start_time
+      path TEXT NOT NULL,
+      runs INTEGER NOT NULL,
+      compressed INTEGER NOT NULL DEFAULT 0,
+      archived_at DATETIME NOT NULL
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS run_archive_state (
+      id INTEGER PRIMARY KEY CHECK (id = 1),
+      archiving INTEGER NOT NULL
+    );
+    """,
+    "INSERT OR IGNORE INTO run_archive_state (id, archiving) VALUES (1, 0);",
+]
+
+NOT_ARCHIVING = "(SELECT archiving FROM run_archive_state WHERE id = 1) = 0"
+ARCHIVE_GUARD = f"WHEN {NOT_ARCHIVING}"
+
+
+def _guarded(trigger_sql):
+    """A released ci_cd_runs delete trigger, skipped while runs are being archived."""
+    return trigger_sql.replace("AFTER DELETE ON ci_cd_runs\n", f"AFTER DELETE ON ci_cd_runs\n    {ARCHIVE_GUARD}\n", 1)
+
+
+GUARDED_TRIGGERS = {
+    'run_daily_rollup_delete': _guarded(ROLLUP_SCHEMA[2]),
+    'run_breakdown_rollup_delete': _guarded(BREAKDOWN_SCHEMA[3]),
+}
+
+
+def create_partitions(conn):
+    """Creates the partition registry and guards the rollup delete triggers against archival."""
+    for statement in PARTITIONS_SCHEMA:
+        conn.execute(statement)
+    for name, sql in GUARDED_TRIGGERS.items():
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+        conn.execute(sql)
+
+
+def partition_dir(database):
+    return database + '.partitions'
+
+
+def _month_bounds(month):
+    """[start, end) start_time strings of a 'YYYY-MM' month."""
+    first = datetime.strptime(month, '%Y-%m')
+    following = first.replace(year=first.year + first.month // 12, month=first.month % 12 + 1)
+    return first.strftime('%Y-%m-%d %H:%M:%S'), following.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def readable_partition(path, compressed):
+    """A file SQLite can open for a partition, decompressing a gzipped one once.
+
+    Decompressed copies go to PARTITION_CACHE_DIR (default: the system temp
+    directory) and are reused by every process until the archive is newer.
+    """
+    if not compressed:
+        return path
+    cache_dir = os.environ.get('PARTITION_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'dashboard-partitions')
+    os.makedirs(cache_dir, exist_ok=True)
+    cached = os.path.join(cache_dir, os.path.basename(path)[:-len('.gz')])
+    try:
+        if os.stat(cached).st_mtime >= os.stat(path).st_mtime:
+            return cached
+    except FileNotFoundError:
+        pass
+    staging = tempfile.NamedTemporaryFile(dir=cache_dir, suffix='.tmp', delete=False)
+    try:
+        with staging, gzip.open(path, 'rb') as source:
+            shutil.copyfileobj(source, staging)
+        os.replace(staging.name, cached)
+    except Exception:
+        os.remove(staging.name)
+        raise
+    return cached
+
+
+def _write_partition(database, month, schema, compress):
+    """Copies a month of runs into its partition file and returns the file's path."""
+    start, end = _month_bounds(month)
+    directory = partition_dir(database)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'runs-{month}.db')
+    staging = path + '.tmp'
+    if os.path.exists(staging):
+        os.remove(staging)
+
+    conn = sqlite3.connect(staging)
+    try:
+        conn.execute(schema)
+        conn.execute("ATTACH DATABASE ? AS hot", (f"file:{os.path.abspath(database)}?mode=ro",))
+        with conn:
+            conn.execute(
+                "INSERT INTO ci_cd_runs SELECT * FROM hot.ci_cd_runs WHERE start_time >= ? AND start_time < ?",
+                (start, end),
+            )
+            conn.execute("CREATE INDEX idx_ci_cd_runs_start_time ON ci_cd_runs (start_time)")
+        conn.execute("DETACH DATABASE hot")
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+    if compress:
+        with open(staging, 'rb') as source, gzip.open(staging + '.gz', 'wb') as target:
+            shutil.copyfileobj(source, target)
+        os.remove(staging)
+        staging, path = staging + '.gz', path + '.gz'
+    os.chmod(staging, 0o444)
+    os.replace(staging, path)
+    return os.path.abspath(path)
+
+
+def archive_month(conn, database, month, compress=False):
+    """Moves the runs of month ('YYYY-MM') from the hot table into a partition file.
+
+    Holds the write lock throughout, so no run of the month changes between
+    the copy and the delete; the delete and the registry entry commit
+    together, so readers find each run in exactly one place. Returns the
+    number of runs moved.
+    """
+    start, end = _month_bounds(month)
+    conn.execute("BEGIN IMMEDIATE")
+    path = None
+    try:
+        if conn.execute("SELECT 1 FROM run_partitions WHERE month = ?", (month,)).fetchone():
+            raise ValueError(f"month {month} is already archived")
+        runs = conn.execute(
+            "SELECT COUNT(*) FROM ci_cd_runs WHERE start_time >= ? AND start_time < ?", (start, end)
+        ).fetchone()[0]
+        if not runs:
+            conn.rollback()
+            return 0
+        schema = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'ci_cd_runs'").fetchone()[0]
+        path = _write_partition(database, month, schema, compress)
+
+        conn.execute("UPDATE run_archive_state SET archiving = 1 WHERE id = 1")
+        conn.execute("DELETE FROM ci_cd_runs WHERE start_time >= ? AND start_time < ?", (start, end))
+        conn.execute("UPDATE run_archive_state SET archiving = 0 WHERE id = 1")
+        conn.execute(
+            "INSERT INTO run_partitions (month, path, runs, compressed, archived_at) VALUES (?, ?, ?, ?, datetime('now'))",
+            (month, path, runs, int(compress)),
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        if path is not None and os.path.exists(path):
+            os.remove(path)
+        raise
+    return runs
+
+
+def cold_months(conn, keep_months, today=None):
+    """Months with runs in the hot table that end more than keep_months months before the current one."""
+    today = today or datetime.today()
+    index = today.year * 12 + today.month - 1 - keep_months
+    cutoff = datetime(index // 12, index % 12 + 1, 1).strftime('%Y-%m-%d %H:%M:%S')
+    return [row[0] for row in conn.execute(
+        "SELECT DISTINCT substr(start_time, 1, 7) FROM ci_cd_runs WHERE start_time < ? ORDER BY 1", (cutoff,)
+    )]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move cold months of ci_cd_runs into read-only partition files.")
+    parser.add_argument('--database', help="SQLite file to archive from (defaults to app.DATABASE)")
+    parser.add_argument('--keep-months', type=int, default=6,
+                        help="full months before the current one that stay in the hot file")
+    parser.add_argument('--month', action='append', help="archive this YYYY-MM instead; repeatable")
+    parser.add_argument('--compress', action='store_true', help="gzip the partition files")
+    parser.add_argument('--no-vacuum', action='store_true', help="do not VACUUM the hot file afterwards")
+    args = parser.parse_args(argv)
+
+    import app as dashboard
+
+    if args.database:
+        dashboard.DATABASE = args.database
+    dashboard.ensure_schema()
+    conn = dashboard.connect_writer(dashboard.DATABASE)
+    try:
+        months = args.month or cold_months(conn, args.keep_months)
+        moved = 0
+        for month in months:
+            runs = archive_month(conn, dashboard.DATABASE, month, args.compress)
+            print(f"Archived {runs} runs of {month}.")
+            moved += runs
+        if moved and not args.no_vacuum:
+            conn.execute("VACUUM")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
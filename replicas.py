@@ -0,0 +1,70 @@
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+# Read replicas are plain copies of the primary taken through the SQLite
+# backup API. Each refresh copies one consistent snapshot into a temporary
+# file and renames it over the replica, so readers only ever see a complete
+# copy; connections still open on the old file finish on it, and the pool
+# drops them at their next checkout (db.ConnectionPool).
+
+
+def refresh_replica(primary, replica):
+    """Replaces replica with a fresh copy of primary and returns its data version.
+
+    The copy is made in a single backup step, which is one read transaction
+    on the primary: in WAL mode ingest keeps writing while it runs, and the
+    replica is exactly the data at one version. Replicas use a rollback
+    journal, so reading them needs no -wal or -shm files.
+    """
+    staging = replica + '.tmp'
+    if os.path.exists(staging):
+        os.remove(staging)
+    source = sqlite3.connect(f"file:{primary}?mode=ro", uri=True)
+    try:
+        target = sqlite3.connect(staging)
+        try:
+            source.backup(target)
+            target.execute("PRAGMA journal_mode = DELETE")
+            version = target.execute("SELECT version FROM data_version WHERE id = 1").fetchone()[0]
+        finally:
+            target.close()
+    finally:
+        source.close()
+    os.replace(staging, replica)
+    return version
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Refresh the read replicas the dashboard endpoints read from.")
+    parser.add_argument('--database', help="primary SQLite file (defaults to app.DATABASE)")
+    parser.add_argument('--replica', action='append',
+                        help="replica file to refresh; repeatable (defaults to app READ_REPLICAS)")
+    parser.add_argument('--interval', type=float, default=0,
+                        help="keep refreshing every INTERVAL seconds instead of once")
+    args = parser.parse_args(argv)
+
+    import app as dashboard
+
+    if args.database:
+        dashboard.DATABASE = args.database
+    dashboard.ensure_schema()
+    replicas = args.replica or dashboard.app.config['READ_REPLICAS']
+    if not replicas:
+        parser.error("pass --replica or set READ_REPLICAS")
+
+    while True:
+        started = time.monotonic()
+        for replica in replicas:
+            copied = time.monotonic()
+            version = refresh_replica(dashboard.DATABASE, replica)
+            print(f"Refreshed '{replica}' at data version {version} in {time.monotonic() - copied:.1f}s.")
+        if not args.interval:
+            return 0
+        time.sleep(max(args.interval - (time.monotonic() - started), 0))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,183 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+# Per-day aggregate of ci_cd_runs, one row per (day, repository, platform, status).
+# Triggers on ci_cd_runs keep it current for every writer, including ad-hoc scripts.
+ROLLUP_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS run_daily_rollup (
+      day DATE NOT NULL,
+      repository_id INTEGER NOT NULL,
+      platform TEXT NOT NULL,
+      status TEXT NOT NULL, -- '' stands in for runs without a status
+      runs INTEGER NOT NULL DEFAULT 0,
+      cost REAL NOT NULL DEFAULT 0.0,
+      duration_seconds INTEGER NOT NULL DEFAULT 0,
+      PRIMARY KEY (day, repository_id, platform, status)
+    ) WITHOUT ROWID;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS run_daily_rollup_insert
+    AFTER INSERT ON ci_cd_runs
+    BEGIN
+      INSERT INTO run_daily_rollup (day, repository_id, platform, status, runs, cost, duration_seconds)
+      VALUES (date(NEW.start_time), NEW.repository_id, NEW.platform, IFNULL(NEW.status, ''),
+              1, IFNULL(NEW.cost, 0.0), IFNULL(NEW.duration_seconds, 0))
+      ON CONFLICT (day, repository_id, platform, status) DO UPDATE SET
+        runs = runs + 1,
+        cost = cost + excluded.cost,
+        duration_seconds = duration_seconds + excluded.duration_seconds;
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS run_daily_rollup_delete
+    AFTER DELETE ON ci_cd_runs
+    BEGIN
+      UPDATE run_daily_rollup SET
+        runs = runs - 1,
+        cost = cost - IFNULL(OLD.cost, 0.0),
+        duration_seconds = duration_seconds - IFNULL(OLD.duration_seconds, 0)
+      WHERE day = date(OLD.start_time) AND repository_id = OLD.repository_id
+        AND platform = OLD.platform AND status = IFNULL(OLD.status, '');
+      DELETE FROM run_daily_rollup
+      WHERE day = date(OLD.start_time) AND repository_id = OLD.repository_id
+        AND platform = OLD.platform AND status = IFNULL(OLD.status, '') AND runs <= 0;
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS run_daily_rollup_update
+    AFTER UPDATE OF repository_id, platform, start_time, status, cost, duration_seconds ON ci_cd_runs
+    BEGIN
+      UPDATE run_daily_rollup SET
+        runs = runs - 1,
+        cost = cost - IFNULL(OLD.cost, 0.0),
+        duration_seconds = duration_seconds - IFNULL(OLD.duration_seconds, 0)
+      WHERE day = date(OLD.start_time) AND repository_id = OLD.repository_id
+        AND platform = OLD.platform AND status = IFNULL(OLD.status, '');
+      DELETE FROM run_daily_rollup
+      WHERE day = date(OLD.start_time) AND repository_id = OLD.repository_id
+        AND platform = OLD.platform AND status = IFNULL(OLD.status, '') AND runs <= 0;
+      INSERT INTO run_daily_rollup (day, repository_id, platform, status, runs, cost, duration_seconds)
+      VALUES (date(NEW.start_time), NEW.repository_id, NEW.platform, IFNULL(NEW.status, ''),
+              1, IFNULL(NEW.cost, 0.0), IFNULL(NEW.duration_seconds, 0))
+      ON CONFLICT (day, repository_id, platform, status) DO UPDATE SET
+        runs = runs + 1,
+        cost = cost + excluded.cost,
+        duration_seconds = duration_seconds + excluded.duration_seconds;
+    END;
+    """,
+]
+
+BACKFILL_SELECT = """
+SELECT
+  date(start_time), repository_id, platform, IFNULL(status, ''),
+  COUNT(*), SUM(IFNULL(cost, 0.0)), SUM(IFNULL(duration_seconds, 0))
+FROM ci_cd_runs
+GROUP BY 1, 2, 3, 4
+"""
+BACKFILL_INSERT = """
+INSERT INTO run_daily_rollup (day, repository_id, platform, status, runs, cost, duration_seconds)"""
+BACKFILL_QUERY = BACKFILL_INSERT + BACKFILL_SELECT + ";"
+
+
+def create_rollup(conn):
+    """Creates the rollup table and its triggers, backfilling it on first creation.
+
+    Runs inside the caller's transaction, so runs written while we backfill are
+    counted exactly once.
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'run_daily_rollup'"
+    ).fetchone()
+    for statement in ROLLUP_SCHEMA:
+        conn.execute(statement)
+    if not exists:
+        conn.execute(BACKFILL_QUERY)
+
+
+def rebuild_rollup(conn):
+    """Recomputes the whole rollup from ci_cd_runs, including the archived months."""
+    from partitions import readable_partition
+
+    archived = []
+    for path, compressed in conn.execute("SELECT path, compressed FROM run_partitions").fetchall():
+        partition = sqlite3.connect(f"file:{readable_partition(path, compressed)}?mode=ro&immutable=1", uri=True)
+        try:
+            archived += partition.execute(BACKFILL_SELECT).fetchall()
+        finally:
+            partition.close()
+    with conn:
+        conn.execute("DELETE FROM run_daily_rollup")
+        conn.execute(BACKFILL_QUERY)
+        conn.executemany(BACKFILL_INSERT + " VALUES (?, ?, ?, ?, ?, ?, ?);", archived)
+
+
+def _parse_bound(value):
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+def split_window(start, end):
+    """Splits [start, end) into the whole days a daily rollup can answer and the rest.
+
+    Returns (days, edges): days is a ('YYYY-MM-DD', 'YYYY-MM-DD') half-open
+    range of whole days, or None when the window covers none, and edges lists
+    the [start, end) ranges of partial days to read from ci_cd_runs.
+    """
+    start_dt, end_dt = _parse_bound(start), _parse_bound(end)
+    start_str = start_dt.strftime('%Y-%m-%d %H:%M:%S')
+    end_str = end_dt.strftime('%Y-%m-%d %H:%M:%S')
+
+    first_day = start_dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    if first_day < start_dt:
+        first_day += timedelta(days=1)
+    last_day = end_dt.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    if first_day >= last_day:
+        return None, [(start_str, end_str)]
+
+    days = (first_day.strftime('%Y-%m-%d'), last_day.strftime('%Y-%m-%d'))
+    edges = []
+    if start_dt < first_day:
+        edges.append((start_str, days[0]))
+    if last_day < end_dt:
+        edges.append((days[1], end_str))
+    return days, edges
+
+
+def window_runs(start, end, by_day=False, run_tables=None):
+    """Returns (sql, params) for a CTE body with the runs in [start, end).
+
+    The CTE yields (repository_id, platform, status, runs, cost, duration_seconds),
+    plus the day the runs started on when by_day is set. Whole days come from
+    run_daily_rollup; only partial days at either edge of the window are read
+    from ci_cd_runs. Aggregate with SUM(runs), not COUNT(*).
+
+    run_tables(start, end), e.g. db.PooledConnection.run_tables, names the
+    tables holding a raw range's runs once months have been archived.
+    """
+    days, edges = split_window(start, end)
+
+    raw_day = "date(start_time) AS day, " if by_day else ""
+    rollup_day = "day, " if by_day else ""
+
+    def raw_query(table):
+        return f"""
+        SELECT {raw_day}repository_id, platform, IFNULL(status, '') AS status, 1 AS runs,
+               IFNULL(cost, 0.0) AS cost, IFNULL(duration_seconds, 0) AS duration_seconds
+        FROM {table}
+        WHERE start_time >= ? AND start_time < ?"""
+
+    parts, params = [], []
+    if days:
+        parts.append(f"""
+        SELECT {rollup_day}repository_id, platform, status, runs, cost, duration_seconds
+        FROM run_daily_rollup
+        WHERE day >= ? AND day < ?""")
+        params += days
+    for edge in edges:
+        for table in run_tables(*edge) if run_tables else ['ci_cd_runs']:
+            parts.append(raw_query(table))
+            params += edge
+    return "\n        UNION ALL".join(parts), params
@@ -0,0 +1,68 @@
+import json
+
+from flask import Response
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+FETCH_SIZE = 500
+
+
+def stream_format(request):
+    """Returns 'ndjson', 'json' or None for how a listing should be sent.
+
+    NDJSON is chosen by ?format=ndjson or an Accept header that prefers it;
+    ?stream=1 streams the usual JSON document. None means render normally.
+    """
+    if request.args.get('format') == 'ndjson':
+        return 'ndjson'
+    if request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE:
+        return 'ndjson'
+    if request.args.get('stream', '').lower() in ('1', 'true'):
+        return 'json'
+    return None
+
+
+def _dumps(value):
+    return json.dumps(value, sort_keys=True, separators=(',', ':'))
+
+
+def stream_rows(fmt, rows=(), cursor=None, conn=None, transform=dict, attach=None, prefix='[', suffix=']'):
+    """Returns a chunked Response that encodes rows as they are fetched.
+
+    rows are sent first, then whatever is left on cursor, FETCH_SIZE rows per
+    chunk. When conn is given the response owns it and closes it when the
+    server closes the response, which also happens when the body is never
+    read (HEAD, or a client gone before the first chunk). attach(items), if
+    given, can add to each chunk's transformed rows in place before they are
+    encoded. For fmt 'json' the rows are the items of a JSON array wrapped in
+    prefix/suffix; for 'ndjson' one per line.
+    """
+    def fetch():
+        return cursor.fetchmany(FETCH_SIZE) if cursor is not None else []
+
+    def generate():
+        batch = list(rows) or fetch()
+        first = True
+        if fmt == 'json':
+            yield prefix
+        while batch:
+            items = [transform(row) for row in batch]
+            if attach is not None:
+                attach(items)
+            chunk = []
+            for item in items:
+                encoded = _dumps(item)
+                if fmt == 'ndjson':
+                    chunk.append(encoded + '\n')
+                else:
+                    chunk.append(encoded if first else ',' + encoded)
+                first = False
+            yield ''.join(chunk)
+            batch = fetch()
+        if fmt == 'json':
+            yield suffix
+
+    mimetype = NDJSON_MIMETYPE if fmt == 'ndjson' else 'application/json'
+    response = Response(generate(), mimetype=mimetype)
+    if conn is not None:
+        response.call_on_close(conn.close)
+    return response
@@ -0,0 +1,190 @@
+import argparse
+import os
+import random
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+
+from migrations import migrate
+
+TEMPLATE_DATABASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database', 'demo.db')
+INSERT_BATCH = 50000
+
+WORKFLOWS = ('build', 'test', 'lint', 'deploy', 'nightly', 'release', 'security-scan')
+BRANCHES = ('main', 'develop', 'release', 'feature/login', 'feature/billing', 'hotfix/ci')
+STATUSES = (('success', 80), ('failed', 15), ('cancelled', 4), ('queued', 1))
+# Per-minute runner price by OS, roughly in line with hosted runners.
+OS_RATES = {'ubuntu-latest': 0.008, 'windows-latest': 0.016, 'macos-latest': 0.08}
+
+
+def _base_schema(template):
+    """CREATE statements for the application tables, as shipped in demo.db.
+
+    Only the base tables are copied, so a template that has been migrated in
+    place still yields a database the migrations will build from scratch.
+    """
+    conn = sqlite3.connect(f"file:{template}?mode=ro", uri=True)
+    try:
+        return [row[0] for row in conn.execute("""
+            SELECT sql FROM sqlite_master
+            WHERE type IN ('table', 'index') AND sql IS NOT NULL
+              AND name NOT LIKE 'sqlite_%'
+              AND tbl_name IN ('entities', 'repositories', 'users', 'entity_memberships',
+                               'repository_access', 'ci_cd_runs', 'repository_stats')
+            ORDER BY type DESC, rowid
+        """)]
+    finally:
+        conn.close()
+
+
+def build_org(rng, teams):
+    """Returns entity rows (id, name, platform, type, parent_id) for a synthetic org.
+
+    One enterprise with an org per platform: nested GitHub teams, GitLab
+    groups with subgroups up to three levels deep, and Bitbucket workspaces
+    holding projects. teams is the number of top-level units per platform.
+    """
+    entities = []
+
+    def add(name, platform, kind, parent_id):
+        entities.append((len(entities) + 1, name, platform, kind, parent_id))
+        return len(entities)
+
+    enterprise = add('My Global Enterprise', None, 'enterprise', None)
+
+    github = add('github-org', 'github', 'org', enterprise)
+    for t in range(teams):
+        team = add(f'gh-team-{t}', 'github', 'team', github)
+        for c in range(rng.randint(0, 3)):
+            add(f'gh-team-{t}-{c}', 'github', 'team', team)
+
+    gitlab = add('gitlab-org', 'gitlab', 'org', enterprise)
+    for g in range(teams):
+        group = add(f'gl-group-{g}', 'gitlab', 'group', gitlab)
+        parents = [group]
+        for s in range(rng.randint(1, 4)):
+            parent = rng.choice(parents)
+            subgroup = add(f'gl-group-{g}-sub-{s}', 'gitlab', 'subgroup', parent)
+            if len(parents) < 3:
+                parents.append(subgroup)
+
+    bitbucket = add('bitbucket-org', 'bitbucket', 'org', enterprise)
+    for w in range(max(teams // 2, 1)):
+        workspace = add(f'bb-workspace-{w}', 'bitbucket', 'workspace', bitbucket)
+        for p in range(rng.randint(1, 4)):
+            add(f'bb-workspace-{w}-project-{p}', 'bitbucket', 'project', workspace)
+
+    return entities
+
+
+def build_repositories(rng, entities, count):
+    """Spreads count repositories over the org's non-root units, in their platforms."""
+    owners = [e for e in entities if e[3] not in ('enterprise', 'org')]
+    repositories = []
+    for i in range(count):
+        owner = rng.choice(owners)
+        repositories.append((i + 1, f'{owner[1]}-repo-{i}', owner[0], owner[2], 0 if rng.random() < 0.05 else 1))
+    return repositories
+
+
+def generate_runs(rng, repositories, users, count, days, end=None):
+    """Yields ci_cd_runs rows spread over the days before end.
+
+    Repository activity is skewed so a few repositories account for most runs,
+    as in real orgs.
+    """
+    end = end or datetime.today().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    span = days * 86400
+    weights = [1.0 / (rank + 1) ** 0.8 for rank in range(len(repositories))]
+    picks = rng.choices(repositories, weights=weights, k=count)
+    statuses, status_weights = zip(*STATUSES)
+    oses = list(OS_RATES)
+    for i, repo in enumerate(picks):
+        start = end - timedelta(seconds=rng.randrange(span))
+        duration = int(rng.lognormvariate(5.5, 0.9)) + 10
+        os_name = rng.choice(oses)
+        yield (
+            repo[0], repo[3], f'{repo[3]}-{i}', rng.choice(WORKFLOWS), rng.choice(BRANCHES),
+            '%040x' % rng.getrandbits(160),
+            start.strftime('%Y-%m-%d %H:%M:%S'),
+            (start + timedelta(seconds=duration)).strftime('%Y-%m-%d %H:%M:%S'),
+            duration, rng.choices(statuses, status_weights)[0],
+            round(duration / 60 * OS_RATES[os_name], 4), rng.choice(users), os_name,
+        )
+
+
+def generate(path, repos=1000, runs=1000000, days=730, teams=40, seed=1, template=TEMPLATE_DATABASE):
+    """Writes a synthetic dashboard database to path, replacing any existing file.
+
+    Runs are bulk-loaded before the migrations run, so the rollup, closure
+    and indexes are built once at the end instead of row by row.
+    """
+    rng = random.Random(seed)
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = OFF")
+        for statement in _base_schema(template):
+            conn.execute(statement)
+
+        entities = build_org(rng, teams)
+        repositories = build_repositories(rng, entities, repos)
+        user_ids = list(range(1, max(repos // 10, 1) + 1))
+        with conn:
+            conn.executemany(
+                "INSERT INTO entities (id, name, platform, type, parent_id) VALUES (?, ?, ?, ?, ?)", entities
+            )
+            conn.executemany(
+                "INSERT INTO repositories (id, name, entity_id, platform, is_active) VALUES (?, ?, ?, ?, ?)",
+                repositories,
+            )
+            conn.executemany(
+                "INSERT INTO users (id, username, email, platform) VALUES (?, ?, ?, ?)",
+                [(u, f'user{u}', f'user{u}@example.com', rng.choice(('github', 'gitlab', 'bitbucket')))
+                 for u in user_ids],
+            )
+
+        batch = []
+        insert = """
+            INSERT INTO ci_cd_runs (repository_id, platform, run_id, workflow_name, branch, commit_sha,
+                                    start_time, end_time, duration_seconds, status, cost,
+                                    triggered_by_user_id, os)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """
+        for row in generate_runs(rng, repositories, user_ids, runs, days):
+            batch.append(row)
+            if len(batch) >= INSERT_BATCH:
+                with conn:
+                    conn.executemany(insert, batch)
+                batch = []
+        if batch:
+            with conn:
+                conn.executemany(insert, batch)
+
+        migrate(conn)
+    finally:
+        conn.close()
+    return {'entities': len(entities), 'repositories': repos, 'runs': runs, 'days': days}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic dashboard database.")
+    parser.add_argument('path', help="SQLite file to write (replaced if it exists)")
+    parser.add_argument('--repos', type=int, default=1000)
+    parser.add_argument('--runs', type=int, default=1000000)
+    parser.add_argument('--days', type=int, default=730, help="spread runs over this many days up to today")
+    parser.add_argument('--teams', type=int, default=40, help="top-level teams/groups per platform")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    summary = generate(args.path, args.repos, args.runs, args.days, args.teams, args.seed)
+    print(f"Wrote {summary} to '{args.path}'.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
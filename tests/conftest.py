@@ -0,0 +1,61 @@
+import os
+import shutil
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as dashboard  # noqa: E402
+import synthetic  # noqa: E402
+from leaderboard import roll_leaderboards  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def source_database(tmp_path_factory):
+    """A small synthetic org, generated once: runs spread over the 400 days up to today."""
+    path = str(tmp_path_factory.mktemp('source') / 'dashboard.db')
+    synthetic.generate(path, repos=40, runs=8000, days=400, teams=3, seed=7)
+    return path
+
+
+@pytest.fixture
+def database(tmp_path, source_database):
+    """A private copy of the synthetic database, migrated and served by app."""
+    path = str(tmp_path / 'dashboard.db')
+    shutil.copy(source_database, path)
+    previous = dashboard.DATABASE
+    dashboard.DATABASE = path
+    dashboard.app.config['RESPONSE_CACHE'] = False
+    dashboard.ensure_schema()
+    conn = dashboard.connect_writer(path)
+    try:
+        # What the daily leaderboard job does; reads never build the boards.
+        roll_leaderboards(conn, dashboard.leaderboard_windows(), rebuild=True)
+    finally:
+        conn.close()
+    yield path
+    dashboard.DATABASE = previous
+    dashboard.app.config.pop('RESPONSE_CACHE', None)
+
+
+@pytest.fixture
+def client(database):
+    return dashboard.app.test_client()
+
+
+@pytest.fixture
+def writer(database):
+    conn = dashboard.connect_writer(database)
+    yield conn
+    conn.close()
+
+
+def query(database, sql, params=()):
+    """Runs sql on a plain connection to database and returns every row."""
+    conn = sqlite3.connect(database)
+    try:
+        return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import anomalies
+from conftest import query
+
+
+def _busiest_repository(database):
+    return query(database, """
+        SELECT repository_id, platform FROM ci_cd_runs
+        GROUP BY repository_id ORDER BY COUNT(*) DESC LIMIT 1
+    """)[0]
+
+
+def _add_failures(writer, repo_id, platform, count):
+    # After every existing run, so replaying by start time sees them in insert order.
+    (latest,) = writer.execute("SELECT MAX(start_time) FROM ci_cd_runs").fetchone()
+    with writer:
+        for i in range(count):
+            start = datetime.fromisoformat(latest) + timedelta(minutes=10 * (i + 1))
+            writer.execute("""
+                INSERT INTO ci_cd_runs (repository_id, platform, run_id, workflow_name, start_time, end_time, status, cost)
+                VALUES (?, ?, ?, 'deploy', ?, ?, 'failed', 50.0)
+            """, (repo_id, platform, f'spike-{i}', str(start), str(start + timedelta(minutes=5))))
+
+
+def test_a_failure_spike_is_flagged(client, database, writer):
+    repo_id, platform = _busiest_repository(database)
+    assert repo_id not in {a['repo_id'] for a in client.get('/api/anomalies?kind=repository').get_json()}
+
+    _add_failures(writer, repo_id, platform, 15)
+
+    flagged = client.get(f'/api/anomalies?kind=repository&platform={platform}').get_json()
+    (anomaly,) = [a for a in flagged if a['repo_id'] == repo_id]
+    assert anomaly['recent_failure_rate_percent'] > anomaly['baseline_failure_rate_percent']
+    assert anomaly['flags']
+
+
+def test_rebuilt_baselines_match_the_triggers(database, writer):
+    repo_id, platform = _busiest_repository(database)
+    _add_failures(writer, repo_id, platform, 5)
+    columns = "kind, repository_id, workflow_name, runs, fast_failure, slow_failure, slow_cost"
+    incremental = query(database, f"SELECT {columns} FROM run_baselines ORDER BY 1, 2, 3")
+    with writer:
+        anomalies.rebuild_baselines(writer)
+    rebuilt = query(database, f"SELECT {columns} FROM run_baselines ORDER BY 1, 2, 3")
+    assert len(rebuilt) == len(incremental)
+    for row, expected in zip(rebuilt, incremental):
+        assert row[:4] == expected[:4]
+        assert row[4:] == pytest.approx(expected[4:])
@@ -0,0 +1,29 @@
+import asyncio
+
+import asgi
+
+
+def _get(path, query_string=b''):
+    """Drives asgi.application through one GET and returns (status, body)."""
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query_string,
+        'root_path': '', 'headers': [(b'host', b'testserver')],
+        'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+    }
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(asgi.application(scope, receive, send))
+    return messages[0]['status'], b''.join(message.get('body', b'') for message in messages[1:])
+
+
+def test_application_serves_the_flask_routes(client):
+    status, body = _get('/api/platform-summary', b'platform=github&range=1yr')
+    assert status == 200
+    assert body == client.get('/api/platform-summary?platform=github&range=1yr').get_data()
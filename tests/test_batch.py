@@ -0,0 +1,47 @@
+import pytest
+
+from db import get_pool
+
+REQUESTS = {
+    'summary': '/api/dashboard-summary?range=30d',
+    'costs': '/api/platform-costs?range=30d',
+    'github': '/api/platform-summary?platform=github&range=30d',
+    'gitlab': '/api/platform-teams?platform=gitlab&range=1yr',
+    'repositories': '/api/platform-repositories?platform=github&range=1yr&limit=5',
+}
+
+
+def test_batch_matches_the_separate_requests(client):
+    response = client.post('/api/batch', json={'requests': REQUESTS})
+    assert response.status_code == 200
+    results = response.get_json()
+    for name, url in REQUESTS.items():
+        alone = client.get(url)
+        assert results[name]['status'] == alone.status_code
+        assert results[name]['body'] == alone.get_json()
+    assert results['repositories']['headers']['X-Next-Cursor']
+
+
+def test_failed_subrequests_keep_their_status(client):
+    results = client.post('/api/batch', json={'requests': {
+        'bad': '/api/platform-summary',
+        'missing': '/api/no-such-route',
+        'good': '/api/teams?range=30d',
+    }}).get_json()
+    assert results['bad']['status'] == 400
+    assert results['missing']['status'] == 404
+    assert results['good']['status'] == 200
+
+
+@pytest.mark.parametrize('payload', [{}, {'requests': {}}, {'requests': {'x': 'http://example.com/'}}])
+def test_bad_batches_are_rejected(client, database, payload):
+    client.get('/api/dashboard-summary')
+    pool = get_pool(database)
+    idle = len(pool._idle)
+    assert client.post('/api/batch', json=payload).status_code == 400
+    assert len(pool._idle) == idle
+
+
+def test_batches_return_their_connection(client, database):
+    client.post('/api/batch', json={'requests': REQUESTS})
+    assert len(get_pool(database)._idle) == 1
@@ -0,0 +1,37 @@
+from datetime import date, timedelta
+
+import pytest
+
+from conftest import query
+
+
+def test_groups_match_the_raw_runs(client, database):
+    start = (date.today() - timedelta(days=90)).isoformat()
+    body = client.get(f'/api/breakdown?group_by=platform,os&start={start}&limit=1000').get_json()
+    raw = query(database, """
+        SELECT platform, IFNULL(os, ''), COUNT(*), SUM(status = 'failed'), SUM(IFNULL(cost, 0))
+        FROM ci_cd_runs
+        WHERE start_time >= ?
+        GROUP BY 1, 2
+    """, (start,))
+    assert body['total_groups'] == len(raw)
+    groups = {(group['platform'], group['os'] or ''): group for group in body['groups']}
+    for platform, os_name, jobs, failed, cost in raw:
+        group = groups[(platform, os_name)]
+        assert (group['total_jobs'], group['failed_jobs']) == (jobs, failed)
+        assert group['total_cost'] == pytest.approx(cost)
+
+
+def test_percentiles_are_within_the_sketch_accuracy(client, database):
+    start = (date.today() - timedelta(days=30)).isoformat()
+    body = client.get(f'/api/breakdown?group_by=platform&platform=github&start={start}').get_json()
+    (group,) = body['groups']
+    durations = [row[0] for row in query(database, """
+        SELECT (julianday(end_time) - julianday(start_time)) * 86400
+        FROM ci_cd_runs
+        WHERE platform = 'github' AND start_time >= ? AND end_time > start_time
+        ORDER BY 1
+    """, (start,))]
+    median = durations[(len(durations) - 1) // 2]
+    assert group['p50_duration_seconds'] == pytest.approx(median, rel=0.05)
+    assert group['p50_duration_seconds'] <= group['p90_duration_seconds'] <= group['p99_duration_seconds']
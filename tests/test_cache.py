@@ -0,0 +1,37 @@
+import pytest
+
+import app as dashboard
+import cache
+
+URL = '/api/platform-summary?platform=github&range=1yr'
+
+
+@pytest.fixture
+def cached_client(client, monkeypatch):
+    monkeypatch.setitem(dashboard.app.config, 'RESPONSE_CACHE', True)
+    monkeypatch.setattr(cache, 'VERSION_POLL_SECONDS', 0.0)
+    dashboard.response_cache.clear()
+    yield client
+    dashboard.response_cache.clear()
+
+
+def test_repeated_requests_revalidate_with_the_etag(cached_client):
+    first = cached_client.get(URL)
+    assert first.status_code == 200
+    assert first.headers['Cache-Control'] == 'no-cache'
+    assert cached_client.get(URL).get_data() == first.get_data()
+    assert cached_client.get(URL, headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+
+def test_writes_invalidate_cached_responses(cached_client, writer):
+    first = cached_client.get(URL)
+    with writer:
+        writer.execute("UPDATE ci_cd_runs SET cost = cost + 100 WHERE platform = 'github'")
+    second = cached_client.get(URL)
+    assert second.headers['ETag'] != first.headers['ETag']
+    assert second.get_json()['total_cost'] > first.get_json()['total_cost']
+
+
+def test_errors_are_not_cached(cached_client):
+    assert cached_client.get('/api/platform-summary').status_code == 400
+    assert len(dashboard.response_cache._entries) == 0
@@ -0,0 +1,47 @@
+from datetime import date, timedelta
+
+import pytest
+
+import app as dashboard
+import cache
+import columnar
+from benchmark import benchmark_urls
+from conftest import query
+
+pytest.importorskip('numpy')
+
+def _windowed_urls():
+    today = date.today()
+    window = f'start={today - timedelta(days=200)}T05:30:00&end={today - timedelta(days=3)}T18:00:00'
+    return benchmark_urls(dashboard.app) + benchmark_urls(dashboard.app, windows=[window])
+
+
+def test_columnar_backend_returns_the_same_json(client, database, monkeypatch):
+    columnar.build_snapshot(database)
+    different = []
+    for url in _windowed_urls():
+        bodies = {}
+        for backend in ('sqlite', 'columnar'):
+            monkeypatch.setitem(dashboard.app.config, 'ANALYTICS_BACKEND', backend)
+            with client.get(url) as response:
+                bodies[backend] = response.get_data()
+        if bodies['columnar'] != bodies['sqlite']:
+            different.append(url)
+    assert different == []
+
+
+def test_stale_snapshot_falls_back_to_the_rollup(client, database, writer, monkeypatch):
+    columnar.build_snapshot(database)
+    monkeypatch.setattr(cache, 'VERSION_POLL_SECONDS', 0.0)
+    monkeypatch.setitem(dashboard.app.config, 'ANALYTICS_BACKEND', 'columnar')
+    url = '/api/platform-summary?platform=github&range=1yr'
+    before = client.get(url).get_json()
+    (run_id,) = query(database, """
+        SELECT run_id FROM ci_cd_runs
+        WHERE platform = 'github' AND start_time < date('now', '-1 day')
+        ORDER BY start_time DESC LIMIT 1
+    """)[0]
+    writer.execute("UPDATE ci_cd_runs SET cost = cost + 100 WHERE run_id = ?", (run_id,))
+    writer.commit()
+    after = client.get(url).get_json()
+    assert after["total_cost"] == pytest.approx(before["total_cost"] + 100)
@@ -0,0 +1,69 @@
+import pytest
+
+from db import get_pool
+
+REJECTED = [
+    ('/api/dashboard-summary?range=forever', 400),
+    ('/api/platform-costs?start=2025-02-01&end=2025-01-01', 400),
+    ('/api/platform-summary', 400),
+    ('/api/platform-summary?platform=github&range=forever', 400),
+    ('/api/platform-teams-summary', 400),
+    ('/api/platform-teams-summary?platform=github&as_user=123456', 404),
+    ('/api/platform-teams?platform=svn', 400),
+    ('/api/platform-teams?platform=github&sort_by=name', 400),
+    ('/api/platform-teams?platform=github&rollup=sideways', 400),
+    ('/api/platform-teams?platform=github&expand=owners', 400),
+    ('/api/platform-teams?platform=github&as_user=abc', 400),
+    ('/api/platform-repositories-summary?platform=github&as_user=123456', 404),
+    ('/api/platform-repositories-summary', 400),
+    ('/api/platform-repositories?platform=github&sort_by=name', 400),
+    ('/api/platform-repositories?platform=github&after=junk', 400),
+    ('/api/leaderboard?platform=github&k=0', 400),
+    ('/api/leaderboard?platform=github&as_user=123456', 404),
+    ('/api/teams?sort_by=name', 400),
+    ('/api/teams?rollup=sideways', 400),
+    ('/api/teams?expand=owners', 400),
+    ('/api/teams?as_user=123456', 404),
+    ('/api/repositories?sort_by=name', 400),
+    ('/api/repositories?range=forever', 400),
+    ('/api/repositories?limit=0', 400),
+    ('/api/repositories?as_user=123456', 404),
+    ('/api/cost-timeseries?bucket=hour', 400),
+    ('/api/breakdown?group_by=colour', 400),
+    ('/api/anomalies?days=0', 400),
+    ('/api/users/123456/costs', 404),
+    ('/api/users/1/costs?range=forever', 400),
+]
+
+
+def test_requests_reuse_one_connection(client, database):
+    pool = get_pool(database)
+    for url in ('/api/dashboard-summary', '/api/teams', '/api/platform-summary?platform=github'):
+        assert client.get(url).status_code == 200
+    assert len(pool._idle) == 1
+
+
+@pytest.mark.parametrize('url, status', REJECTED)
+def test_rejected_requests_return_their_connection(client, database, url, status):
+    client.get('/api/dashboard-summary')
+    pool = get_pool(database)
+    idle = len(pool._idle)
+    assert client.get(url).status_code == status
+    assert len(pool._idle) == idle
+
+
+@pytest.mark.parametrize('url', [
+    '/api/platform-teams?platform=github&format=ndjson',
+    '/api/platform-repositories?platform=github&format=ndjson',
+    '/api/teams?format=ndjson',
+    '/api/repositories?stream=1',
+])
+@pytest.mark.parametrize('method', ['head', 'get'])
+def test_unread_streams_return_their_connection(client, database, url, method):
+    client.get('/api/dashboard-summary')
+    pool = get_pool(database)
+    idle = len(pool._idle)
+    response = getattr(client, method)(url, buffered=False)
+    assert response.status_code == 200
+    response.close()
+    assert len(pool._idle) == idle
@@ -0,0 +1,78 @@
+import csv
+import io
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as dashboard
+import export
+from conftest import query
+
+START = (datetime.today() - timedelta(days=60)).strftime('%Y-%m-%dT07:45:00')
+END = (datetime.today() - timedelta(days=5)).strftime('%Y-%m-%dT16:20:00')
+WINDOW = f'start={START}&end={END}'
+
+
+def _get(client, url):
+    # Buffered, so the response is closed as a server would close it.
+    return client.get(url, buffered=True)
+
+
+def _rows(response):
+    assert response.status_code == 200
+    return list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+
+
+def test_runs_export_is_every_run_of_the_window_in_order(client, database):
+    rows = _rows(_get(client, f'/api/export?{WINDOW}'))
+    expected = query(database, """
+        SELECT id FROM ci_cd_runs WHERE start_time >= ? AND start_time < ? ORDER BY start_time, id
+    """, (START.replace('T', ' '), END.replace('T', ' ')))
+    assert rows[0][:3] == ['id', 'repository_id', 'platform']
+    assert [int(row[0]) for row in rows[1:]] == [row[0] for row in expected]
+
+
+def test_runs_export_resumes_after_the_last_id(client):
+    rows = _rows(_get(client, f'/api/export?{WINDOW}'))
+    cut = len(rows) // 3
+    rest = _rows(_get(client, f'/api/export?{WINDOW}&after_id={rows[cut][0]}'))
+    assert rest[0] == rows[0]
+    assert rest[1:] == rows[cut + 1:]
+
+
+@pytest.mark.parametrize('view', sorted(export.AGGREGATE_VIEWS))
+def test_aggregate_export_resumes_at_an_offset(client, view):
+    rows = _rows(_get(client, f'/api/export?view={view}&{WINDOW}'))
+    assert len(rows) > 1
+    assert _rows(_get(client, f'/api/export?view={view}&{WINDOW}&offset=5'))[1:] == rows[6:]
+
+
+def test_parquet_export_holds_the_same_rows(client):
+    pq = pytest.importorskip('pyarrow.parquet')
+    response = _get(client, f'/api/export?view=repositories&{WINDOW}&format=parquet')
+    assert response.status_code == 200
+    table = pq.read_table(io.BytesIO(response.get_data()))
+    rows = _rows(_get(client, f'/api/export?view=repositories&{WINDOW}'))
+    assert table.column_names == rows[0]
+    assert [str(row['repo_id']) for row in table.to_pylist()] == [row[0] for row in rows[1:]]
+
+
+def test_exports_beyond_the_limit_get_429(client):
+    open_exports = [client.get('/api/export?view=daily', buffered=False)
+                    for _ in range(export.MAX_CONCURRENT_EXPORTS)]
+    response = _get(client, '/api/export?view=daily')
+    assert response.status_code == 429
+    assert response.headers['Retry-After']
+    for response in open_exports:
+        response.close()
+    assert _get(client, '/api/export?view=daily').status_code == 200
+
+
+@pytest.mark.parametrize('method', ['head', 'get'])
+def test_unread_exports_free_their_slot(client, database, method):
+    for _ in range(export.MAX_CONCURRENT_EXPORTS + 2):
+        response = getattr(client, method)('/api/export?view=daily&range=30d', buffered=False)
+        assert response.status_code == 200
+        response.close()
+    assert dashboard.export_slots.acquire(blocking=False)
+    dashboard.export_slots.release()
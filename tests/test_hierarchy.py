@@ -0,0 +1,46 @@
+import sqlite3
+
+import pytest
+
+from conftest import query
+
+RECURSIVE_CLOSURE = """
+WITH RECURSIVE walk (ancestor_id, descendant_id, depth) AS (
+    SELECT id, id, 0 FROM entities
+    UNION ALL
+    SELECT w.ancestor_id, e.id, w.depth + 1
+    FROM walk w
+    JOIN entities e ON e.parent_id = w.descendant_id
+)
+SELECT ancestor_id, descendant_id, depth FROM walk ORDER BY 1, 2
+"""
+CLOSURE = "SELECT ancestor_id, descendant_id, depth FROM entity_closure ORDER BY 1, 2"
+
+
+def _children(database):
+    return query(database, "SELECT id, parent_id FROM entities WHERE parent_id IS NOT NULL ORDER BY id")
+
+
+def test_closure_matches_the_recursive_walk(database):
+    assert query(database, CLOSURE) == query(database, RECURSIVE_CLOSURE)
+
+
+def test_closure_follows_inserts_moves_and_deletes(database, writer):
+    children = _children(database)
+    leaf, middle = children[-1][0], children[0][0]
+    with writer:
+        writer.execute("""
+            INSERT INTO entities (name, platform, type, parent_id)
+            SELECT 'new team', platform, 'team', id FROM entities WHERE id = ?
+        """, (leaf,))
+        writer.execute("UPDATE entities SET parent_id = ? WHERE id = ?", (middle, leaf))
+        writer.execute("DELETE FROM entities WHERE id = ?", (middle,))
+    assert query(database, CLOSURE) == query(database, RECURSIVE_CLOSURE)
+
+
+def test_parent_changes_that_make_a_cycle_are_refused(database, writer):
+    child, parent = _children(database)[0]
+    with pytest.raises(sqlite3.IntegrityError, match='cycle'):
+        with writer:
+            writer.execute("UPDATE entities SET parent_id = ? WHERE id = ?", (child, parent))
+    assert query(database, CLOSURE) == query(database, RECURSIVE_CLOSURE)
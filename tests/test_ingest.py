@@ -0,0 +1,77 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import query
+
+START = (datetime.today() - timedelta(days=2)).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _run(run_id, **fields):
+    run = {'repository_id': 1, 'platform': 'github', 'run_id': run_id, 'start_time': START,
+           'status': 'success', 'cost': 0.5, 'duration_seconds': 120}
+    run.update(fields)
+    return run
+
+
+def _post(client, runs):
+    body = ''.join(json.dumps(run) + '\n' for run in runs)
+    return client.post('/api/runs/bulk', data=body, content_type='application/x-ndjson')
+
+
+def _runs_of(database, run_ids):
+    return query(database, "SELECT run_id, status, cost FROM ci_cd_runs WHERE run_id IN (SELECT value FROM json_each(?))"
+                 " ORDER BY run_id", (json.dumps(run_ids),))
+
+
+def test_valid_runs_are_written(client, database):
+    platform = query(database, "SELECT platform FROM repositories WHERE id = 1")[0][0]
+    response = _post(client, [_run('t-1', platform=platform), _run('t-2', platform=platform, status='failed')])
+    assert response.status_code == 200
+    assert response.get_json()['written'] == 2
+    assert _runs_of(database, ['t-1', 't-2']) == [('t-1', 'success', 0.5), ('t-2', 'failed', 0.5)]
+
+
+@pytest.mark.parametrize('fields, message', [
+    ({'platform': 'svn'}, 'platform'),
+    ({'repository_id': 99999}, 'unknown repository_id'),
+    ({'start_time': 'yesterday'}, 'start_time'),
+    ({'status': 'exploded'}, 'status'),
+    ({'cost': -1}, 'cost'),
+    ({'run_id': ''}, 'run_id'),
+    ({'cost': float('nan')}, 'cost'),
+    ({'cost': float('inf')}, 'cost'),
+    ({'cost': True}, 'cost'),
+    ({'duration_seconds': float('inf')}, 'duration_seconds'),
+    ({'repository_id': True}, 'repository_id'),
+])
+def test_invalid_runs_are_rejected_per_row(client, database, fields, message):
+    run = _run('bad')
+    run.update(fields)
+    response = _post(client, [run])
+    summary = response.get_json()
+    assert response.status_code == 400
+    assert (summary['written'], summary['rejected']) == (0, 1)
+    assert message in summary['errors'][0]['error']
+    assert _runs_of(database, ['bad']) == []
+
+
+def test_redelivered_runs_update_in_place(client, database):
+    platform = query(database, "SELECT platform FROM repositories WHERE id = 1")[0][0]
+    _post(client, [_run('t-1', platform=platform)])
+    _post(client, [_run('t-1', platform=platform, status='failed', cost=2.0)])
+    assert _runs_of(database, ['t-1']) == [('t-1', 'failed', 2.0)]
+    assert query(database, "SELECT COUNT(*) FROM ci_cd_runs WHERE run_id = 't-1'") == [(1,)]
+
+
+def test_identical_redeliveries_are_reported_unchanged(client, database):
+    platform = query(database, "SELECT platform FROM repositories WHERE id = 1")[0][0]
+    runs = [_run('t-1', platform=platform), _run('t-2', platform=platform)]
+    _post(client, runs)
+    runs[1]['cost'] = 3.0
+    response = _post(client, runs + [_run('bad', platform='svn')])
+    assert response.status_code == 200
+    summary = response.get_json()
+    assert (summary['received'], summary['written'], summary['unchanged'], summary['rejected']) == (3, 1, 1, 1)
+    assert _post(client, runs).get_json()['written'] == 0
@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as dashboard
+from conftest import query
+from leaderboard import roll_leaderboards
+
+RANGES = {'7d': 7, '30d': 30, '1yr': 365}
+
+
+def _explicit_window(range_str):
+    """start/end arguments for the same days as range_str, which bypass the materialized boards."""
+    today = datetime.today()
+    start = (today - timedelta(days=RANGES[range_str])).strftime('%Y-%m-%d')
+    end = (today - timedelta(days=1)).strftime('%Y-%m-%d')
+    return f'start={start}&end={end}'
+
+
+def _board(client, args):
+    response = client.get(f'/api/leaderboard?{args}')
+    assert response.status_code == 200
+    return response.get_json()
+
+
+@pytest.mark.parametrize('range_str', sorted(RANGES))
+@pytest.mark.parametrize('kind', ['repository', 'team'])
+@pytest.mark.parametrize('sort_by', ['total_cost', 'failed_jobs'])
+def test_materialized_board_matches_the_window(client, range_str, kind, sort_by):
+    args = f'platform=github&kind={kind}&sort_by={sort_by}&k=15'
+    assert _board(client, f'{args}&range={range_str}') == _board(client, f'{args}&{_explicit_window(range_str)}')
+
+
+def test_new_runs_move_the_board(client, writer):
+    start = (datetime.today() - timedelta(days=2)).strftime('%Y-%m-%d 09:00:00')
+    repo_id = writer.execute("SELECT id FROM repositories WHERE platform = 'gitlab' ORDER BY id DESC LIMIT 1").fetchone()[0]
+    with writer:
+        writer.execute("""
+            INSERT INTO ci_cd_runs (repository_id, platform, run_id, start_time, status, cost)
+            VALUES (?, 'gitlab', 'big-spender', ?, 'failed', 100000.0)
+        """, (repo_id, start))
+
+    for range_str in ('7d', '30d'):
+        board = _board(client, f'platform=gitlab&range={range_str}&k=3')
+        assert board[0]['repo_id'] == repo_id
+        assert board == _board(client, f'platform=gitlab&{_explicit_window(range_str)}&k=3')
+
+
+def test_dashboard_ranges_are_materialized(database):
+    assert {row[0] for row in query(database, "SELECT range_name FROM leaderboard_windows")} >= set(RANGES)
+
+
+def test_reads_fall_back_until_the_board_is_rolled(client, database, writer, monkeypatch):
+    monkeypatch.setattr(dashboard, '_migrated_databases', set())
+    with writer:
+        writer.execute("UPDATE leaderboard_windows SET start_day = '2000-01-01' WHERE range_name = '7d'")
+    args = 'platform=github&kind=repository&k=15'
+    assert _board(client, f'{args}&range=7d') == _board(client, f'{args}&{_explicit_window("7d")}')
+    assert query(database, "SELECT start_day FROM leaderboard_windows WHERE range_name = '7d'") == [('2000-01-01',)]
+
+
+def test_rebuild_resets_the_totals_to_the_rollup(database, writer):
+    run_id, start = writer.execute(
+        "SELECT id, start_time FROM ci_cd_runs WHERE start_time >= date('now', '-5 days') AND start_time < date('now') LIMIT 1"
+    ).fetchone()
+    with writer:
+        for _ in range(50):
+            writer.execute("UPDATE ci_cd_runs SET cost = cost + 0.1 WHERE id = ?", (run_id,))
+            writer.execute("UPDATE ci_cd_runs SET cost = cost - 0.1 WHERE id = ?", (run_id,))
+    windows = dashboard.leaderboard_windows()
+    roll_leaderboards(writer, windows, rebuild=True)
+    for range_name, (start_day, end_day) in windows.items():
+        board = query(database, """
+            SELECT platform, entity_id, total_cost FROM leaderboard
+            WHERE range_name = ? AND kind = 'repository' ORDER BY 1, 2
+        """, (range_name,))
+        rollup = query(database, """
+            SELECT platform, repository_id, SUM(cost) FROM run_daily_rollup
+            WHERE day >= ? AND day < ? GROUP BY platform, repository_id ORDER BY 1, 2
+        """, (start_day, end_day))
+        assert board == rollup
@@ -0,0 +1,37 @@
+import logging
+
+
+def test_server_timing_lists_each_query(client):
+    response = client.get('/api/platform-summary?platform=github&range=1yr')
+    timing = response.headers['Server-Timing']
+    assert timing.startswith('total;dur=')
+    assert 'desc="get_platform_summary#1"' in timing
+
+
+def test_metrics_count_requests_and_queries(client):
+    client.get('/api/teams?range=30d')
+    body = client.get('/metrics').get_data(as_text=True)
+    assert 'dashboard_request_duration_seconds_count{route="/api/teams",method="GET",status="200"}' in body
+    assert 'dashboard_query_rows_total{query="get_global_teams#1"}' in body
+
+
+def test_slow_queries_are_logged(client, monkeypatch, caplog):
+    monkeypatch.setitem(client.application.config, 'SLOW_QUERY_MS', 0)
+    with caplog.at_level(logging.WARNING, logger='dashboard.slow_queries'):
+        client.get('/api/dashboard-summary?range=30d')
+    assert any('get_dashboard_summary#1' in record.getMessage() for record in caplog.records)
+
+
+def _rows_counted(client, query):
+    body = client.get('/metrics').get_data(as_text=True)
+    prefix = f'dashboard_query_rows_total{{query="{query}"}} '
+    return next((int(line[len(prefix):]) for line in body.splitlines() if line.startswith(prefix)), 0)
+
+
+def test_streamed_bodies_are_counted_once_sent(client):
+    before = _rows_counted(client, 'get_platform_repositories#1')
+    with client.get('/api/platform-repositories?platform=github&format=ndjson') as response:
+        sent = response.get_data(as_text=True).count('\n')
+        assert 'get_platform_repositories#1' in response.headers['Server-Timing']
+    assert sent > 0
+    assert _rows_counted(client, 'get_platform_repositories#1') - before == sent
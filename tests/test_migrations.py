@@ -0,0 +1,21 @@
+import sqlite3
+
+import app as dashboard
+from conftest import query
+from migrations import MIGRATIONS, explain_endpoints, migrate
+
+
+def test_migrations_apply_once(database):
+    assert [row[0] for row in query(database, "SELECT version FROM schema_migrations ORDER BY version")] == \
+        [version for version, _, _ in MIGRATIONS]
+    conn = sqlite3.connect(database)
+    try:
+        assert migrate(conn) == []
+    finally:
+        conn.close()
+
+
+def test_endpoint_queries_avoid_full_scans(database):
+    results = explain_endpoints(dashboard.app, dashboard.get_db_connection)
+    assert {url.split('?')[0] for url, _, _, _ in results} >= {'/api/repositories', '/api/leaderboard', '/api/export'}
+    assert [(url, line) for url, _, _, full_scans in results for line in full_scans] == []
@@ -0,0 +1,76 @@
+import pytest
+
+import app as dashboard
+import columnar
+
+
+def _pages(client, url):
+    rows, cursor = [], None
+    while True:
+        page = client.get(url + (f'&after={cursor}' if cursor else '')).get_json()
+        rows += page['repositories']
+        cursor = page['next_cursor']
+        if cursor is None:
+            return rows
+
+
+@pytest.mark.parametrize('sort_by', ['total_cost', 'total_jobs'])
+def test_repository_pages_concatenate_to_the_full_listing(client, sort_by):
+    full = client.get(f'/api/repositories?range=1yr&sort_by={sort_by}').get_json()['repositories']
+    paged = _pages(client, f'/api/repositories?range=1yr&sort_by={sort_by}&limit=7')
+    assert [row['repo_id'] for row in paged] == [row['repo_id'] for row in full]
+
+
+def test_platform_repository_pages_follow_the_cursor_header(client):
+    url = '/api/platform-repositories?platform=github&range=1yr&limit=4'
+    full = client.get('/api/platform-repositories?platform=github&range=1yr').get_json()
+    rows, response = [], client.get(url)
+    while True:
+        rows += response.get_json()
+        cursor = response.headers.get('X-Next-Cursor')
+        if cursor is None:
+            break
+        response = client.get(f'{url}&after={cursor}')
+    assert [row['repo_id'] for row in rows] == [row['repo_id'] for row in full]
+
+
+@pytest.mark.parametrize('args', ['after=not-a-cursor', 'limit=0', f'limit={10 ** 6}'])
+def test_bad_page_arguments_are_rejected(client, args):
+    assert client.get(f'/api/repositories?{args}').status_code == 400
+
+
+def test_name_and_team_filters_match_substrings(client):
+    full = client.get('/api/repositories?range=1yr').get_json()['repositories']
+    name = full[0]['repo_name'][1:4]
+    team = full[0]['team_name'][1:4]
+    filtered = client.get(f'/api/repositories?range=1yr&name={name.upper()}&team={team}').get_json()['repositories']
+    assert filtered
+    assert filtered == [row for row in full
+                        if name.lower() in row['repo_name'].lower() and team.lower() in row['team_name'].lower()]
+
+
+def _cursors(client, url):
+    cursors = []
+    while True:
+        response = client.get(url + (f'&after={cursors[-1]}' if cursors else ''))
+        body = response.get_json()
+        cursor = body['next_cursor'] if isinstance(body, dict) else response.headers.get('X-Next-Cursor')
+        if cursor is None:
+            return cursors
+        cursors.append(cursor)
+
+
+@pytest.mark.parametrize('url', [
+    '/api/repositories?range=1yr&limit=5',
+    '/api/repositories?range=30d&limit=3',
+    '/api/platform-repositories?platform=github&range=1yr&limit=3',
+])
+def test_cursors_survive_a_backend_switch(client, database, monkeypatch, url):
+    pytest.importorskip('numpy')
+    columnar.build_snapshot(database)
+    cursors = {}
+    for backend in ('sqlite', 'columnar'):
+        monkeypatch.setitem(dashboard.app.config, 'ANALYTICS_BACKEND', backend)
+        cursors[backend] = _cursors(client, url)
+    assert cursors['sqlite']
+    assert cursors['columnar'] == cursors['sqlite']
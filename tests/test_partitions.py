@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import partitions
+from conftest import query
+from db import MAX_ATTACHED_PARTITIONS, get_pool
+
+DAY = timedelta(days=1)
+
+
+def _cold_months(database, count):
+    months = [row[0] for row in query(database, "SELECT DISTINCT substr(start_time, 1, 7) FROM ci_cd_runs ORDER BY 1")]
+    return months[1:count + 1]
+
+
+def _urls(months):
+    first = datetime.strptime(months[0], '%Y-%m')
+    start = (first + 3 * DAY).strftime('%Y-%m-%dT05:30:00')
+    end = (datetime.today() - 2 * DAY).strftime('%Y-%m-%dT18:00:00')
+    window = f'start={start}&end={end}'
+    return [
+        f'/api/dashboard-summary?{window}',
+        f'/api/repositories?{window}&sort_by=total_jobs',
+        f'/api/teams?{window}&rollup=subtree',
+        f'/api/cost-timeseries?{window}&bucket=month',
+        f'/api/breakdown?{window}&group_by=platform,os',
+        f'/api/users/1/costs?{window}',
+    ]
+
+
+def test_archived_months_answer_like_the_hot_table(client, database, writer):
+    months = _cold_months(database, 2)
+    before = {}
+    for url in _urls(months):
+        response = client.get(url)
+        assert response.status_code == 200, url
+        before[url] = response.get_json()
+    runs = query(database, "SELECT COUNT(*) FROM ci_cd_runs")[0][0]
+
+    moved = sum(partitions.archive_month(writer, database, month) for month in months)
+
+    assert moved > 0
+    assert query(database, "SELECT COUNT(*) FROM ci_cd_runs")[0][0] == runs - moved
+    assert [row[0] for row in query(database, "SELECT month FROM run_partitions ORDER BY month")] == months
+    for url, expected in before.items():
+        assert client.get(url).get_json() == expected, url
+
+
+def test_runs_in_archived_months_are_not_ingested(client, database, writer):
+    month = _cold_months(database, 1)[0]
+    partitions.archive_month(writer, database, month)
+    run = (f'{{"repository_id": 1, "platform": "github", "run_id": "late", '
+           f'"start_time": "{month}-15T10:00:00Z", "status": "success"}}\n')
+    summary = client.post('/api/runs/bulk', data=run, content_type='application/x-ndjson').get_json()
+    assert summary['rejected'] == 1
+    assert f'archived month {month}' in summary['errors'][0]['error']
+
+
+def test_a_month_is_archived_once(database, writer):
+    month = _cold_months(database, 1)[0]
+    partitions.archive_month(writer, database, month)
+    with pytest.raises(ValueError):
+        partitions.archive_month(writer, database, month)
+
+
+def _batch(client, months):
+    """One /api/batch whose sub-requests each read the partial days of one month."""
+    requests = {month: f'/api/dashboard-summary?start={month}-03T05:00:00&end={month}-20T05:00:00'
+                for month in months}
+    response = client.post('/api/batch', json={'requests': requests})
+    assert response.status_code == 200
+    return {month: entry['status'] for month, entry in response.get_json().items()}
+
+
+def test_partitions_past_the_attach_limit_replace_the_least_recent(client, database, writer):
+    months = _cold_months(database, MAX_ATTACHED_PARTITIONS + 1)
+    for month in months:
+        partitions.archive_month(writer, database, month)
+    first, second = months[:MAX_ATTACHED_PARTITIONS // 2], months[MAX_ATTACHED_PARTITIONS // 2:]
+
+    assert set(_batch(client, first).values()) == {200}
+    assert set(_batch(client, second).values()) == {200}
+    pool = get_pool(database)
+    assert len(pool._idle) == 1
+
+    statuses = _batch(client, months)
+    assert [statuses[month] for month in months] == [200] * MAX_ATTACHED_PARTITIONS + [400]
+    assert len(pool._idle) == 1
@@ -0,0 +1,27 @@
+import pytest
+
+from conftest import query
+
+
+def test_repository_platforms_are_kept_lowercase(database, writer):
+    with writer:
+        writer.execute("UPDATE repositories SET platform = ' GitHub ' WHERE id = 1")
+        writer.execute("""
+            INSERT INTO repositories (name, platform, entity_id, is_active)
+            SELECT 'mixed-case', 'GitLab', entity_id, 1 FROM repositories WHERE id = 1
+        """)
+    assert query(database, "SELECT DISTINCT platform FROM repositories ORDER BY 1") == \
+        [('bitbucket',), ('github',), ('gitlab',)]
+
+
+@pytest.mark.parametrize('path', [
+    '/api/platform-summary',
+    '/api/platform-teams-summary',
+    '/api/platform-teams',
+    '/api/platform-repositories-summary',
+    '/api/platform-repositories',
+])
+def test_platform_argument_is_case_insensitive(client, path):
+    lower = client.get(f'{path}?platform=github&range=1yr')
+    assert lower.status_code == 200
+    assert client.get(f'{path}?platform=GitHub&range=1yr').get_json() == lower.get_json()
@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+import app as dashboard
+import replicas
+from conftest import query
+
+URL = '/api/platform-summary?platform=github&range=1yr'
+
+
+@pytest.fixture
+def replica(database, tmp_path, monkeypatch):
+    path = str(tmp_path / 'replica.db')
+    replicas.refresh_replica(database, path)
+    monkeypatch.setitem(dashboard.app.config, 'READ_REPLICAS', [path])
+    return path
+
+
+def _bump_github_cost(writer, database):
+    (run_id,) = query(database, """
+        SELECT run_id FROM ci_cd_runs
+        WHERE platform = 'github' AND start_time < date('now', '-1 day')
+        ORDER BY start_time DESC LIMIT 1
+    """)[0]
+    writer.execute("UPDATE ci_cd_runs SET cost = cost + 100 WHERE run_id = ?", (run_id,))
+    writer.commit()
+
+
+def test_reads_follow_the_replica_until_it_is_refreshed(client, database, writer, replica):
+    before = client.get(URL).get_json()
+    _bump_github_cost(writer, database)
+    assert client.get(URL).get_json() == before
+    version = replicas.refresh_replica(database, replica)
+    assert version == query(database, "SELECT version FROM data_version WHERE id = 1")[0][0]
+    assert client.get(URL).get_json()['total_cost'] == pytest.approx(before['total_cost'] + 100)
+
+
+def test_stale_replicas_are_skipped(client, database, writer, replica):
+    _bump_github_cost(writer, database)
+    from_replica = client.get(URL).get_json()
+    os.utime(replica, (0, 0))
+    assert client.get(URL).get_json()['total_cost'] == pytest.approx(from_replica['total_cost'] + 100)
@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import query
+from db import get_pool
+from rollup import window_runs
+
+RAW_TOTALS = """
+SELECT repository_id, platform, IFNULL(status, ''), COUNT(*), ROUND(SUM(cost), 6), SUM(duration_seconds)
+FROM ci_cd_runs
+WHERE start_time >= ? AND start_time < ?
+GROUP BY 1, 2, 3
+ORDER BY 1, 2, 3
+"""
+
+
+def _days_ago(days, time='00:00:00'):
+    return f"{(datetime.today() - timedelta(days=days)).strftime('%Y-%m-%d')} {time}"
+
+
+def window_totals(database, start, end):
+    conn = get_pool(database).acquire()
+    try:
+        sql, params = window_runs(start, end, run_tables=conn.run_tables)
+        rows = conn.execute(f"""
+            WITH w AS ({sql}
+            )
+            SELECT repository_id, platform, status, SUM(runs), ROUND(SUM(cost), 6), SUM(duration_seconds)
+            FROM w
+            GROUP BY 1, 2, 3
+            ORDER BY 1, 2, 3""", params).fetchall()
+        return [tuple(row) for row in rows]
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize('start, end', [
+    (_days_ago(90), _days_ago(30)),
+    (_days_ago(41, '13:17:05'), _days_ago(3, '06:02:00')),
+    (_days_ago(10, '02:00:00'), _days_ago(10, '23:30:00')),
+    (_days_ago(400), _days_ago(-1)),
+])
+def test_window_runs_matches_raw_runs(database, start, end):
+    assert window_totals(database, start, end) == query(database, RAW_TOTALS, (start, end))
+
+
+def test_rollup_follows_inserts_updates_and_deletes(database, writer):
+    with writer:
+        writer.execute("""
+            INSERT INTO ci_cd_runs (repository_id, platform, run_id, start_time, status, cost, duration_seconds)
+            SELECT id, platform, 'test-run-1', ?, 'failed', 1.25, 60 FROM repositories WHERE id = 1
+        """, (_days_ago(5, '12:00:00'),))
+        writer.execute("UPDATE ci_cd_runs SET cost = cost + 2, status = 'success' WHERE id = 10")
+        writer.execute("DELETE FROM ci_cd_runs WHERE id = 20")
+
+    start, end = _days_ago(400), _days_ago(-1)
+    assert window_totals(database, start, end) == query(database, RAW_TOTALS, (start, end))
@@ -0,0 +1,29 @@
+import json
+
+import pytest
+
+LISTINGS = [
+    '/api/teams?range=1yr',
+    '/api/repositories?range=1yr',
+    '/api/platform-teams?platform=gitlab&range=1yr',
+    '/api/platform-repositories?platform=github&range=1yr',
+]
+
+
+@pytest.mark.parametrize('url', LISTINGS)
+def test_streamed_json_is_the_rendered_document(client, url):
+    rendered = client.get(url)
+    streamed = client.get(f'{url}&stream=1')
+    assert streamed.status_code == 200
+    assert streamed.is_streamed
+    assert streamed.get_json() == rendered.get_json()
+
+
+@pytest.mark.parametrize('url', LISTINGS)
+def test_ndjson_sends_one_row_per_line(client, url):
+    rendered = client.get(url).get_json()
+    rows = rendered['repositories'] if isinstance(rendered, dict) else rendered
+    for response in (client.get(f'{url}&format=ndjson'),
+                     client.get(url, headers={'Accept': 'application/x-ndjson'})):
+        assert response.mimetype == 'application/x-ndjson'
+        assert [json.loads(line) for line in response.get_data(as_text=True).splitlines()] == rows
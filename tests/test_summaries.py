@@ -0,0 +1,28 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import query
+
+REPOSITORY_TOTALS = """
+SELECT r.name, SUM(c.cost) AS cost, COUNT(*), SUM(c.status = 'failed')
+FROM ci_cd_runs c
+JOIN repositories r ON r.id = c.repository_id
+WHERE c.platform = ? AND c.start_time >= ? AND c.start_time < ?
+GROUP BY r.id
+ORDER BY cost DESC
+"""
+
+
+@pytest.mark.parametrize('platform', ['github', 'gitlab', 'bitbucket'])
+def test_platform_summary_matches_the_raw_runs(client, database, platform):
+    today = datetime.today()
+    window = ((today - timedelta(days=365)).strftime('%Y-%m-%d'), today.strftime('%Y-%m-%d'))
+    repositories = query(database, REPOSITORY_TOTALS, (platform, *window))
+    summary = client.get(f'/api/platform-summary?platform={platform}&range=1yr').get_json()
+    assert repositories
+    assert summary['total_jobs'] == sum(row[2] for row in repositories)
+    assert summary['failed_jobs'] == sum(row[3] for row in repositories)
+    assert summary['total_cost'] == pytest.approx(sum(row[1] for row in repositories))
+    assert summary['most_costly_repo'] == repositories[0][0]
+    assert summary['most_costly_repo_cost'] == pytest.approx(repositories[0][1])
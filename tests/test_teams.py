@@ -0,0 +1,34 @@
+import pytest
+
+from conftest import query
+
+
+@pytest.mark.parametrize('path', ['/api/teams?range=1yr', '/api/platform-teams?platform=gitlab&range=1yr'])
+@pytest.mark.parametrize('sort_by', ['total_cost', 'total_jobs'])
+def test_subtree_totals_add_up_the_children(client, path, sort_by):
+    teams = client.get(f'{path}&rollup=subtree&sort_by={sort_by}').get_json()
+    assert teams
+    for team in teams:
+        children = [child for child in teams if child['parent_team_id'] == team['team_id']]
+        assert team['subtree_total_jobs'] == team['total_jobs'] + sum(c['subtree_total_jobs'] for c in children)
+        assert team['subtree_total_cost'] == pytest.approx(
+            team['total_cost'] + sum(c['subtree_total_cost'] for c in children))
+    keys = [team[f'subtree_{sort_by}'] for team in teams]
+    assert keys == sorted(keys, reverse=True)
+
+
+@pytest.mark.parametrize('path', ['/api/teams?range=1yr', '/api/platform-teams?platform=gitlab&range=1yr'])
+def test_expansions_list_the_counted_repositories(client, database, path):
+    teams = client.get(f'{path}&expand=repository_ids').get_json()
+    names = {team['team_id']: team['repositories']
+             for team in client.get(f'{path}&expand=repositories').get_json()}
+    owned = {}
+    for repo_id, name, entity_id in query(database, "SELECT id, name, entity_id FROM repositories ORDER BY id"):
+        owned.setdefault(entity_id, []).append((repo_id, name))
+    assert any(team['repository_count'] for team in teams)
+    for team in teams:
+        repositories = owned.get(team['team_id'], [])
+        assert team['repository_count'] == len(team['repository_ids']) == len(repositories)
+        assert team['repository_ids'] == [repo_id for repo_id, _ in repositories]
+        assert names[team['team_id']] == sorted(name for _, name in repositories)
+    assert client.get(f'{path}&expand=repository_ids&format=ndjson').get_data(as_text=True).count('\n') == len(teams)
@@ -0,0 +1,67 @@
+import pytest
+
+from conftest import query
+from users import build_visibility
+
+# In the seed-7 org gh-team-2 (8) has the child teams 9 and 10, each owning
+# repositories; only 9 inherits its parent's permissions.
+TEAM, INHERITING, PRIVATE = 8, 9, 10
+
+
+def _owned(database, *entity_ids):
+    return {row[0] for row in query(
+        database, f"SELECT id FROM repositories WHERE entity_id IN ({','.join('?' * len(entity_ids))})", entity_ids
+    )}
+
+
+@pytest.fixture
+def grants(database, writer):
+    granted = min(_owned(database, 5))
+    with writer:
+        writer.execute("UPDATE entities SET inherits_permissions = 1 WHERE id = ?", (INHERITING,))
+        writer.executemany("INSERT INTO entity_memberships (user_id, entity_id, role) VALUES (?, ?, ?)", [
+            (1, TEAM, 'member'),
+            (2, TEAM, 'admin'),
+            (3, 1, 'enterprise_admin'),
+            (999, TEAM, 'owner'),
+        ])
+        writer.execute("INSERT INTO repository_access (user_id, repository_id, access_level) VALUES (4, ?, 'read')",
+                       (granted,))
+    return granted
+
+
+def test_memberships_cascade_and_grants_add(database, writer, grants):
+    index = build_visibility(writer)
+    assert index[1].repositories == _owned(database, TEAM, INHERITING)
+    assert index[2].repositories == _owned(database, TEAM, INHERITING, PRIVATE, 11)
+    assert index[3].repositories == {row[0] for row in query(database, "SELECT id FROM repositories")}
+    assert index[4].repositories == {grants}
+    assert index[4].entities == {5, 3, 2, 1}
+    assert index[1].entities >= {TEAM, INHERITING, 2, 1}
+    assert 999 not in index
+
+
+def _repo_ids(client, args):
+    response = client.get(f'/api/repositories?range=1yr&{args}')
+    assert response.status_code == 200
+    return [row['repo_id'] for row in response.get_json()['repositories']]
+
+
+def test_scoped_listings_keep_to_visible_repositories(client, database, grants):
+    active = {row[0] for row in query(database, "SELECT id FROM repositories WHERE is_active = 1")}
+    assert set(_repo_ids(client, 'as_user=1')) == _owned(database, TEAM, INHERITING) & active
+    assert _repo_ids(client, 'as_user=4') == [grants]
+    assert _repo_ids(client, 'as_user=3') == _repo_ids(client, '')
+
+
+@pytest.mark.parametrize('as_user, status', [('999', 404), ('123456', 404), ('abc', 400)])
+def test_unknown_and_malformed_users_are_refused(client, grants, as_user, status):
+    assert client.get(f'/api/teams?as_user={as_user}').status_code == status
+
+
+def test_visibility_follows_access_changes(client, database, writer, grants):
+    assert _repo_ids(client, 'as_user=4') == [grants]
+    with writer:
+        writer.execute("INSERT INTO entity_memberships (user_id, entity_id, role) VALUES (4, ?, 'member')", (PRIVATE,))
+    active = {row[0] for row in query(database, "SELECT id FROM repositories WHERE is_active = 1")}
+    assert set(_repo_ids(client, 'as_user=4')) == (_owned(database, PRIVATE) | {grants}) & active
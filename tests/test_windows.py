@@ -0,0 +1,36 @@
+from datetime import date, timedelta
+
+import pytest
+
+from conftest import query
+
+
+def test_explicit_window_matches_the_named_range(client):
+    today = date.today()
+    start = (today - timedelta(days=30)).isoformat()
+    named = client.get('/api/platform-summary?platform=github&range=30d').get_json()
+    explicit = client.get(f'/api/platform-summary?platform=github&start={start}&end={today.isoformat()}')
+    assert explicit.status_code == 200
+    assert explicit.get_json()['total_jobs'] >= named['total_jobs']
+
+
+def test_frontend_range_aliases_are_accepted(client):
+    for alias, name in (('last_30_days', '30d'), ('last_year', '1yr')):
+        assert client.get(f'/api/teams?range={alias}').get_json() == client.get(f'/api/teams?range={name}').get_json()
+
+
+@pytest.mark.parametrize('bucket', ['day', 'week', 'month'])
+def test_timeseries_buckets_add_up_to_the_window(client, bucket):
+    series = client.get(f'/api/cost-timeseries?platform=github&range=1yr&bucket={bucket}').get_json()['series']
+    summary = client.get('/api/platform-summary?platform=github&range=1yr').get_json()
+    assert sum(point['total_jobs'] for point in series) == summary['total_jobs']
+    assert sum(point['total_cost'] for point in series) == pytest.approx(summary['total_cost'])
+
+
+def test_all_time_covers_every_run_before_today(client, database):
+    response = client.get('/api/platform-summary?platform=github&range=all')
+    assert response.status_code == 200
+    (jobs,) = query(database, "SELECT COUNT(*) FROM ci_cd_runs WHERE platform = 'github' AND start_time < date('now')")[0]
+    assert response.get_json()['total_jobs'] == jobs
+    for url in ('/api/platform-teams?platform=github', '/api/platform-repositories?platform=github'):
+        assert client.get(f'{url}&range=all').status_code == 200
@@ -0,0 +1,278 @@
+import json
+import sqlite3
+import threading
+
+from partitions import NOT_ARCHIVING, readable_partition
+from rollup import split_window
+
+# Per-day cost attribution of ci_cd_runs to the user who triggered them, one
+# row per (user, day, repository, platform). Runs without a
+# triggered_by_user_id are not attributed. Like run_daily_rollup it keeps
+# every month, including archived ones, so the delete trigger skips runs
+# being archived.
+def _add_run(row):
+    return f"""
+      INSERT INTO user_cost_rollup (user_id, day, repository_id, platform, runs, failed_runs, cost)
+      SELECT {row}.triggered_by_user_id, date({row}.start_time), {row}.repository_id, {row}.platform,
+             1, CASE WHEN {row}.status = 'failed' THEN 1 ELSE 0 END, IFNULL({row}.cost, 0.0)
+      WHERE {row}.triggered_by_user_id IS NOT NULL
+      ON CONFLICT (user_id, day, repository_id, platform) DO UPDATE SET
+        runs = runs + 1,
+        failed_runs = failed_runs + excluded.failed_runs,
+        cost = cost + excluded.cost;"""
+
+
+def _remove_run(row):
+    where = (f"user_id = {row}.triggered_by_user_id AND day = date({row}.start_time)"
+             f" AND repository_id = {row}.repository_id AND platform = {row}.platform")
+    return f"""
+      UPDATE user_cost_rollup SET
+        runs = runs - 1,
+        failed_runs = failed_runs - CASE WHEN {row}.status = 'failed' THEN 1 ELSE 0 END,
+        cost = cost - IFNULL({row}.cost, 0.0)
+      WHERE {where};
+      DELETE FROM user_cost_rollup WHERE {where} AND runs <= 0;"""
+
+
+USER_ROLLUP_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS user_cost_rollup (
+      user_id INTEGER NOT NULL,
+      day DATE NOT NULL,
+      repository_id INTEGER NOT NULL,
+      platform TEXT NOT NULL,
+      runs INTEGER NOT NULL DEFAULT 0,
+      failed_runs INTEGER NOT NULL DEFAULT 0,
+      cost REAL NOT NULL DEFAULT 0.0,
+      PRIMARY KEY (user_id, day, repository_id, platform)
+    ) WITHOUT ROWID;
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS user_cost_rollup_insert
+    AFTER INSERT ON ci_cd_runs
+    WHEN NEW.triggered_by_user_id IS NOT NULL
+    BEGIN{_add_run('NEW')}
+    END;
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS user_cost_rollup_delete
+    AFTER DELETE ON ci_cd_runs
+    WHEN OLD.triggered_by_user_id IS NOT NULL
+     AND {NOT_ARCHIVING}
+    BEGIN{_remove_run('OLD')}
+    END;
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS user_cost_rollup_update
+    AFTER UPDATE OF triggered_by_user_id, repository_id, platform, start_time, status, cost ON ci_cd_runs
+    WHEN OLD.triggered_by_user_id IS NOT NULL OR NEW.triggered_by_user_id IS NOT NULL
+    BEGIN{_remove_run('OLD')}{_add_run('NEW')}
+    END;
+    """,
+]
+
+BACKFILL_SELECT = """
+SELECT
+  triggered_by_user_id, date(start_time), repository_id, platform,
+  COUNT(*), SUM(CASE WHEN status = 'failed' THEN 1 ELSE 0 END), SUM(IFNULL(cost, 0.0))
+FROM ci_cd_runs
+WHERE triggered_by_user_id IS NOT NULL
+GROUP BY 1, 2, 3, 4
+"""
+BACKFILL_INSERT = """
+INSERT INTO user_cost_rollup (user_id, day, repository_id, platform, runs, failed_runs, cost)"""
+
+
+def create_user_rollup(conn):
+    """Creates the user cost rollup and its triggers, backfilling on first creation.
+
+    Archived months are read from their partitions, so the backfill covers
+    the same history as run_daily_rollup.
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_cost_rollup'"
+    ).fetchone()
+    for statement in USER_ROLLUP_SCHEMA:
+        conn.execute(statement)
+    if exists:
+        return
+    conn.execute(BACKFILL_INSERT + BACKFILL_SELECT + ";")
+    for path, compressed in conn.execute("SELECT path, compressed FROM run_partitions").fetchall():
+        partition = sqlite3.connect(f"file:{readable_partition(path, compressed)}?mode=ro&immutable=1", uri=True)
+        try:
+            conn.executemany(BACKFILL_INSERT + " VALUES (?, ?, ?, ?, ?, ?, ?);", partition.execute(BACKFILL_SELECT))
+        finally:
+            partition.close()
+
+
+def user_window(user_id, start, end, run_tables=None):
+    """Returns (sql, params) for a CTE body with user_id's attributed runs in [start, end).
+
+    The CTE yields (repository_id, platform, runs, failed_runs, cost); like
+    rollup.window_runs(), only partial days at either edge are read from
+    ci_cd_runs, or the tables run_tables(start, end) names for them.
+    """
+    days, edges = split_window(start, end)
+    parts, params = [], []
+    if days:
+        parts.append("""
+        SELECT repository_id, platform, runs, failed_runs, cost
+        FROM user_cost_rollup
+        WHERE user_id = ? AND day >= ? AND day < ?""")
+        params += [user_id, *days]
+    for edge in edges:
+        for table in run_tables(*edge) if run_tables else ['ci_cd_runs']:
+            parts.append(f"""
+        SELECT repository_id, platform, 1 AS runs,
+               CASE WHEN status = 'failed' THEN 1 ELSE 0 END AS failed_runs, IFNULL(cost, 0.0) AS cost
+        FROM {table}
+        WHERE triggered_by_user_id = ? AND start_time >= ? AND start_time < ?""")
+            params += [user_id, *edge]
+    return "\n        UNION ALL".join(parts), params
+
+
+# Which repositories each user can see, from three sources:
+#   repository_access  -- any grant on a repository
+#   entity_memberships -- the repositories of the entity and of every entity
+#                         below it whose permissions cascade from its parent
+#                         (entities.inherits_permissions), all the way down;
+#                         ADMIN_ROLES see the entity's whole subtree
+# The sets are built once per process and kept until visibility_version,
+# which triggers bump on every change to those tables, the hierarchy or
+# repository ownership, moves on. Scoped queries then test membership in a
+# precomputed set instead of joining the access tables.
+ADMIN_ROLES = ('owner', 'admin', 'enterprise_admin')
+
+VISIBILITY_SOURCES = (
+    ("entity_memberships", ("INSERT", "UPDATE", "DELETE"), ""),
+    ("repository_access", ("INSERT", "UPDATE", "DELETE"), ""),
+    ("users", ("INSERT", "DELETE"), ""),
+    ("entities", ("INSERT", "DELETE"), ""),
+    ("entities", ("UPDATE",), " OF parent_id, inherits_permissions"),
+    ("repositories", ("INSERT", "DELETE"), ""),
+    ("repositories", ("UPDATE",), " OF entity_id"),
+)
+
+VISIBILITY_VERSION = [
+    """
+    CREATE TABLE IF NOT EXISTS visibility_version (
+      id INTEGER PRIMARY KEY CHECK (id = 1),
+      version INTEGER NOT NULL
+    );
+    """,
+    "INSERT OR IGNORE INTO visibility_version (id, version) VALUES (1, 0);",
+] + [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS visibility_version_{table}_{event.lower()}
+    AFTER {event}{columns} ON {table}
+    BEGIN
+      UPDATE visibility_version SET version = version + 1 WHERE id = 1;
+    END;
+    """
+    for table, events, columns in VISIBILITY_SOURCES
+    for event in events
+] + [
+    # Scoped responses are cached like any other, so access changes also
+    # move the data version the response cache checks.
+    f"""
+    CREATE TRIGGER IF NOT EXISTS data_version_{table}_{event.lower()}
+    AFTER {event} ON {table}
+    BEGIN
+      UPDATE data_version SET version = version + 1 WHERE id = 1;
+    END;
+    """
+    for table in ("entity_memberships", "repository_access", "users")
+    for event in ("INSERT", "UPDATE", "DELETE")
+]
+
+
+class Visibility:
+    """The repositories a user can see, and the entities: those their memberships
+    reach, the visible repositories' owners, and every entity above either."""
+
+    __slots__ = ('repositories', 'entities', '_json')
+
+    def __init__(self, repositories, entities):
+        self.repositories = frozenset(repositories)
+        self.entities = frozenset(entities)
+        self._json = {}
+
+    def json(self, which):
+        """The 'repositories' or 'entities' set as a JSON array, for json_each(?)."""
+        encoded = self._json.get(which)
+        if encoded is None:
+            encoded = self._json[which] = json.dumps(sorted(getattr(self, which)))
+        return encoded
+
+
+def build_visibility(conn):
+    """Computes every user's Visibility from the access tables; returns {user_id: Visibility}."""
+    children, cascades, parents = {}, set(), {}
+    for entity_id, parent_id, inherits in conn.execute("SELECT id, parent_id, inherits_permissions FROM entities"):
+        parents[entity_id] = parent_id
+        children.setdefault(parent_id, []).append(entity_id)
+        if inherits:
+            cascades.add(entity_id)
+    owned = {}
+    owner = {}
+    for repository_id, entity_id in conn.execute("SELECT id, entity_id FROM repositories"):
+        owned.setdefault(entity_id, []).append(repository_id)
+        owner[repository_id] = entity_id
+
+    def reachable(entity_id, admin):
+        stack, seen = [entity_id], set()
+        while stack:
+            current = stack.pop()
+            if current in seen:
+                continue
+            seen.add(current)
+            stack.extend(c for c in children.get(current, ()) if admin or c in cascades)
+        return seen
+
+    # Grants to user ids missing from users are ignored, so an orphaned
+    # membership never makes an unknown ?as_user= look like a real user.
+    repositories = {user_id: set() for (user_id,) in conn.execute("SELECT id FROM users")}
+    members, subtrees = {}, {}
+    for user_id, entity_id, role in conn.execute("SELECT user_id, entity_id, role FROM entity_memberships"):
+        if user_id not in repositories:
+            continue
+        key = (entity_id, role in ADMIN_ROLES)
+        if key not in subtrees:
+            subtrees[key] = reachable(*key)
+        visible = repositories[user_id]
+        for member_of in subtrees[key]:
+            visible.update(owned.get(member_of, ()))
+        members.setdefault(user_id, set()).update(subtrees[key])
+    for user_id, repository_id in conn.execute("SELECT user_id, repository_id FROM repository_access"):
+        if user_id in repositories and repository_id in owner:
+            repositories[user_id].add(repository_id)
+
+    index = {}
+    for user_id, visible in repositories.items():
+        entities = set()
+        for entity_id in members.get(user_id, set()) | {owner[r] for r in visible}:
+            while entity_id is not None and entity_id not in entities:
+                entities.add(entity_id)
+                entity_id = parents.get(entity_id)
+        index[user_id] = Visibility(visible, entities)
+    return index
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def user_visibility(conn, database, user_id):
+    """user_id's Visibility as of the data conn reads, or None for an unknown user.
+
+    The per-database index is rebuilt only when visibility_version has moved.
+    """
+    version = conn.execute("SELECT version FROM visibility_version WHERE id = 1").fetchone()[0]
+    loaded = _indexes.get(database)
+    if loaded is None or loaded[0] != version:
+        with _indexes_lock:
+            loaded = _indexes.get(database)
+            if loaded is None or loaded[0] != version:
+                loaded = (version, build_visibility(conn))
+                _indexes[database] = loaded
+    return loaded[1].get(user_id)